@@ -1,195 +1,170 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+import os
+import sys
 import time
 import cv2
-import json
-import socket
-import threading
-from streamlit_autorefresh import st_autorefresh
-from collections import deque
+import numpy as np
 
-# Actualizar cada 2 segundos
-st_autorefresh(interval=2000, key="datarefresh")
+# El cliente de datos vive en la raíz del proyecto
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cliente_datos import ClienteDatos
+from db import DB_NAME, inicializar
+from miniaturas import obtener_miniatura
+from alertas import actualizar_config, cargar_config
+from historial import COLUMNAS, PUNTOS_GRAFICA, RANGOS, VigilanteBD, leer_registros, reducir
+
+# Configuración de la página (debe ser lo primero de Streamlit)
+st.set_page_config(
+    page_title="Tlalibot - Dashboard de Lechugas",
+    page_icon="🌱",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# Cada cuántos segundos se refresca el panel en vivo. Solo se vuelve a
+# ejecutar ese fragmento, no toda la página (CSS, login, configuración)
+INTERVALO_REFRESCO = 2
+
+# Lecturas en vivo que comparten todas las sesiones (10 minutos a 2 s).
+# Se suman a registros.db en las gráficas
+MAX_HISTORIAL = 300
+INTERVALO_HISTORIAL = 2  # segundos entre registros
+
+# Filas de la tabla de últimos registros
+FILAS_TABLA = 15
+
+# Galería: las rutas de las fotos en la BD son relativas a su carpeta
+DIRECTORIO_BD = os.path.dirname(DB_NAME)
+FOTOS_POR_PAGINA = 12
+COLUMNAS_GALERIA = 4
 
 # ============================================
-# CLIENTE DE DATOS - INTEGRADO
+# MONITOR DEL SENSOR - UNO POR PROCESO
 # ============================================
-class ClienteDatos:
+class MonitorSensor:
+    """
+    Una sola conexión al servidor de datos para todo el proceso de
+    Streamlit, sin importar cuántas pestañas estén abiertas. El cliente
+    reconecta solo y el historial lo llena su suscripción.
+
+    Las sesiones leen `historial` y `version` sin lock: cada dato nuevo
+    reemplaza la tupla completa en vez de modificarla.
+    """
+
     def __init__(self, host="127.0.0.1", puerto=5000):
-        self.host = host
-        self.puerto = puerto
-        self.socket = None
-        self.conectado = False
-        self.ultimo_dato = None
-        self.callbacks = []
-        self.intentando_reconectar = False
-        
-        self.conectar()
-    
-    def conectar(self):
-        """Conecta al servidor de datos"""
-        try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(5)  # Timeout de 5 segundos
-            self.socket.connect((self.host, self.puerto))
-            self.conectado = True
-            self.intentando_reconectar = False
-            
-            # Iniciar thread de lectura
-            thread = threading.Thread(target=self.leer_datos, daemon=True)
-            thread.start()
-        except Exception as e:
-            self.conectado = False
-            raise e
-    
-    def leer_datos(self):
-        """Lee datos del servidor continuamente"""
-        buffer = ""
-        while self.conectado:
-            try:
-                datos = self.socket.recv(1024).decode()
-                if not datos:
-                    self.conectado = False
-                    break
-                
-                buffer += datos
-                
-                while "\n" in buffer:
-                    linea, buffer = buffer.split("\n", 1)
-                    if linea.strip():
-                        try:
-                            self.ultimo_dato = json.loads(linea)
-                            for callback in self.callbacks:
-                                callback(self.ultimo_dato)
-                        except json.JSONDecodeError:
-                            pass
-            except Exception as e:
-                self.conectado = False
-                break
-        
-        # Intentar reconectar
-        if not self.intentando_reconectar:
-            self.intentando_reconectar = True
-            threading.Thread(target=self.reconectar, daemon=True).start()
-    
-    def reconectar(self):
-        """Intenta reconectar al servidor"""
-        while self.intentando_reconectar:
-            time.sleep(3)
-            try:
-                self.conectar()
-                print("✔ Reconectado al servidor")
-                break
-            except:
-                print("⏳ Intentando reconectar...")
-    
-    def obtener_datos(self):
-        """Retorna el último dato recibido"""
-        return self.ultimo_dato
-    
-    def suscribirse(self, callback):
-        """Suscribe una función para que se ejecute cuando lleguen datos"""
-        self.callbacks.append(callback)
-    
-    def desconectar(self):
-        """Cierra la conexión"""
-        self.conectado = False
-        self.intentando_reconectar = False
-        if self.socket:
-            try:
-                self.socket.close()
-            except:
-                pass
+        self.cliente = ClienteDatos(host=host, puerto=puerto, espera_inicial=1.0)
+        self.historial = ()
+        self.version = 0
+        self._ultimo = 0.0
+        self.cliente.suscribirse(self._nuevo_dato, max_cola=10)
+
+    def _nuevo_dato(self, dato):
+        temp = dato.get("temperatura")
+        hum = dato.get("humedad")
+        if temp is None or hum is None:
+            return
+
+        # Agregar al historial si han pasado al menos INTERVALO_HISTORIAL segundos
+        ahora = time.time()
+        if ahora - self._ultimo < INTERVALO_HISTORIAL:
+            return
+        self._ultimo = ahora
+
+        registro = {'timestamp': datetime.now(), 'temperatura': temp, 'humedad': hum}
+        self.historial = (self.historial + (registro,))[-MAX_HISTORIAL:]
+        self.version += 1
+
+@st.cache_resource(show_spinner=False)
+def obtener_monitor():
+    """Monitor compartido por todas las sesiones de este proceso"""
+    return MonitorSensor(host="127.0.0.1", puerto=5000)
 
 # ============================================
 # INICIALIZACIÓN
 # ============================================
 
-# Conectar al servidor de datos compartido
-if "cliente_datos" not in st.session_state:
-    try:
-        st.session_state.cliente_datos = ClienteDatos(host="127.0.0.1", puerto=5000)
-        st.session_state.serial_error = None
-    except Exception as e:
-        st.session_state.cliente_datos = None
-        st.session_state.serial_error = f"No se pudo conectar al servidor de datos: {e}"
-
-# Buffer de datos históricos en memoria (últimos 50 registros)
-if "datos_historicos" not in st.session_state:
-    st.session_state.datos_historicos = deque(maxlen=50)
-
-# Inicializar último tiempo de actualización
-if "ultimo_tiempo" not in st.session_state:
-    st.session_state.ultimo_tiempo = None
-
-def agregar_dato_historico(temp, hum, lechugas):
-    """Agrega un nuevo dato al historial"""
-    timestamp = datetime.now()
-    st.session_state.datos_historicos.append({
-        'timestamp': timestamp,
-        'temperatura': temp,
-        'humedad': hum,
-        'lechugas': lechugas
-    })
-    st.session_state.ultimo_tiempo = timestamp
+monitor = obtener_monitor()
 
 def obtener_datos_reales():
-    """Lee datos del servidor compartido y actualiza historial"""
-    if st.session_state.cliente_datos is None or st.session_state.serial_error:
-        return None, None
-    
-    try:
-        dato = st.session_state.cliente_datos.obtener_datos()
-        if dato:
-            temp = dato.get("temperatura")
-            hum = dato.get("humedad")
-            
-            # Guardar en session_state para que persista
-            if temp is not None:
-                st.session_state.temp_actual = temp
-            if hum is not None:
-                st.session_state.hum_actual = hum
-            
-            # Agregar al historial si han pasado al menos 2 segundos
-            if temp is not None and hum is not None:
-                ahora = datetime.now()
-                if (st.session_state.ultimo_tiempo is None or 
-                    (ahora - st.session_state.ultimo_tiempo).total_seconds() >= 2):
-                    lechugas = st.session_state.get('lechugas_actual', 435)
-                    agregar_dato_historico(temp, hum, lechugas)
-            
-            return temp, hum
-    except Exception as e:
-        st.session_state.serial_error = f"Error leyendo datos: {e}"
+    """Último dato del monitor compartido"""
+    dato = monitor.cliente.obtener_datos()
+    if dato:
+        temp = dato.get("temperatura")
+        hum = dato.get("humedad")
+        
+        # Guardar en session_state para que persista
+        if temp is not None:
+            st.session_state.temp_actual = temp
+        if hum is not None:
+            st.session_state.hum_actual = hum
     
     # Retornar último valor guardado si no hay datos nuevos
     return st.session_state.get("temp_actual"), st.session_state.get("hum_actual")
 
-def obtener_dataframe_historico():
-    """Convierte el buffer de datos históricos en DataFrame"""
-    if len(st.session_state.datos_historicos) > 0:
-        return pd.DataFrame(list(st.session_state.datos_historicos))
-    else:
-        # Datos de ejemplo iniciales
-        datos_ejemplo = [
-            {'timestamp': datetime.now() - timedelta(minutes=i*2), 
-             'temperatura': 21.0 + i*0.2, 
-             'humedad': 38.0 + i*1.5,
-             'lechugas': 434}
-            for i in range(10, 0, -1)
-        ]
-        return pd.DataFrame(datos_ejemplo)
-
-# Configuración de la página
-st.set_page_config(
-    page_title="Tlalibot - Dashboard de Lechugas",
-    page_icon="🌱",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+@st.cache_resource(show_spinner=False)
+def obtener_vigilante():
+    """Una conexión por proceso solo para saber si main.py escribió en la BD"""
+    inicializar()  # La galería lee columnas que agrega la migración
+    return VigilanteBD()
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def cargar_conteos(version_bd):
+    """
+    Último conteo de lechugas y su tendencia. Solo consulta la BD cuando
+    cambia `version_bd` (un análisis nuevo); si no, sale del caché.
+    """
+    conteos = obtener_vigilante().ultimos_conteos()
+    if not conteos:
+        return None
+
+    fecha, actual = conteos[-1]
+    resumen = {"actual": actual, "fecha": fecha, "cambio": None, "tendencia": None}
+    if len(conteos) > 1:
+        resumen["cambio"] = actual - conteos[-2][1]
+        # Pendiente (lechugas por análisis) de los últimos análisis
+        valores = np.array([c[1] for c in conteos], dtype=float)
+        resumen["tendencia"] = float(np.polyfit(np.arange(len(valores)), valores, 1)[0])
+    return resumen
+
+def paso_rango(segundos):
+    """Cada cuánto vale la pena recalcular un rango: lo que dura un punto de la gráfica"""
+    return max(INTERVALO_REFRESCO, segundos / PUNTOS_GRAFICA)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def cargar_rango(segundos, corte, version_bd, _historial):
+    """
+    Registros de la BD más las lecturas en vivo de los últimos `segundos`,
+    cada serie reducida a PUNTOS_GRAFICA con LTTB. `corte` y `version_bd`
+    solo son parte de la llave del caché: cambian cada paso_rango(segundos)
+    o cuando entra un análisis nuevo.
+    """
+    datos = leer_registros(segundos)
+
+    # Lecturas en vivo del monitor que caen en el rango
+    limite = datetime.now() - timedelta(seconds=segundos)
+    vivas = [r for r in _historial if r['timestamp'] >= limite]
+    if vivas:
+        datos["t"] = np.concatenate([datos["t"], np.array([r['timestamp'] for r in vivas], dtype="datetime64[s]")])
+        for columna in COLUMNAS:
+            datos[columna] = np.concatenate([datos[columna], np.array([r.get(columna) for r in vivas], dtype=float)])
+        orden = np.argsort(datos["t"], kind="stable")
+        datos = {k: v[orden] for k, v in datos.items()}
+
+    resumen = {"total": len(datos["t"]), "series": {}, "promedios": {}, "ultimos": {}}
+    for columna in COLUMNAS:
+        valores = datos[columna][~np.isnan(datos[columna])]
+        resumen["series"][columna] = reducir(datos["t"], datos[columna])
+        resumen["promedios"][columna] = float(valores.mean()) if len(valores) else None
+        resumen["ultimos"][columna] = float(valores[-1]) if len(valores) else None
+
+    tabla = pd.DataFrame({"timestamp": datos["t"][-FILAS_TABLA:]})
+    for columna in COLUMNAS:
+        tabla[columna] = datos[columna][-FILAS_TABLA:]
+    resumen["tabla"] = tabla
+    return resumen
 
 # CSS personalizado
 st.markdown("""
@@ -294,35 +269,50 @@ st.markdown("""
 USUARIO_CORRECTO = "admin"
 CONTRASEÑA_CORRECTA = "lechugas2025"
 
-# Configuración de alertas
-TEMP_MIN = 18.0
-TEMP_MAX = 26.0
-HUMEDAD_MIN = 35.0
-HUMEDAD_MAX = 50.0
+# Configuración de alertas: los umbrales viven en alertas.json y son los
+# mismos que usa el motor de alertas del bot
+def cargar_limites():
+    """(temp_min, temp_max, hum_min, hum_max) de la config de alertas"""
+    umbrales = cargar_config()["umbrales"]
+    return (float(umbrales["temperatura"]["minimo"]), float(umbrales["temperatura"]["maximo"]),
+            float(umbrales["humedad"]["minimo"]), float(umbrales["humedad"]["maximo"]))
 
-def verificar_alertas(temp, hum):
+def guardar_umbrales():
+    """Callback de los sliders: guarda los umbrales en alertas.json"""
+    estado = st.session_state
+    if estado.temp_min_slider >= estado.temp_max_slider or estado.hum_min_slider >= estado.hum_max_slider:
+        estado.error_umbrales = "❌ El mínimo debe ser menor que el máximo. No se guardó el cambio."
+        return
+    estado.error_umbrales = None
+    actualizar_config({"umbrales": {
+        "temperatura": {"minimo": estado.temp_min_slider, "maximo": estado.temp_max_slider},
+        "humedad": {"minimo": estado.hum_min_slider, "maximo": estado.hum_max_slider},
+    }})
+
+def verificar_alertas(temp, hum, limites):
     """Verifica si hay alertas de temperatura o humedad"""
+    temp_min, temp_max, hum_min, hum_max = limites
     alertas = []
     
     if temp is None or hum is None:
         return alertas
     
     # Alertas de temperatura
-    if temp < TEMP_MIN:
+    if temp < temp_min:
         alertas.append({
             'tipo': 'danger',
             'icono': '🥶',
             'titulo': '¡ALERTA DE TEMPERATURA BAJA!',
-            'mensaje': f'La temperatura actual ({temp}°C) está por debajo del mínimo recomendado ({TEMP_MIN}°C)'
+            'mensaje': f'La temperatura actual ({temp}°C) está por debajo del mínimo recomendado ({temp_min}°C)'
         })
-    elif temp > TEMP_MAX:
+    elif temp > temp_max:
         alertas.append({
             'tipo': 'danger',
             'icono': '🔥',
             'titulo': '¡ALERTA DE TEMPERATURA ALTA!',
-            'mensaje': f'La temperatura actual ({temp}°C) está por encima del máximo recomendado ({TEMP_MAX}°C)'
+            'mensaje': f'La temperatura actual ({temp}°C) está por encima del máximo recomendado ({temp_max}°C)'
         })
-    elif temp < TEMP_MIN + 1 or temp > TEMP_MAX - 1:
+    elif temp < temp_min + 1 or temp > temp_max - 1:
         alertas.append({
             'tipo': 'warning',
             'icono': '⚠️',
@@ -331,21 +321,21 @@ def verificar_alertas(temp, hum):
         })
     
     # Alertas de humedad
-    if hum < HUMEDAD_MIN:
+    if hum < hum_min:
         alertas.append({
             'tipo': 'danger',
             'icono': '💧',
             'titulo': '¡ALERTA DE HUMEDAD BAJA!',
-            'mensaje': f'La humedad actual ({hum}%) está por debajo del mínimo recomendado ({HUMEDAD_MIN}%)'
+            'mensaje': f'La humedad actual ({hum}%) está por debajo del mínimo recomendado ({hum_min}%)'
         })
-    elif hum > HUMEDAD_MAX:
+    elif hum > hum_max:
         alertas.append({
             'tipo': 'danger',
             'icono': '💦',
             'titulo': '¡ALERTA DE HUMEDAD ALTA!',
-            'mensaje': f'La humedad actual ({hum}%) está por encima del máximo recomendado ({HUMEDAD_MAX}%)'
+            'mensaje': f'La humedad actual ({hum}%) está por encima del máximo recomendado ({hum_max}%)'
         })
-    elif hum < HUMEDAD_MIN + 2 or hum > HUMEDAD_MAX - 2:
+    elif hum < hum_min + 2 or hum > hum_max - 2:
         alertas.append({
             'tipo': 'warning',
             'icono': '⚠️',
@@ -399,52 +389,151 @@ def login_page():
     st.markdown("<br><p style='text-align: center; color: #b2bec3; font-size: 14px;'>Demo: admin / lechugas2025</p>", unsafe_allow_html=True)
     st.markdown("</div>", unsafe_allow_html=True)
 
-def dashboard_page():
-    """Página principal del dashboard"""
-    
-    # Header
-    col1, col2 = st.columns([6, 1])
-    with col1:
-        st.markdown("# 🌱 Tlalibot - Dashboard de Lechugas")
-        st.markdown(f"**Última actualización:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} <span class='realtime-badge'>● LIVE</span>", unsafe_allow_html=True)
-    with col2:
-        if st.button("Cerrar Sesión"):
-            st.session_state.logged_in = False
-            st.rerun()
+def modo_linea(t):
+    """Con pocos puntos se marcan; con cientos solo estorban"""
+    return 'lines+markers' if len(t) <= 60 else 'lines'
+
+def crear_figuras(datos, rango, limites):
+    """Construye las gráficas del historial (es lo más caro de cada refresco)"""
+    temp_min, temp_max, hum_min, hum_max = limites
+    series = datos["series"]
+    # Gráfica de temperatura con zonas de alerta
+    fig_temp = go.Figure()
+    
+    # Zona de temperatura óptima
+    fig_temp.add_hrect(y0=temp_min, y1=temp_max, 
+                        fillcolor="green", opacity=0.1, 
+                        annotation_text="Zona Óptima", 
+                        annotation_position="right")
+    
+    # Línea de temperatura
+    t, valores = series['temperatura']
+    fig_temp.add_trace(go.Scatter(
+        x=t, 
+        y=valores,
+        mode=modo_linea(t),
+        name='Temperatura',
+        line=dict(color='#f5576c', width=3),
+        marker=dict(size=8)
+    ))
+    
+    fig_temp.update_layout(
+        title=f"Evolución de la Temperatura ({rango})",
+        xaxis_title="Tiempo",
+        yaxis_title="Temperatura (°C)",
+        hovermode='x unified',
+        height=400
+    )
+    
+    # Gráfica de humedad con zonas de alerta
+    fig_hum = go.Figure()
+    
+    # Zona de humedad óptima
+    fig_hum.add_hrect(y0=hum_min, y1=hum_max, 
+                        fillcolor="blue", opacity=0.1, 
+                        annotation_text="Zona Óptima", 
+                        annotation_position="right")
+    
+    # Línea de humedad
+    t, valores = series['humedad']
+    fig_hum.add_trace(go.Scatter(
+        x=t, 
+        y=valores,
+        mode=modo_linea(t),
+        name='Humedad',
+        line=dict(color='#00f2fe', width=3),
+        marker=dict(size=8),
+        fill='tozeroy'
+    ))
+    
+    fig_hum.update_layout(
+        title=f"Evolución de la Humedad ({rango})",
+        xaxis_title="Tiempo",
+        yaxis_title="Humedad (%)",
+        hovermode='x unified',
+        height=400
+    )
+    
+    # Gráfica de lechugas
+    t, valores = series['lechugas']
+    fig_lettuce = go.Figure(go.Scatter(
+        x=t, 
+        y=valores,
+        mode=modo_linea(t),
+        name='Lechugas',
+        line=dict(color='#43e97b', width=3)
+    ))
+    fig_lettuce.update_layout(
+        title=f'Evolución del Número de Lechugas ({rango})',
+        xaxis_title="Tiempo",
+        yaxis_title="Lechugas",
+        height=400
+    )
     
-    st.markdown("---")
+    # Tabla de registros
+    df_display = datos["tabla"].copy()
+    df_display['timestamp'] = df_display['timestamp'].dt.strftime('%H:%M:%S')
+    df_display = df_display[['timestamp', 'temperatura', 'humedad', 'lechugas']]
+    df_display.columns = ['Hora', 'Temp (°C)', 'Humedad (%)', 'Lechugas']
     
-    # Mostrar estado del puerto serial
-    if st.session_state.serial_error:
-        st.error(f"❌ {st.session_state.serial_error}")
+    return fig_temp, fig_hum, fig_lettuce, df_display
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def obtener_figuras(rango, corte, version_bd, limites, _datos):
+    """
+    Gráficas y tabla de un rango. Se construyen una vez y las comparten
+    todas las sesiones hasta el siguiente corte del rango o análisis nuevo.
+    """
+    return crear_figuras(_datos, rango, limites)
+
+@st.fragment(run_every=INTERVALO_REFRESCO)
+def panel_en_vivo():
+    """Métricas, alertas y gráficas. Se refresca solo, sin recargar la página"""
+    limites = cargar_limites()
+    temp_min, temp_max, hum_min, hum_max = limites
+    st.markdown(f"**Última actualización:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} <span class='realtime-badge'>● LIVE</span>", unsafe_allow_html=True)
+    
+    # Mostrar estado de la conexión (el cliente reintenta solo)
+    if not monitor.cliente.conectado:
+        st.error("❌ Sin conexión al servidor de datos, reintentando...")
         st.info("💡 **Soluciones:**\n1. Asegúrate de que `serial_server.py` está corriendo\n2. Verifica que el servidor esté escuchando en puerto 5000\n3. Comprueba que el ESP32 esté conectado")
     else:
-        estado_conexion = "🟢 Conectado" if st.session_state.cliente_datos.conectado else "🔴 Desconectado"
-        st.success(f"✅ {estado_conexion} al servidor de datos | 📊 {len(st.session_state.datos_historicos)} registros en memoria")
+        st.success("✅ 🟢 Conectado al servidor de datos")
+    
+    # Historial de la BD + lecturas en vivo, reducido y en caché por rango
+    rango = st.selectbox("🕒 Rango del historial", list(RANGOS), key="rango")
+    segundos = RANGOS[rango]
+    corte = int(time.time() // paso_rango(segundos))
+    version_bd = obtener_vigilante().version()
+    datos = cargar_rango(segundos, corte, version_bd, monitor.historial)
+    st.caption(f"📊 {datos['total']} registros en el rango")
     
     st.markdown("")
     
     # Obtener datos en tiempo real
     temp_actual, hum_actual = obtener_datos_reales()
     
-    # Obtener DataFrame histórico
-    df = obtener_dataframe_historico()
+    # Conteo del último análisis de main.py (solo se consulta si hubo uno nuevo)
+    conteo = cargar_conteos(version_bd)
 
-    # Si no hay datos del sensor, usar últimos del historial
+    # Si no hay datos del sensor, usar últimos del historial (y si tampoco
+    # hay, se muestra "—": no se inventan valores)
     if temp_actual is None or hum_actual is None:
-        if len(df) > 0:
-            temp_actual = df['temperatura'].iloc[-1]
-            hum_actual = df['humedad'].iloc[-1]
-        else:
-            temp_actual = 21.0
-            hum_actual = 38.0
-
-    lechugas_actual = st.session_state.get('lechugas_actual', 435)
+        temp_actual = datos["ultimos"]["temperatura"]
+        hum_actual = datos["ultimos"]["humedad"]
+    sin_datos = temp_actual is None or hum_actual is None
     
     # Sistema de Alertas
     st.markdown("## 🔔 Sistema de Alertas")
-    alertas = verificar_alertas(temp_actual, hum_actual)
-    mostrar_alertas(alertas)
+    if sin_datos:
+        mostrar_alertas([{
+            'tipo': 'warning',
+            'icono': '📭',
+            'titulo': 'Sin lecturas del sensor',
+            'mensaje': f'No hay lecturas en vivo ni registros en {rango.lower()}'
+        }])
+    else:
+        mostrar_alertas(verificar_alertas(temp_actual, hum_actual, limites))
     
     st.markdown("---")
     
@@ -453,42 +542,62 @@ def dashboard_page():
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
+        if conteo is None:
+            lechugas_texto = "—"
+            detalle_conteo = "Sin análisis registrados"
+        else:
+            lechugas_texto = conteo["actual"]
+            detalle_conteo = f"Último análisis: {conteo['fecha']}"
+            if conteo["cambio"] is not None:
+                flecha = "📈" if conteo["cambio"] > 0 else "📉" if conteo["cambio"] < 0 else "➡️"
+                detalle_conteo += (f"<br>{flecha} {conteo['cambio']:+d} vs anterior"
+                                   f"<br>Tendencia: {conteo['tendencia']:+.1f} por análisis")
         st.markdown(f"""
         <div class="metric-card lettuce-card">
             <h3>🥬 Total Lechugas</h3>
-            <h1 style="margin: 10px 0;">{lechugas_actual}</h1>
-            <p>Plantas monitoreadas</p>
+            <h1 style="margin: 10px 0;">{lechugas_texto}</h1>
+            <p>{detalle_conteo}</p>
         </div>
         """, unsafe_allow_html=True)
     
     with col2:
-        estado_temp = "🔥" if temp_actual > TEMP_MAX else "🥶" if temp_actual < TEMP_MIN else "✅"
+        if temp_actual is None:
+            estado_temp, valor_temp = "❔", "—"
+        else:
+            estado_temp = "🔥" if temp_actual > temp_max else "🥶" if temp_actual < temp_min else "✅"
+            valor_temp = f"{temp_actual:.1f}°C"
         st.markdown(f"""
         <div class="metric-card temp-card">
             <h3>{estado_temp} Temperatura</h3>
-            <h1 style="margin: 10px 0;">{temp_actual:.1f}°C</h1>
-            <p>Rango ideal: {TEMP_MIN}°C - {TEMP_MAX}°C</p>
+            <h1 style="margin: 10px 0;">{valor_temp}</h1>
+            <p>Rango ideal: {temp_min}°C - {temp_max}°C</p>
         </div>
         """, unsafe_allow_html=True)
     
     with col3:
-        estado_hum = "💦" if hum_actual > HUMEDAD_MAX else "💧" if hum_actual < HUMEDAD_MIN else "✅"
+        if hum_actual is None:
+            estado_hum, valor_hum = "❔", "—"
+        else:
+            estado_hum = "💦" if hum_actual > hum_max else "💧" if hum_actual < hum_min else "✅"
+            valor_hum = f"{hum_actual:.1f}%"
         st.markdown(f"""
         <div class="metric-card hum-card">
             <h3>{estado_hum} Humedad</h3>
-            <h1 style="margin: 10px 0;">{hum_actual:.1f}%</h1>
-            <p>Rango ideal: {HUMEDAD_MIN}% - {HUMEDAD_MAX}%</p>
+            <h1 style="margin: 10px 0;">{valor_hum}</h1>
+            <p>Rango ideal: {hum_min}% - {hum_max}%</p>
         </div>
         """, unsafe_allow_html=True)
     
     with col4:
-        promedio_temp = df['temperatura'].mean()
-        promedio_hum = df['humedad'].mean()
+        promedio_temp = datos["promedios"]["temperatura"]
+        promedio_hum = datos["promedios"]["humedad"]
+        texto_temp = f"{promedio_temp:.1f}°C" if promedio_temp is not None else "—"
+        texto_hum = f"{promedio_hum:.1f}%" if promedio_hum is not None else "—"
         st.markdown(f"""
         <div class="metric-card">
             <h3>📈 Promedios</h3>
-            <p style="margin: 10px 0;">Temp: {promedio_temp:.1f}°C</p>
-            <p style="margin: 0;">Hum: {promedio_hum:.1f}%</p>
+            <p style="margin: 10px 0;">Temp: {texto_temp}</p>
+            <p style="margin: 0;">Hum: {texto_hum}</p>
         </div>
         """, unsafe_allow_html=True)
     
@@ -499,100 +608,131 @@ def dashboard_page():
     
     tab1, tab2, tab3 = st.tabs(["🌡️ Temperatura", "💧 Humedad", "🥬 Lechugas"])
     
+    if not datos["total"]:
+        st.info(f"Sin registros en {rango.lower()}")
+    
+    fig_temp, fig_hum, fig_lettuce, df_display = obtener_figuras(rango, corte, version_bd, limites, datos)
+    
     with tab1:
-        # Gráfica de temperatura con zonas de alerta
-        fig_temp = go.Figure()
-        
-        # Zona de temperatura óptima
-        fig_temp.add_hrect(y0=TEMP_MIN, y1=TEMP_MAX, 
-                            fillcolor="green", opacity=0.1, 
-                            annotation_text="Zona Óptima", 
-                            annotation_position="right")
-        
-        # Línea de temperatura
-        fig_temp.add_trace(go.Scatter(
-            x=df['timestamp'], 
-            y=df['temperatura'],
-            mode='lines+markers',
-            name='Temperatura',
-            line=dict(color='#f5576c', width=3),
-            marker=dict(size=8)
-        ))
-        
-        fig_temp.update_layout(
-            title="Evolución de la Temperatura en Tiempo Real",
-            xaxis_title="Tiempo",
-            yaxis_title="Temperatura (°C)",
-            hovermode='x unified',
-            height=400
-        )
         st.plotly_chart(fig_temp, use_container_width=True)
     
     with tab2:
-        # Gráfica de humedad con zonas de alerta
-        fig_hum = go.Figure()
-        
-        # Zona de humedad óptima
-        fig_hum.add_hrect(y0=HUMEDAD_MIN, y1=HUMEDAD_MAX, 
-                            fillcolor="blue", opacity=0.1, 
-                            annotation_text="Zona Óptima", 
-                            annotation_position="right")
-        
-        # Línea de humedad
-        fig_hum.add_trace(go.Scatter(
-            x=df['timestamp'], 
-            y=df['humedad'],
-            mode='lines+markers',
-            name='Humedad',
-            line=dict(color='#00f2fe', width=3),
-            marker=dict(size=8),
-            fill='tozeroy'
-        ))
-        
-        fig_hum.update_layout(
-            title="Evolución de la Humedad en Tiempo Real",
-            xaxis_title="Tiempo",
-            yaxis_title="Humedad (%)",
-            hovermode='x unified',
-            height=400
-        )
         st.plotly_chart(fig_hum, use_container_width=True)
     
     with tab3:
-        # Gráfica de lechugas
-        fig_lettuce = px.line(df, x='timestamp', y='lechugas', 
-                                title='Evolución del Número de Lechugas',
-                                markers=True)
-        fig_lettuce.update_traces(line_color='#43e97b', line_width=3)
-        fig_lettuce.update_layout(height=400)
         st.plotly_chart(fig_lettuce, use_container_width=True)
     
     st.markdown("---")
     
     # Tabla de registros
     st.markdown("## 📋 Últimos Registros")
-    df_display = df.tail(15).copy()
-    df_display['timestamp'] = df_display['timestamp'].dt.strftime('%H:%M:%S')
-    df_display = df_display[['timestamp', 'temperatura', 'humedad', 'lechugas']]
-    df_display.columns = ['Hora', 'Temp (°C)', 'Humedad (%)', 'Lechugas']
     st.dataframe(df_display, use_container_width=True, hide_index=True)
+
+def dashboard_page():
+    """Página principal del dashboard"""
     
-    # Configuración de alertas
+    # Header
+    col1, col2 = st.columns([6, 1])
+    with col1:
+        st.markdown("# 🌱 Tlalibot - Dashboard de Lechugas")
+    with col2:
+        if st.button("Cerrar Sesión"):
+            st.session_state.logged_in = False
+            st.rerun()
+    
+    st.markdown("---")
+    
+    panel_en_vivo()
+    
+    # Configuración de alertas (se guarda en alertas.json al mover un slider)
     with st.expander("⚙️ Configurar Umbrales de Alerta"):
         st.markdown("### Ajusta los límites de temperatura y humedad")
+        temp_min, temp_max, hum_min, hum_max = cargar_limites()
         col1, col2 = st.columns(2)
         
         with col1:
             st.markdown("**🌡️ Temperatura**")
-            st.slider("Temp. Mínima (°C)", 10.0, 25.0, TEMP_MIN, 0.5, key="temp_min_slider")
-            st.slider("Temp. Máxima (°C)", 20.0, 35.0, TEMP_MAX, 0.5, key="temp_max_slider")
+            st.slider("Temp. Mínima (°C)", 10.0, 25.0, min(max(temp_min, 10.0), 25.0), 0.5, key="temp_min_slider", on_change=guardar_umbrales)
+            st.slider("Temp. Máxima (°C)", 20.0, 35.0, min(max(temp_max, 20.0), 35.0), 0.5, key="temp_max_slider", on_change=guardar_umbrales)
         
         with col2:
             st.markdown("**💧 Humedad**")
-            st.slider("Humedad Mínima (%)", 20.0, 50.0, HUMEDAD_MIN, 1.0, key="hum_min_slider")
-            st.slider("Humedad Máxima (%)", 40.0, 80.0, HUMEDAD_MAX, 1.0, key="hum_max_slider")
+            st.slider("Humedad Mínima (%)", 20.0, 50.0, min(max(hum_min, 20.0), 50.0), 1.0, key="hum_min_slider", on_change=guardar_umbrales)
+            st.slider("Humedad Máxima (%)", 40.0, 80.0, min(max(hum_max, 40.0), 80.0), 1.0, key="hum_max_slider", on_change=guardar_umbrales)
         
-        st.info("💡 Los valores se guardan en variables de sesión. Para cambios permanentes, modifica las constantes en el código.")
+        if st.session_state.get("error_umbrales"):
+            st.error(st.session_state.error_umbrales)
+        st.info("💡 Los cambios se guardan en alertas.json: los usan este panel y las alertas del bot de Telegram (/alertas on).")
+
+# ============================================
+# GALERÍA DE FOTOS PROCESADAS
+# ============================================
+@st.cache_data(max_entries=32, show_spinner=False)
+def cargar_pagina_fotos(pagina, version_bd):
+    """Total de análisis con foto y los de una página (solo se consulta si cambió la BD)"""
+    vigilante = obtener_vigilante()
+    total = vigilante.contar_fotos()
+    filas = vigilante.pagina_fotos(FOTOS_POR_PAGINA, pagina * FOTOS_POR_PAGINA)
+    return total, filas
+
+def describir_analisis(analisis):
+    """Texto corto con la fecha, el conteo y el clima de un análisis"""
+    partes = [analisis['fecha'], f"🥬 {analisis['lechugas']}"]
+    if analisis['temperatura'] is not None:
+        partes.append(f"🌡️ {analisis['temperatura']:.1f}°C")
+    if analisis['humedad'] is not None:
+        partes.append(f"💧 {analisis['humedad']:.1f}%")
+    return " · ".join(partes)
+
+@st.dialog("🖼️ Foto del análisis", width="large")
+def mostrar_foto(analisis):
+    """La foto completa solo se carga al abrirla"""
+    for titulo, columna in (("Detecciones", 'imagen_procesada'), ("Original", 'imagen')):
+        if analisis[columna]:
+            ruta = os.path.join(DIRECTORIO_BD, analisis[columna])
+            if os.path.exists(ruta):
+                st.markdown(f"**{titulo}**")
+                st.image(ruta, use_container_width=True)
+    st.caption(describir_analisis(analisis))
+
+def galeria_page():
+    """Fotos de los análisis guardados, con miniaturas y paginación"""
+    col1, col2 = st.columns([6, 1])
+    with col1:
+        st.markdown("# 🖼️ Galería de Análisis")
+    with col2:
+        if st.button("Cerrar Sesión", key="cerrar_sesion_galeria"):
+            st.session_state.logged_in = False
+            st.rerun()
+    
+    st.markdown("---")
+    
+    version_bd = obtener_vigilante().version()
+    total, _ = cargar_pagina_fotos(0, version_bd)
+    if not total:
+        st.info("📭 Todavía no hay análisis con foto. Usa /analizar en el bot de Telegram.")
+        return
+    
+    paginas = (total + FOTOS_POR_PAGINA - 1) // FOTOS_POR_PAGINA
+    col1, col2 = st.columns([1, 5])
+    with col1:
+        pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1, key="pagina_galeria")
+    with col2:
+        st.markdown(f"<br>📸 {total} análisis con foto · {paginas} páginas", unsafe_allow_html=True)
+    
+    _, filas = cargar_pagina_fotos(pagina - 1, version_bd)
+    columnas = st.columns(COLUMNAS_GALERIA)
+    for i, analisis in enumerate(filas):
+        with columnas[i % COLUMNAS_GALERIA]:
+            foto = analisis['imagen_procesada'] or analisis['imagen']
+            miniatura = obtener_miniatura(os.path.join(DIRECTORIO_BD, foto))
+            if miniatura:
+                st.image(miniatura, use_container_width=True)
+            else:
+                st.warning("⚠️ Foto no encontrada")
+            st.caption(describir_analisis(analisis))
+            if miniatura and st.button("🔍 Ver", key=f"ver_foto_{analisis['id']}"):
+                mostrar_foto(analisis)
 
 # Inicializar estado de sesión
 if 'logged_in' not in st.session_state:
@@ -601,11 +741,13 @@ if 'temp_actual' not in st.session_state:
     st.session_state.temp_actual = None
 if 'hum_actual' not in st.session_state:
     st.session_state.hum_actual = None
-if 'lechugas_actual' not in st.session_state:
-    st.session_state.lechugas_actual = 435
 
 # Mostrar página correspondiente
 if st.session_state.logged_in:
-    dashboard_page()
+    pagina = st.sidebar.radio("Navegación", ["📊 Dashboard", "🖼️ Galería"], key="pagina")
+    if pagina == "🖼️ Galería":
+        galeria_page()
+    else:
+        dashboard_page()
 else:
     login_page()
\ No newline at end of file
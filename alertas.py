@@ -0,0 +1,420 @@
+# ============================================
+# ALERTAS - Reglas sobre el flujo del sensor, con aviso por Telegram
+# Archivo: alertas.py
+# ============================================
+#
+# MotorAlertas se suscribe al servidor de datos y evalúa cada lectura en
+# cuanto llega (O(1) por lectura), sin depender de que alguien tenga el
+# dashboard abierto. Reglas:
+#   umbrales     -> mínimo/máximo con histéresis (avisa al salir y al volver)
+#   cambio       -> variación mayor a `max_delta` dentro de `ventana` segundos
+#   silencio     -> un sensor (tema) no manda lecturas hace `max_segundos`
+#   caida_conteo -> el conteo de lechugas bajó entre dos análisis
+#
+# La configuración vive en alertas.json (se crea con CONFIG_DEFECTO) y se
+# recarga sola cuando cambia: la editan los sliders del dashboard y el
+# comando /alertas del bot (chats suscritos). Un mismo aviso no se repite
+# antes de `antirebote` segundos, salvo los de umbral: su histéresis ya
+# evita avisos en cadena y un cruce nuevo siempre se avisa.
+#
+# main.py lo inicia con su bot. También se puede correr aparte:
+#   python alertas.py --token <token del bot>   # sin token solo imprime
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from historial import VigilanteBD
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_ALERTAS = os.path.join(BASE_DIR, "alertas.json")
+
+CONFIG_DEFECTO = {
+    "umbrales": {
+        "temperatura": {"minimo": 18.0, "maximo": 26.0, "histeresis": 0.5},
+        "humedad": {"minimo": 35.0, "maximo": 50.0, "histeresis": 2.0},
+    },
+    "cambio": {
+        "temperatura": {"max_delta": 3.0, "ventana": 600},
+        "humedad": {"max_delta": 10.0, "ventana": 600},
+    },
+    "silencio": {"max_segundos": 120},
+    "caida_conteo": {"min_porcentaje": 10.0, "min_lechugas": 5},
+    "antirebote": 300,
+    "chats": [],
+}
+
+NOMBRES = {"temperatura": "Temperatura", "humedad": "Humedad"}
+UNIDADES = {"temperatura": "°C", "humedad": "%"}
+ICONOS = {("temperatura", "alto"): "🔥", ("temperatura", "bajo"): "🥶",
+          ("humedad", "alto"): "💦", ("humedad", "bajo"): "💧"}
+
+# Cada cuánto se revisan silencio, conteo y cambios en la config
+INTERVALO_REVISION = 1.0
+# Lecturas que guarda cada regla de cambio (se submuestrea si llegan más)
+MAX_MUESTRAS_CAMBIO = 600
+
+# ---------- Configuración ----------
+def _combinar(base, extra):
+    for clave, valor in extra.items():
+        if isinstance(valor, dict) and isinstance(base.get(clave), dict):
+            _combinar(base[clave], valor)
+        else:
+            base[clave] = valor
+
+def cargar_config(ruta=CONFIG_ALERTAS):
+    """Config guardada sobre CONFIG_DEFECTO (lo que falte toma el valor por defecto)"""
+    config = json.loads(json.dumps(CONFIG_DEFECTO))  # Copia profunda
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            guardada = json.load(f)
+        # Nombre viejo: era el porcentaje mínimo de caída que dispara el aviso
+        caida = guardada.get("caida_conteo") if isinstance(guardada, dict) else None
+        if isinstance(caida, dict) and "max_porcentaje" in caida:
+            caida.setdefault("min_porcentaje", caida.pop("max_porcentaje"))
+        _combinar(config, guardada)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"⚠️ No se pudo leer {ruta}: {e}. Se usan los valores por defecto")
+    return config
+
+def guardar_config(config, ruta=CONFIG_ALERTAS):
+    """Escribe la config completa (archivo temporal + rename: nunca queda a medias)"""
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+def actualizar_config(cambios, ruta=CONFIG_ALERTAS):
+    """Combina `cambios` con la config guardada y la escribe. Retorna la config nueva"""
+    config = cargar_config(ruta)
+    _combinar(config, cambios)
+    guardar_config(config, ruta)
+    return config
+
+def suscribir_chat(chat_id, activo=True, ruta=CONFIG_ALERTAS):
+    """Agrega (o quita) un chat de Telegram de los que reciben avisos"""
+    config = cargar_config(ruta)
+    chats = [c for c in config["chats"] if c != chat_id]
+    if activo:
+        chats.append(chat_id)
+    config["chats"] = chats
+    guardar_config(config, ruta)
+
+def describir_config(config):
+    """Resumen de las reglas para mostrar en Telegram"""
+    lineas = []
+    for campo, u in config["umbrales"].items():
+        unidad = UNIDADES.get(campo, "")
+        lineas.append(f"• {NOMBRES.get(campo, campo)}: {u['minimo']}{unidad} - {u['maximo']}{unidad} "
+                      f"(histéresis {u['histeresis']}{unidad})")
+    for campo, c in config["cambio"].items():
+        lineas.append(f"• Cambio de {NOMBRES.get(campo, campo).lower()} > {c['max_delta']}{UNIDADES.get(campo, '')} "
+                      f"en {c['ventana'] // 60} min")
+    lineas.append(f"• Sensor sin lecturas > {config['silencio']['max_segundos']} s")
+    caida = config["caida_conteo"]
+    lineas.append(f"• Conteo baja ≥ {caida['min_porcentaje']}% y ≥ {caida['min_lechugas']} lechugas")
+    return "\n".join(lineas)
+
+def _mtime(ruta):
+    try:
+        return os.stat(ruta).st_mtime_ns
+    except OSError:
+        return None
+
+# ---------- Reglas ----------
+class ReglaUmbral:
+    """
+    Rango con histéresis: avisa al salir del rango y solo da por normal el
+    valor cuando vuelve `histeresis` unidades adentro (sin avisos en cadena
+    si el valor oscila justo en el límite).
+    """
+
+    # La histéresis ya filtra las oscilaciones: cada cruce real se avisa
+    ANTIREBOTE = False
+
+    def __init__(self, campo, minimo, maximo, histeresis=0.0):
+        self.campo = campo
+        self.minimo = minimo
+        self.maximo = maximo
+        self.histeresis = histeresis
+        self.estado = "normal"
+
+    def evaluar(self, valor, t, etiqueta):
+        """Retorna (clave, texto) si cambió el estado, si no None"""
+        nombre = NOMBRES.get(self.campo, self.campo)
+        unidad = UNIDADES.get(self.campo, "")
+        anterior = self.estado
+
+        if self.estado == "normal":
+            if valor > self.maximo:
+                self.estado = "alto"
+            elif valor < self.minimo:
+                self.estado = "bajo"
+        elif self.estado == "alto" and valor <= self.maximo - self.histeresis:
+            self.estado = "normal"
+        elif self.estado == "bajo" and valor >= self.minimo + self.histeresis:
+            self.estado = "normal"
+
+        if self.estado == anterior:
+            return None
+        clave = f"umbral:{etiqueta}:{self.campo}:{self.estado}"
+        if self.estado == "normal":
+            return clave, f"✅ {nombre}{etiqueta} de nuevo en rango: {valor:.1f}{unidad}"
+        limite = f"máx {self.maximo}{unidad}" if self.estado == "alto" else f"mín {self.minimo}{unidad}"
+        icono = ICONOS.get((self.campo, self.estado), "⚠️")
+        estado = "alta" if self.estado == "alto" else "baja"
+        return clave, f"{icono} {nombre}{etiqueta} {estado}: {valor:.1f}{unidad} ({limite})"
+
+class ReglaCambio:
+    """
+    Avisa si el valor cambió más de `max_delta` respecto a la lectura más
+    vieja de la ventana. Guarda a lo más MAX_MUESTRAS_CAMBIO lecturas.
+    """
+
+    ANTIREBOTE = True
+
+    def __init__(self, campo, max_delta, ventana):
+        self.campo = campo
+        self.max_delta = max_delta
+        self.ventana = ventana
+        self.lecturas = deque()
+        self.activa = False
+
+    def evaluar(self, valor, t, etiqueta):
+        lecturas = self.lecturas
+        while lecturas and t - lecturas[0][0] > self.ventana:
+            lecturas.popleft()
+        if not lecturas or t - lecturas[-1][0] >= self.ventana / MAX_MUESTRAS_CAMBIO:
+            lecturas.append((t, valor))
+
+        delta = valor - lecturas[0][1]
+        if self.activa:
+            # Se rearma cuando la variación baja a la mitad
+            if abs(delta) < self.max_delta / 2:
+                self.activa = False
+            return None
+        if abs(delta) < self.max_delta:
+            return None
+
+        self.activa = True
+        nombre = NOMBRES.get(self.campo, self.campo)
+        unidad = UNIDADES.get(self.campo, "")
+        verbo, icono = ("subió", "📈") if delta > 0 else ("bajó", "📉")
+        minutos = max(1, round((t - lecturas[0][0]) / 60))
+        return (f"cambio:{etiqueta}:{self.campo}",
+                f"{icono} {nombre}{etiqueta} {verbo} {abs(delta):.1f}{unidad} en {minutos} min "
+                f"(ahora {valor:.1f}{unidad})")
+
+# ---------- Motor ----------
+class MotorAlertas:
+    """
+    Evalúa las reglas sobre el flujo de `cliente` (un ClienteDatos) y manda
+    los avisos con `enviar(chat_id, texto)` a los chats suscritos.
+    Las lecturas llegan por una suscripción (pool de hilos del cliente);
+    silencio, conteo y recarga de config los revisa un hilo propio.
+    """
+
+    def __init__(self, cliente, enviar=None, ruta_config=CONFIG_ALERTAS, vigilante=None):
+        self.cliente = cliente
+        self.enviar = enviar
+        self.ruta_config = ruta_config
+        self.vigilante = vigilante or VigilanteBD()
+        self.suscripcion = None
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._enviados = {}
+        self._inicio = time.time()
+        self._ultima_lectura = {}  # tema -> time.time(), misma base que cliente.ultima_senal
+        self._silencio = set()     # Temas que ya se avisaron como callados
+        self._version_bd = None
+        self._reglas = {}       # tema -> {(tipo, campo): regla}
+        self._parametros = {}   # (tipo, campo) -> parámetros de la config
+        self._cargar_config()
+
+    def _cargar_config(self):
+        with self._lock:
+            self._mtime_config = _mtime(self.ruta_config)
+            self.config = cargar_config(self.ruta_config)
+            parametros = {("umbral", campo): u for campo, u in self.config["umbrales"].items()}
+            parametros.update({("cambio", campo): c for campo, c in self.config["cambio"].items()})
+            # Solo se rehacen las reglas que cambiaron: las demás conservan su
+            # estado (histéresis, ventana) y no repiten avisos ya mandados
+            for reglas in self._reglas.values():
+                for llave in list(reglas):
+                    if parametros.get(llave) != self._parametros.get(llave):
+                        del reglas[llave]
+            self._parametros = parametros
+
+    def _reglas_de(self, tema):
+        reglas = self._reglas.setdefault(tema, {})  # Cada sensor con su propio estado
+        if len(reglas) != len(self._parametros):
+            for llave, parametros in self._parametros.items():
+                if llave not in reglas:
+                    tipo, campo = llave
+                    clase = ReglaUmbral if tipo == "umbral" else ReglaCambio
+                    reglas[llave] = clase(campo, **parametros)
+        return list(reglas.values())
+
+    def iniciar(self):
+        """Se suscribe al flujo y arranca el hilo de revisión"""
+        if self.suscripcion is None:
+            self.suscripcion = self.cliente.suscribirse(self.procesar, max_cola=1000)
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="alertas")
+            self._hilo.start()
+        print(f"🔔 Motor de alertas activo ({len(self.config['chats'])} chats suscritos)")
+
+    def procesar(self, dato):
+        """Evalúa una lectura (callback de la suscripción)"""
+        ahora = time.monotonic()
+        tema = dato.get("tema")
+        etiqueta = f" ({tema})" if tema else ""
+        avisos = []
+        with self._lock:
+            self._ultima_lectura[tema] = time.time()
+            if tema in self._silencio:
+                self._silencio.discard(tema)
+                avisos.append((f"silencio:fin:{tema}", f"📡 El sensor{etiqueta} volvió a enviar lecturas", True))
+            for regla in self._reglas_de(tema):
+                valor = dato.get(regla.campo)
+                if valor is None:
+                    continue
+                aviso = regla.evaluar(float(valor), ahora, etiqueta)
+                if aviso:
+                    avisos.append((*aviso, regla.ANTIREBOTE))
+        for clave, texto, antirebote in avisos:
+            self._notificar(clave, texto, antirebote)
+
+    def _bucle(self):
+        while not self._detener.wait(INTERVALO_REVISION):
+            try:
+                self._revisar()
+            except Exception as e:
+                print(f"⚠️ Error revisando alertas: {e}")
+
+    def _revisar(self):
+        if _mtime(self.ruta_config) != self._mtime_config:
+            self._cargar_config()
+            print("🔄 Configuración de alertas recargada")
+
+        for clave, texto in self._revisar_silencio():
+            self._notificar(clave, texto)
+
+        # Caída del conteo: solo se consulta si main.py escribió en la BD
+        version = self.vigilante.version()
+        if version == self._version_bd:
+            return
+        primera = self._version_bd is None
+        self._version_bd = version
+        conteos = self.vigilante.ultimos_conteos(2)
+        if primera or len(conteos) < 2:
+            return
+        (_, anterior), (_, actual) = conteos
+        caida = anterior - actual
+        regla = self.config["caida_conteo"]
+        if anterior > 0 and caida >= regla["min_lechugas"] and caida / anterior * 100 >= regla["min_porcentaje"]:
+            self._notificar(f"conteo:{actual}",
+                            f"🥬 El conteo bajó de {anterior} a {actual} lechugas ({-caida / anterior * 100:.1f}%)")
+
+    def _revisar_silencio(self):
+        """
+        Silencio por tema: un sensor caído avisa aunque los demás sigan
+        reportando. Cuentan también los latidos, que no llegan a procesar()
+        (con banda muerta un valor estable solo manda latidos).
+        Retorna los avisos [(clave, texto)].
+        """
+        max_silencio = self.config["silencio"]["max_segundos"]
+        senales = dict(self.cliente.ultima_senal)
+        ahora = time.time()
+        avisos = []
+        with self._lock:
+            ultimas = dict(self._ultima_lectura)
+            for tema, t in senales.items():
+                ultimas[tema] = max(t, ultimas.get(tema, t))
+            if not ultimas:
+                ultimas[None] = self._inicio  # Todavía no llega nada de ningún sensor
+            # Un tema que ya no aparece (el None del arranque) deja de contar como callado
+            for tema in self._silencio - ultimas.keys():
+                ultimas[tema] = ahora
+
+            for tema, ultima in ultimas.items():
+                silencio = ahora - ultima
+                etiqueta = f" ({tema})" if tema else ""
+                if tema not in self._silencio and silencio > max_silencio:
+                    self._silencio.add(tema)
+                    avisos.append((f"silencio:{tema}", f"🔇 Sin lecturas del sensor{etiqueta} hace {silencio:.0f} s"))
+                elif tema in self._silencio and silencio <= max_silencio:
+                    self._silencio.discard(tema)
+                    avisos.append((f"silencio:fin:{tema}", f"📡 El sensor{etiqueta} volvió a enviar lecturas"))
+        return avisos
+
+    def _notificar(self, clave, texto, antirebote=True):
+        """
+        Manda el aviso a los chats suscritos, salvo que se haya mandado hace
+        poco (con `antirebote`). El estado de las reglas cambia de todos modos.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            ultimo = self._enviados.get(clave)
+            if antirebote and ultimo is not None and ahora - ultimo < self.config["antirebote"]:
+                return
+            self._enviados[clave] = ahora
+            chats = list(self.config["chats"])
+
+        print(f"🔔 {texto}")
+        if self.enviar is None:
+            return
+        for chat_id in chats:
+            try:
+                self.enviar(chat_id, texto)
+            except Exception as e:
+                print(f"❌ Error enviando alerta a {chat_id}: {e}")
+
+    def detener(self):
+        self._detener.set()
+        if self.suscripcion is not None:
+            self.cliente.desuscribirse(self.suscripcion)
+            self.suscripcion = None
+        if self._hilo and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout=2)
+
+if __name__ == "__main__":
+    from cliente_datos import ClienteDatos
+
+    parser = argparse.ArgumentParser(description="Motor de alertas del sensor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=5000)
+    parser.add_argument("--config", default=CONFIG_ALERTAS, help="Archivo JSON de reglas")
+    parser.add_argument("--token", default=os.environ.get("TLALIBOT_TOKEN"),
+                        help="Token del bot de Telegram (o variable TLALIBOT_TOKEN)")
+    args = parser.parse_args()
+
+    enviar = None
+    if args.token:
+        import telebot
+        bot = telebot.TeleBot(args.token)
+        enviar = bot.send_message
+    else:
+        print("⚠️ Sin token de Telegram: las alertas solo se imprimen")
+
+    if not os.path.exists(args.config):
+        guardar_config(cargar_config(args.config), args.config)
+        print(f"📝 Configuración creada en {args.config}")
+
+    cliente = ClienteDatos(host=args.host, puerto=args.puerto)
+    motor = MotorAlertas(cliente, enviar=enviar, ruta_config=args.config)
+    motor.iniciar()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n✋ Alertas detenidas")
+        motor.detener()
+        cliente.desconectar()
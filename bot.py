@@ -1,7 +1,7 @@
 import telebot
 from script_lechugas import recortar_lechugas_optimizado, dibujar_lechugas
-from db import guardar_registro
-from cliente_datos import ClienteDatos
+from db import guardar_registro, inicializar
+from cliente_datos import consultar
 import os
 import cv2
 
@@ -19,8 +19,12 @@ TOKEN = "8404642199:AAG7-nOu0W7Y_slsFjoq8BwInY7SiylwmfI"
 
 bot = telebot.TeleBot(TOKEN)
 
-# Cliente de datos
-cliente = ClienteDatos(host="127.0.0.1", puerto=5000)
+# Tabla y columnas de registros.db
+inicializar()
+
+# Servidor de datos (se consulta por mensaje, sin conexión permanente)
+HOST_DATOS = "127.0.0.1"
+PUERTO_DATOS = 5000
 
 # Reintentos de conexión
 MAX_INTENTOS = 3
@@ -40,8 +44,12 @@ def obtener_datos_sensor():
     print("⏳ Obteniendo datos del sensor...")
     for intento in range(MAX_INTENTOS):
         try:
-            data = cliente.obtener_datos()
-            return data
+            respuesta = consultar({"cmd": "ultimo"}, host=HOST_DATOS, puerto=PUERTO_DATOS)
+            datos = respuesta.get("datos") or {}
+            if not datos:
+                return None
+            # Con varios sensores, el más reciente
+            return max(datos.values(), key=lambda d: d.get("seq", 0))
         except Exception as e:
             print(f"❌ Intento {intento + 1}/{MAX_INTENTOS} - Error: {e}")
             if intento < MAX_INTENTOS - 1:
@@ -137,5 +145,4 @@ print("Esperando comandos del usuario...")
 try:
     bot.infinity_polling()
 except KeyboardInterrupt:
-    cliente.desconectar()
     print("\n✋ Bot detenido")
\ No newline at end of file
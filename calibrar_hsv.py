@@ -0,0 +1,317 @@
+# ============================================
+# CALIBRADOR HSV - Umbrales de verde a partir de los datos
+# Archivo: calibrar_hsv.py
+# ============================================
+#
+# Calcula lower_green / upper_green para script_lechugas.py sin clics ni
+# barridos: acumula un histograma 3D de H, S y V cuantizados de todas las
+# imágenes (np.bincount, una imagen a la vez) y saca los límites de esas
+# distribuciones.
+#
+# Uso:
+#   python calibrar_hsv.py fotos_capturadas                    # solo imágenes
+#   python calibrar_hsv.py --positivos recortes/lechuga --negativos recortes/suelo
+#   python calibrar_hsv.py "fotos/*.png" --positivos recortes/lechuga --reducir 2
+#
+# Sin recortes etiquetados: toma el pico de tono en la banda verde (hasta
+# el valle que lo separa del suelo) y recorta las colas de saturación y
+# brillo dentro de esos tonos. Con recortes de lechuga (positivos) busca la
+# caja HSV que cubre más de ellos y menos del fondo (negativos, o todas las
+# imágenes si no hay negativos) y además estima el área mínima/máxima.
+# El resultado se guarda en config_hsv.json, que
+# script_lechugas.cargar_config_hsv() lee.
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from normalizar_imagenes import listar_imagenes
+from script_lechugas import CONFIG_HSV
+
+# --reducir: el decodificador entrega la imagen ya achicada (mucho más rápido)
+LECTURA_REDUCIDA = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                    4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+# Cuantización: H de OpenCV va de 0 a 179, S y V de 0 a 255
+PASO_H = 1
+PASO_SV = 4
+
+# Banda de tonos donde se busca el verde y mínimos para no contar grises
+BANDA_VERDE = (25, 90)
+S_MIN_VERDE = 40
+V_MIN_VERDE = 40
+FRACCION_PICO = 0.10   # Fracción del pico donde se corta la banda de tono
+COLA_SV = 0.02         # Fracción que se descarta en cada cola de S y V
+
+# Con recortes etiquetados
+COBERTURA = 0.95       # Fracción de píxeles de lechuga que debe cubrir la caja inicial
+PESO_FONDO = 2.0       # Cuánto castiga cubrir fondo frente a perder lechuga
+MAX_PASOS_AJUSTE = 2000
+
+# Área de una lechuga: percentiles de las áreas medidas (recortes o
+# contornos de una muestra de imágenes) con holgura
+MUESTRA_AREAS = 20
+AREA_RUIDO = 30        # Contornos más chicos no se miden
+PERCENTILES_AREA = (10, 90)
+FACTORES_AREA = (0.5, 1.5)
+
+class HistogramaHSV:
+    """Histograma 3D de H, S, V cuantizados que se acumula imagen por imagen"""
+
+    def __init__(self, paso_h=PASO_H, paso_sv=PASO_SV):
+        self.paso_h = paso_h
+        self.paso_sv = paso_sv
+        self.forma = (-(-180 // paso_h), -(-256 // paso_sv), -(-256 // paso_sv))
+        self.conteos = np.zeros(int(np.prod(self.forma)), dtype=np.int64)
+        self.imagenes = 0
+
+    def agregar(self, img):
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV).reshape(-1, 3)
+        h = hsv[:, 0].astype(np.int32) // self.paso_h
+        s = hsv[:, 1].astype(np.int32) // self.paso_sv
+        v = hsv[:, 2].astype(np.int32) // self.paso_sv
+        indices = (h * self.forma[1] + s) * self.forma[2] + v
+        self.conteos += np.bincount(indices, minlength=self.conteos.size)
+        self.imagenes += 1
+
+    def cubo(self):
+        return self.conteos.reshape(self.forma)
+
+    def a_valores(self, caja):
+        """Caja de índices (h0, h1, s0, s1, v0, v1) inclusiva -> (lower, upper) en unidades de OpenCV"""
+        h0, h1, s0, s1, v0, v1 = caja
+        lower = [h0 * self.paso_h, s0 * self.paso_sv, v0 * self.paso_sv]
+        upper = [min(179, (h1 + 1) * self.paso_h - 1),
+                 min(255, (s1 + 1) * self.paso_sv - 1),
+                 min(255, (v1 + 1) * self.paso_sv - 1)]
+        return lower, upper
+
+def acumular(rutas, histograma, reducir=1):
+    """Agrega al histograma cada imagen de `rutas` (una a la vez). Retorna cuántas leyó"""
+    leidas = 0
+    for ruta in rutas:
+        img = cv2.imread(ruta, LECTURA_REDUCIDA[reducir])
+        if img is None:
+            print(f"⚠️ No se pudo leer {ruta}")
+            continue
+        histograma.agregar(img)
+        leidas += 1
+    return leidas
+
+def _cuantil(marginal, q):
+    acumulado = np.cumsum(marginal)
+    return int(np.searchsorted(acumulado, q * acumulado[-1]))
+
+def caja_sin_etiquetas(histograma):
+    """Pico de tono verde y cuantiles de saturación y brillo dentro de él"""
+    cubo = histograma.cubo()
+    s_min, v_min = S_MIN_VERDE // histograma.paso_sv, V_MIN_VERDE // histograma.paso_sv
+    tonos = cubo[:, s_min:, v_min:].sum(axis=(1, 2)).astype(float)
+    tonos = np.convolve(tonos, [1, 2, 3, 2, 1], mode="same") / 9
+
+    banda = slice(BANDA_VERDE[0] // histograma.paso_h, BANDA_VERDE[1] // histograma.paso_h + 1)
+    if tonos[banda].sum() == 0:
+        raise ValueError("No hay píxeles verdes en las imágenes")
+    pico = banda.start + int(tonos[banda].argmax())
+    # Se extiende mientras siga bajando y no caiga de FRACCION_PICO: para
+    # en el valle que lo separa del suelo (naranja/café) o de otro pico
+    minimo = FRACCION_PICO * tonos[pico]
+    h0 = h1 = pico
+    while h0 > banda.start and minimo <= tonos[h0 - 1] <= tonos[h0]:
+        h0 -= 1
+    while h1 < banda.stop - 1 and minimo <= tonos[h1 + 1] <= tonos[h1]:
+        h1 += 1
+
+    # Dentro de esos tonos: se recortan las colas (sombras, reflejos, grises)
+    saturacion = cubo[h0:h1 + 1, s_min:, v_min:].sum(axis=(0, 2))
+    s0 = s_min + _cuantil(saturacion, COLA_SV)
+    brillo = cubo[h0:h1 + 1, s0:, v_min:].sum(axis=(0, 1))
+    v0 = v_min + _cuantil(brillo, COLA_SV)
+    v1 = max(v0, v_min + _cuantil(brillo, 1 - COLA_SV))
+    return (h0, h1, s0, cubo.shape[1] - 1, v0, v1)
+
+def _integral(cubo):
+    """Suma acumulada 3D con borde de ceros: cualquier caja se suma en O(1)"""
+    integral = np.zeros(tuple(n + 1 for n in cubo.shape), dtype=np.float64)
+    integral[1:, 1:, 1:] = cubo.cumsum(0).cumsum(1).cumsum(2)
+    return integral
+
+def suma_caja(integral, caja):
+    h0, h1, s0, s1, v0, v1 = caja
+    h1, s1, v1 = h1 + 1, s1 + 1, v1 + 1
+    return (integral[h1, s1, v1] - integral[h0, s1, v1] - integral[h1, s0, v1] - integral[h1, s1, v0]
+            + integral[h0, s0, v1] + integral[h0, s1, v0] + integral[h1, s0, v0] - integral[h0, s0, v0])
+
+def caja_con_etiquetas(positivos, fondo, cobertura=COBERTURA, peso_fondo=PESO_FONDO):
+    """
+    Caja que maximiza (lechuga cubierta) - peso_fondo * (fondo cubierto).
+    Empieza con los cuantiles de cada canal de los positivos y mueve un
+    límite a la vez mientras mejore.
+    """
+    cubo = positivos.cubo()
+    cola = (1 - cobertura) / 2
+    caja = []
+    for eje in range(3):
+        marginal = cubo.sum(axis=tuple(e for e in range(3) if e != eje))
+        caja += [_cuantil(marginal, cola), _cuantil(marginal, 1 - cola)]
+
+    if fondo is None:
+        return tuple(caja)
+
+    integral_pos = _integral(cubo.astype(np.float64) / max(1, cubo.sum()))
+    fondo_cubo = fondo.cubo()
+    integral_fondo = _integral(fondo_cubo.astype(np.float64) / max(1, fondo_cubo.sum()))
+
+    def puntaje(c):
+        return suma_caja(integral_pos, c) - peso_fondo * suma_caja(integral_fondo, c)
+
+    limites = [cubo.shape[0] - 1] * 2 + [cubo.shape[1] - 1] * 2 + [cubo.shape[2] - 1] * 2
+    actual = puntaje(caja)
+    for _ in range(MAX_PASOS_AJUSTE):
+        mejor = None
+        for i in range(6):
+            for delta in (-1, 1):
+                nueva = list(caja)
+                nueva[i] += delta
+                if not 0 <= nueva[i] <= limites[i] or nueva[i - i % 2] > nueva[i - i % 2 + 1]:
+                    continue
+                valor = puntaje(nueva)
+                if valor > actual + 1e-12 and (mejor is None or valor > mejor[0]):
+                    mejor = (valor, nueva)
+        if mejor is None:
+            break
+        actual, caja = mejor
+    return tuple(caja)
+
+def areas_recortes(rutas, lower, upper, reducir=1):
+    """Píxeles dentro de los límites en cada recorte positivo"""
+    areas = []
+    for ruta in rutas:
+        img = cv2.imread(ruta, LECTURA_REDUCIDA[reducir])
+        if img is not None:
+            mascara = cv2.inRange(cv2.cvtColor(img, cv2.COLOR_BGR2HSV), np.array(lower), np.array(upper))
+            areas.append(int(cv2.countNonZero(mascara)))
+    return areas
+
+def limites_area(areas):
+    """(min_area, max_area) a partir de áreas medidas. None si no hay"""
+    if not areas:
+        return None
+    bajo, alto = np.percentile(areas, PERCENTILES_AREA)
+    return int(FACTORES_AREA[0] * bajo), int(FACTORES_AREA[1] * alto)
+
+def areas_contornos(rutas, lower, upper, reducir=1):
+    """Áreas de los contornos que deja la máscara en una muestra de `rutas`, limpiada como en script_lechugas"""
+    kernel = np.ones((5, 5), np.uint8)
+    paso = max(1, len(rutas) // MUESTRA_AREAS)
+    areas = []
+    for ruta in rutas[::paso][:MUESTRA_AREAS]:
+        img = cv2.imread(ruta, LECTURA_REDUCIDA[reducir])
+        if img is None:
+            continue
+        mascara = cv2.inRange(cv2.cvtColor(img, cv2.COLOR_BGR2HSV), np.array(lower), np.array(upper))
+        mascara = cv2.morphologyEx(mascara, cv2.MORPH_CLOSE, kernel, iterations=2)
+        mascara = cv2.morphologyEx(mascara, cv2.MORPH_OPEN, kernel, iterations=2)
+        contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        areas += [cv2.contourArea(c) * reducir * reducir for c in contornos]
+    return [a for a in areas if a >= AREA_RUIDO]
+
+def calibrar(imagenes=(), positivos=(), negativos=(), reducir=1, paso_h=PASO_H, paso_sv=PASO_SV,
+             cobertura=COBERTURA, peso_fondo=PESO_FONDO):
+    """
+    Calcula la configuración HSV. `imagenes`, `positivos` y `negativos` son
+    listas de carpetas o patrones glob. Retorna el diccionario para config_hsv.json
+    """
+    inicio = time.monotonic()
+    rutas_pos = [r for r, _ in listar_imagenes(positivos)]
+    hist_pos = HistogramaHSV(paso_h, paso_sv) if rutas_pos else None
+    if hist_pos:
+        acumular(rutas_pos, hist_pos, reducir)
+
+    # El fondo: recortes negativos, o todas las imágenes si no hay
+    rutas_imagenes = [r for r, _ in listar_imagenes(imagenes)]
+    rutas_fondo = [r for r, _ in listar_imagenes(negativos)] or rutas_imagenes
+    hist_fondo = None
+    if rutas_fondo:
+        hist_fondo = HistogramaHSV(paso_h, paso_sv)
+        acumular(rutas_fondo, hist_fondo, reducir)
+        metodo_fondo = "imagenes" if rutas_fondo is rutas_imagenes else "negativos"
+
+    if hist_pos and hist_pos.imagenes:
+        caja = caja_con_etiquetas(hist_pos, hist_fondo, cobertura, peso_fondo)
+        histograma = hist_pos
+        metodo = "recortes" + (f" + fondo de {metodo_fondo}" if hist_fondo else "")
+    elif hist_fondo and hist_fondo.imagenes:
+        caja = caja_sin_etiquetas(hist_fondo)
+        histograma = hist_fondo
+        metodo = "histograma"
+    else:
+        raise ValueError("No se encontraron imágenes para calibrar")
+
+    lower, upper = histograma.a_valores(caja)
+    config = {"lower_green": lower, "upper_green": upper}
+    calibracion = {
+        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "metodo": metodo,
+        "reducir": reducir,
+        "fondo": hist_fondo.imagenes if hist_fondo else 0,
+        "positivos": hist_pos.imagenes if hist_pos else 0,
+    }
+
+    # Área de una lechuga en píxeles de la imagen completa (con el mismo factor de reducción)
+    if hist_pos and hist_pos.imagenes:
+        integral_pos = _integral(hist_pos.cubo().astype(np.float64))
+        calibracion["cobertura_positivos"] = round(suma_caja(integral_pos, caja) / hist_pos.conteos.sum(), 4)
+        areas = [a * reducir * reducir for a in areas_recortes(rutas_pos, lower, upper, reducir) if a > 0]
+    else:
+        areas = areas_contornos(rutas_imagenes, lower, upper, reducir)
+    area = limites_area(areas)
+    if area:
+        config["min_area"], config["max_area"] = area
+
+    if hist_fondo:
+        integral_fondo = _integral(hist_fondo.cubo().astype(np.float64))
+        calibracion["fraccion_fondo"] = round(suma_caja(integral_fondo, caja) / max(1, hist_fondo.conteos.sum()), 4)
+
+    calibracion["segundos"] = round(time.monotonic() - inicio, 2)
+    config["calibracion"] = calibracion
+    return config
+
+def guardar_config(config, ruta=CONFIG_HSV):
+    ruta = str(ruta)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+    os.replace(ruta + ".tmp", ruta)
+
+def main():
+    parser = argparse.ArgumentParser(description="Calcula los umbrales HSV de verde a partir de imágenes")
+    parser.add_argument("imagenes", nargs="*", help="Carpetas o patrones glob con imágenes completas")
+    parser.add_argument("--positivos", nargs="+", default=[], help="Recortes de lechuga (carpetas o glob)")
+    parser.add_argument("--negativos", nargs="+", default=[], help="Recortes de suelo/fondo (carpetas o glob)")
+    parser.add_argument("--reducir", type=int, choices=sorted(LECTURA_REDUCIDA), default=1,
+                        help="Leer las imágenes reducidas por este factor (más rápido)")
+    parser.add_argument("--cobertura", type=float, default=COBERTURA,
+                        help="Fracción de píxeles de lechuga a cubrir con la caja inicial")
+    parser.add_argument("--peso-fondo", type=float, default=PESO_FONDO,
+                        help="Cuánto castigar el fondo cubierto al ajustar la caja")
+    parser.add_argument("--salida", default=str(CONFIG_HSV), help="Archivo de configuración a escribir")
+    parser.add_argument("--simular", action="store_true", help="Solo mostrar el resultado, sin guardar")
+    args = parser.parse_args()
+
+    if not args.imagenes and not args.positivos:
+        parser.error("Indica imágenes o --positivos")
+
+    config = calibrar(args.imagenes, args.positivos, args.negativos, reducir=args.reducir,
+                      cobertura=args.cobertura, peso_fondo=args.peso_fondo)
+    print(json.dumps(config, indent=2, ensure_ascii=False))
+    if not args.simular:
+        guardar_config(config, args.salida)
+        print(f"✓ Configuración guardada en {args.salida}")
+
+if __name__ == "__main__":
+    main()
@@ -2,79 +2,820 @@
 # MÓDULO CLIENTE - Para usar en tus scripts
 # Archivo: cliente_datos.py
 # ============================================
+#
+# Transportes (transporte="auto" elige el más rápido disponible):
+#   "memoria" -> obtener_datos() lee el último valor de la memoria compartida
+#                del servidor, sin socket ni thread (solo mismo equipo)
+#   "unix"    -> flujo por el socket Unix del servidor (solo mismo equipo)
+#   "tcp"     -> flujo por TCP (funciona desde cualquier equipo)
+# Con "auto" en el mismo equipo el flujo va por Unix (o TCP si no hay) y
+# obtener_datos() usa la memoria compartida si está disponible. "auto" solo
+# usa un socket o segmento que sea del usuario actual y que otros no puedan
+# escribir; con "unix"/"memoria" explícitos se confía en la ruta dada.
+#
+# Hay dos versiones con la misma lógica de protocolo:
+#   ClienteDatos       -> un solo thread que lee y también reconecta
+#   ClienteDatosAsync  -> para programas con asyncio, sin threads:
+#       async with ClienteDatosAsync() as cliente:
+#           async for dato in cliente:
+#               ...
+#
+# Si se cae la conexión se reintenta con espera exponencial y jitter
+# (RECONEXION_MIN .. RECONEXION_MAX), así muchos clientes no golpean al
+# servidor todos a la vez cuando vuelve.
+#
+# Frescura: cada cliente guarda las lecturas recientes (con la hora en que
+# llegaron) en un buffer circular de NumPy:
+#   cliente.esperar_dato(max_edad=10, timeout=5)  -> dato de hace <= 10 s o None
+#   cliente.estadisticas_ventana(60)              -> media/mín/máx del último minuto
+#
+# Suscriptores (ClienteDatos): cada callback tiene su cola y corre en un pool
+# de hilos, así una escritura a BD o un envío HTTP no frena la lectura:
+#   s = cliente.suscribirse(guardar, max_cola=500, politica="bloquear")
+#   cliente.estadisticas_suscriptores()  -> descartados, espera y duración
 
+import asyncio
+import fnmatch
+import os
+import random
 import socket
 import json
 import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-class ClienteDatos:
-    def __init__(self, host="127.0.0.1", puerto=5000):
+import numpy as np
+
+from memoria_compartida import LectorUltimo, ruta_segmento
+from protocolo import CAMPOS_LECTURA, LectorFlujo, FORMATO_JSON, es_privado, ruta_socket_unix
+
+TRANSPORTES = ("auto", "memoria", "unix", "tcp")
+HOSTS_LOCALES = ("127.0.0.1", "localhost", "::1")
+
+# Cada cuánto reintentar abrir la memoria compartida si no estaba
+REINTENTO_MEMORIA = 5.0
+
+# Bytes por lectura del socket (se reutiliza el mismo buffer)
+TAMANO_RECV = 64 * 1024
+TIMEOUT_CONEXION = 5.0
+
+# Espera entre reintentos de conexión (segundos)
+RECONEXION_MIN = 0.5
+RECONEXION_MAX = 30.0
+
+# Datos que ClienteDatosAsync guarda para `async for` si nadie los consume
+MAX_COLA_ASYNC = 1000
+
+# Lecturas recientes que se guardan por tema para consultas por ventana
+CAPACIDAD_RECIENTES = 4096
+
+# Suscriptores de ClienteDatos: cola por callback y qué hacer si se llena
+#   "descartar_viejo" -> se tira el dato más viejo de la cola (default)
+#   "descartar_nuevo" -> se tira el dato que acaba de llegar
+#   "bloquear"        -> el thread de lectura espera (frena al servidor)
+POLITICAS_SUSCRIPCION = ("descartar_viejo", "descartar_nuevo", "bloquear")
+MAX_COLA_SUSCRIPTOR = 100
+HILOS_SUSCRIPTORES = 4
+# Datos que un suscriptor procesa antes de ceder su hilo a los demás
+LOTE_SUSCRIPTOR = 64
+
+def espera_reconexion(intentos, minimo=RECONEXION_MIN, maximo=RECONEXION_MAX):
+    """Espera exponencial con jitter: la mitad fija y la otra mitad al azar"""
+    base = min(maximo, minimo * (2 ** min(intentos, 16)))
+    return base / 2 + random.uniform(0, base / 2)
+
+def _ruta_unix_disponible(host, puerto, ruta, transporte):
+    ruta = ruta or ruta_socket_unix(puerto)
+    if host in HOSTS_LOCALES and ruta:
+        if transporte == "unix" and os.path.exists(ruta):
+            return ruta
+        if transporte == "auto" and es_privado(ruta):
+            return ruta
+    if transporte == "unix":
+        raise ConnectionError(f"No hay socket Unix en {ruta}")
+    return None
+
+def _abrir_socket(host, puerto, ruta=None, transporte="auto", timeout=None):
+    """Socket Unix si se puede (mismo equipo), si no TCP. Retorna (socket, nombre)"""
+    ruta = _ruta_unix_disponible(host, puerto, ruta, transporte)
+    if ruta:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(ruta)
+            return sock, "unix"
+        except OSError:
+            sock.close()
+            if transporte == "unix":
+                raise
+    return socket.create_connection((host, puerto), timeout=timeout), "tcp"
+
+class _Anillo:
+    """Buffer circular de (hora de llegada, valores) para un tema"""
+
+    def __init__(self, capacidad, num_campos):
+        self.t = np.zeros(capacidad)
+        self.valores = np.full((capacidad, num_campos), np.nan)
+        self.siguiente = 0
+        self.lleno = False
+
+    def agregar(self, t, valores):
+        i = self.siguiente
+        self.t[i] = t
+        self.valores[i] = valores
+        self.siguiente = (i + 1) % len(self.t)
+        if self.siguiente == 0:
+            self.lleno = True
+
+    def desde(self, t_min):
+        """Valores que llegaron en t >= t_min (el orden no importa para agregar)"""
+        n = len(self.t) if self.lleno else self.siguiente
+        mascara = self.t[:n] >= t_min
+        return self.valores[:n][mascara]
+
+def _a_float(valor):
+    """float o NaN: una lectura no numérica no debe tumbar la conexión"""
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return np.nan
+
+class LecturasRecientes:
+    """
+    Lecturas recientes por tema en buffers circulares de NumPy, con la hora
+    de llegada. Memoria fija: `capacidad` lecturas por tema.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_RECIENTES, campos=CAMPOS_LECTURA):
+        self.capacidad = capacidad
+        self.campos = tuple(campos)
+        self._anillos = {}
+        self._lock = threading.Lock()
+
+    def agregar(self, dato, t=None):
+        valores = [dato.get(c) for c in self.campos]
+        if all(v is None for v in valores):
+            return
+        valores = [_a_float(v) for v in valores]
+        tema = dato.get("tema")
+        with self._lock:
+            anillo = self._anillos.get(tema)
+            if anillo is None:
+                anillo = self._anillos[tema] = _Anillo(self.capacidad, len(self.campos))
+            anillo.agregar(time.time() if t is None else t, valores)
+
+    def ventana(self, segundos, tema=None):
+        """
+        Media/mín/máx de lo llegado en los últimos `segundos` (de un tema o
+        de todos). Retorna {"muestras": n, campo: {"media", "min", "max"}}
+        o None si no llegó nada en ese tiempo.
+        """
+        t_min = time.time() - segundos
+        with self._lock:
+            if tema is not None:
+                anillo = self._anillos.get(tema)
+                partes = [anillo.desde(t_min)] if anillo else []
+            else:
+                partes = [a.desde(t_min) for a in self._anillos.values()]
+        valores = np.concatenate(partes) if partes else np.empty((0, len(self.campos)))
+        if not len(valores):
+            return None
+
+        resumen = {"muestras": len(valores)}
+        for i, campo in enumerate(self.campos):
+            columna = valores[:, i]
+            columna = columna[~np.isnan(columna)]
+            if len(columna):
+                resumen[campo] = {
+                    "media": round(float(columna.mean()), 2),
+                    "min": float(columna.min()),
+                    "max": float(columna.max()),
+                }
+        return resumen
+
+class Suscripcion:
+    """
+    Un callback con su propia cola acotada. Se ejecuta en el pool de hilos
+    del cliente, nunca en el thread que lee el socket, y siempre en orden
+    (un solo hilo a la vez por suscripción).
+    """
+
+    def __init__(self, callback, ejecutor, max_cola=MAX_COLA_SUSCRIPTOR, politica="descartar_viejo"):
+        if politica not in POLITICAS_SUSCRIPCION:
+            raise ValueError(f"Política desconocida: {politica}")
+        if max_cola < 1:
+            raise ValueError("max_cola debe ser al menos 1")
+        self.callback = callback
+        self.nombre = getattr(callback, "__name__", repr(callback))
+        self.max_cola = max_cola
+        self.politica = politica
+        self.activa = True
+        self._ejecutor = ejecutor
+        self._cola = deque()
+        self._cond = threading.Condition()
+        self._programada = False
+
+        self.entregados = 0
+        self.descartados = 0
+        self.errores = 0
+        self._espera_total = self._espera_max = 0.0
+        self._duracion_total = self._duracion_max = 0.0
+
+    def encolar(self, dato, t):
+        """Lo llama el thread de lectura; `t` es time.monotonic() de llegada"""
+        with self._cond:
+            if not self.activa:
+                return
+            if len(self._cola) >= self.max_cola:
+                if self.politica == "descartar_nuevo":
+                    self.descartados += 1
+                    return
+                if self.politica == "descartar_viejo":
+                    self._cola.popleft()
+                    self.descartados += 1
+                else:
+                    while len(self._cola) >= self.max_cola and self.activa:
+                        self._cond.wait(0.5)
+                    if not self.activa:
+                        return
+            self._cola.append((dato, t))
+            if self._programada:
+                return
+            self._programada = True
+        try:
+            self._ejecutor.submit(self._drenar)
+        except RuntimeError:
+            self.cancelar()  # El pool ya se cerró (desconectar)
+
+    def _drenar(self):
+        for _ in range(LOTE_SUSCRIPTOR):
+            with self._cond:
+                if not self._cola or not self.activa:
+                    self._programada = False
+                    self._cond.notify_all()
+                    return
+                dato, t = self._cola.popleft()
+                self._cond.notify_all()  # Hay lugar: libera a "bloquear"
+
+            inicio = time.monotonic()
+            try:
+                self.callback(dato)
+                error = False
+            except Exception as e:
+                error = True
+                print(f"⚠️ Error en callback {self.nombre}: {e}")
+            fin = time.monotonic()
+
+            with self._cond:
+                espera, duracion = inicio - t, fin - inicio
+                self.entregados += 1
+                self.errores += error
+                self._espera_total += espera
+                self._espera_max = max(self._espera_max, espera)
+                self._duracion_total += duracion
+                self._duracion_max = max(self._duracion_max, duracion)
+
+        # Quedan datos: volver a la fila del pool para no acaparar un hilo
+        try:
+            self._ejecutor.submit(self._drenar)
+        except RuntimeError:
+            self.cancelar()
+
+    def cancelar(self):
+        """Deja de recibir datos y descarta lo pendiente"""
+        with self._cond:
+            self.activa = False
+            self._cola.clear()
+            self._programada = False
+            self._cond.notify_all()
+
+    def estadisticas(self):
+        """Contadores de la suscripción; las latencias en milisegundos"""
+        with self._cond:
+            n = self.entregados or 1
+            return {
+                "callback": self.nombre,
+                "politica": self.politica,
+                "pendientes": len(self._cola),
+                "entregados": self.entregados,
+                "descartados": self.descartados,
+                "errores": self.errores,
+                "espera_prom_ms": round(self._espera_total / n * 1000, 3),
+                "espera_max_ms": round(self._espera_max * 1000, 3),
+                "duracion_prom_ms": round(self._duracion_total / n * 1000, 3),
+                "duracion_max_ms": round(self._duracion_max * 1000, 3),
+            }
+
+class _BaseCliente:
+    """Estado y lógica del protocolo compartidos por las dos versiones del cliente"""
+
+    def __init__(self, host, puerto, formato, historial_inicial, temas, intervalo, ventana,
+                 transporte, ruta_unix, ruta_memoria):
+        if transporte not in TRANSPORTES:
+            raise ValueError(f"Transporte desconocido: {transporte}")
         self.host = host
         self.puerto = puerto
-        self.socket = None
+        self.transporte = transporte
+        # Por defecto, los del servidor que escucha en `puerto`
+        self.ruta_unix = ruta_unix or ruta_socket_unix(puerto)
+        self.ruta_memoria = ruta_memoria or ruta_segmento(puerto)
+        self.transporte_activo = None  # "unix" o "tcp" una vez conectado
+        self.formato = formato  # "json" (compatible) o "bin" (compacto)
+        self.temas = temas      # Patrones de temas, p. ej. ["cama*"] (None = todos)
+        # Entrega reducida calculada en el servidor (None = todas las lecturas):
+        self.intervalo = intervalo  # como máximo una lectura cada N segundos
+        self.ventana = ventana      # media/mín/máx cada N segundos
+        self.historial_inicial = historial_inicial  # Lecturas previas a pedir al conectar
+        self.ultimo_seq = None      # Para pedir lo perdido al reconectar
+        self.sesion_servidor = None
+        self._esperando_hola = False
         self.conectado = False
+        self.conexiones = 0  # Más de 1 = hubo reconexiones
         self.ultimo_dato = None
+        self.ultimos_por_tema = {}  # tema -> último dato de ese dispositivo
+        self.ultima_senal = {}      # tema -> time.time() del último dato o latido
         self.callbacks = []  # Para ejecutar funciones cuando llegan datos
-        
-        self.conectar()
-    
-    def conectar(self):
-        """Conecta al servidor de datos"""
-        try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.puerto))
-            self.conectado = True
-            print(f"✅ Conectado al servidor en {self.host}:{self.puerto}")
-            
-            # Iniciar thread de lectura
-            thread = threading.Thread(target=self.leer_datos, daemon=True)
-            thread.start()
-        except Exception as e:
-            print(f"❌ Error conectando al servidor: {e}")
-            self.conectado = False
-    
-    def leer_datos(self):
-        """Lee datos del servidor continuamente"""
-        buffer = ""
-        while self.conectado:
-            try:
-                datos = self.socket.recv(1024).decode()
-                if not datos:
-                    self.conectado = False
-                    print("❌ Servidor desconectado")
-                    break
-                
-                buffer += datos
-                
-                # Procesar mensajes completos (separados por \n)
-                while "\n" in buffer:
-                    linea, buffer = buffer.split("\n", 1)
-                    if linea.strip():
-                        try:
-                            self.ultimo_dato = json.loads(linea)
-                            # Ejecutar callbacks
-                            for callback in self.callbacks:
-                                callback(self.ultimo_dato)
-                        except json.JSONDecodeError:
-                            print(f"⚠️ Datos inválidos: {linea}")
-            except Exception as e:
-                print(f"Error leyendo datos: {e}")
-                self.conectado = False
-                time.sleep(2)
-                self.conectar()
-    
-    def obtener_datos(self):
-        """Retorna el último dato recibido"""
+        self.recientes = LecturasRecientes()
+
+        # La memoria compartida tiene lecturas crudas: no sirve con entregas reducidas
+        self._usar_memoria = (
+            transporte in ("auto", "memoria") and host in HOSTS_LOCALES
+            and bool(self.ruta_memoria) and not (intervalo or ventana)
+        )
+        self._memoria = None
+        self._memoria_intento = None
+
+    def _lector_memoria(self):
+        """Abre la memoria compartida la primera vez (y reintenta de vez en cuando)"""
+        if self._memoria is None and self._usar_memoria:
+            ahora = time.monotonic()
+            if self._memoria_intento is None or ahora - self._memoria_intento >= REINTENTO_MEMORIA:
+                self._memoria_intento = ahora
+                if self.transporte == "auto" and not es_privado(self.ruta_memoria):
+                    return None  # Puede haberlo creado otro usuario
+                try:
+                    self._memoria = LectorUltimo(self.ruta_memoria)
+                except (OSError, ValueError):
+                    pass
+        return self._memoria
+
+    def _cerrar_memoria(self):
+        if self._memoria:
+            self._memoria.cerrar()
+            self._memoria = None
+        self._usar_memoria = False
+
+    def _iniciar_solo_memoria(self):
+        self.conectado = self._lector_memoria() is not None
+        if self.conectado:
+            print(f"✅ Leyendo el último valor de {self.ruta_memoria}")
+        else:
+            print(f"❌ No hay memoria compartida en {self.ruta_memoria}")
+
+    def _destino(self):
+        if self.transporte_activo == "unix":
+            return self.ruta_unix
+        return f"{self.host}:{self.puerto}"
+
+    def _mensaje_hola(self):
+        """Negocia formato y temas y pide las lecturas que nos perdimos"""
+        hola = {"cmd": "hola", "formato": self.formato}
+        if self.temas:
+            hola["temas"] = list(self.temas)
+        if self.intervalo:
+            hola["intervalo"] = self.intervalo
+        elif self.ventana:
+            hola["ventana"] = self.ventana
+        if self.ultimo_seq is not None:
+            hola["desde_seq"] = self.ultimo_seq
+            hola["sesion"] = self.sesion_servidor
+        elif self.historial_inicial:
+            hola["ultimos"] = self.historial_inicial
+        # Si pedimos historial, lo anterior a la respuesta ya viene incluido
+        self._esperando_hola = "desde_seq" in hola or "ultimos" in hola
+        return json.dumps(hola).encode() + b"\n"
+
+    def _procesar(self, mensaje):
+        """Actualiza el estado con un mensaje. Retorna el dato a entregar o None"""
+        if "resp" in mensaje:
+            self._procesar_respuesta(mensaje)
+            return None
+        if self._esperando_hola:
+            return None
+
+        # Descartar lecturas repetidas (reenvíos del historial)
+        seq = mensaje.get("seq")
+        if seq is not None:
+            if self.ultimo_seq is not None and seq <= self.ultimo_seq:
+                return None
+            self.ultimo_seq = seq
+
+        tema = mensaje.get("tema")
+        ahora = time.time()
+        self.ultima_senal[tema] = ahora
+        if mensaje.get("latido"):
+            return None  # El valor no cambió: el sensor sigue vivo
+
+        self.ultimo_dato = mensaje
+        if tema is not None:
+            self.ultimos_por_tema[tema] = mensaje
+        self.recientes.agregar(mensaje, ahora)
+        return mensaje
+
+    def _procesar_respuesta(self, respuesta):
+        """Respuestas del protocolo (no son lecturas)"""
+        if respuesta.get("resp") == "hola":
+            self._esperando_hola = False
+            if respuesta.get("sesion") != self.sesion_servidor:
+                # El servidor se reinició: sus seq empiezan de nuevo
+                self.sesion_servidor = respuesta.get("sesion")
+                self.ultimo_seq = None
+            if respuesta.get("reenviados"):
+                print(f"📥 Recuperando {respuesta['reenviados']} lecturas del servidor")
+            if respuesta.get("incompleto"):
+                print("⚠️ El historial del servidor ya no tiene todas las lecturas perdidas")
+
+    def obtener_datos(self, tema=None):
+        """Retorna el último dato recibido (de cualquier tema o del tema indicado)"""
+        lector = self._lector_memoria()
+        estado = lector.leer() if lector else None
+        if estado:
+            temas = estado["temas"]
+            if tema is not None:
+                return temas.get(tema)
+            if self.temas:
+                temas = {t: d for t, d in temas.items()
+                         if any(fnmatch.fnmatchcase(t, p) for p in self.temas)}
+            return max(temas.values(), key=lambda d: d.get("seq", 0), default=None)
+
+        # Sin memoria compartida (u otro equipo): lo último que llegó por el flujo
+        if tema is not None:
+            return self.ultimos_por_tema.get(tema)
         return self.ultimo_dato
-    
+
+    def _dato_y_edad(self, tema=None):
+        """Último dato y segundos desde la última señal de su tema (dato o latido)"""
+        if self.transporte == "memoria":
+            dato = self.obtener_datos(tema)
+            if dato is None:
+                return None, None
+            # Los latidos no cambian el dato, solo la señal de su tema
+            lector = self._lector_memoria()
+            estado = (lector.leer() if lector else None) or {}
+            senal = estado.get("senales", {}).get(dato.get("tema"), dato["ts"])
+            return dato, time.time() - max(senal, dato["ts"])
+
+        dato = self.ultimos_por_tema.get(tema) if tema is not None else self.ultimo_dato
+        if dato is None:
+            return None, None
+        senal = self.ultima_senal.get(dato.get("tema"))
+        return dato, (time.time() - senal) if senal else None
+
+    def estadisticas_ventana(self, segundos=60, tema=None):
+        """Media/mín/máx de las lecturas recibidas en los últimos `segundos` (ver LecturasRecientes)"""
+        return self.recientes.ventana(segundos, tema)
+
     def suscribirse(self, callback):
         """Suscribe una función para que se ejecute cuando lleguen datos"""
+        if self.transporte == "memoria":
+            raise ValueError("Con transporte='memoria' no hay flujo: usa obtener_datos() o 'auto'")
         self.callbacks.append(callback)
-    
+
+class ClienteDatos(_BaseCliente):
+    """
+    Cliente con un único thread que conecta, lee y reconecta.
+    Los callbacks de suscribirse() corren en un pool de `hilos_suscriptores`
+    hilos, cada uno con su cola, así un callback lento no frena la lectura.
+    """
+
+    def __init__(self, host="127.0.0.1", puerto=5000, formato=FORMATO_JSON, historial_inicial=0, temas=None,
+                 intervalo=None, ventana=None, transporte="auto", ruta_unix=None, ruta_memoria=None,
+                 espera_inicial=2.0, hilos_suscriptores=HILOS_SUSCRIPTORES):
+        super().__init__(host, puerto, formato, historial_inicial, temas, intervalo, ventana,
+                         transporte, ruta_unix, ruta_memoria)
+        self.socket = None
+        self.hilos_suscriptores = hilos_suscriptores
+        self.suscripciones = []
+        self._ejecutor = None
+        self._hilo = None
+        self._detener = threading.Event()
+        self._primer_intento = threading.Event()
+        self._nuevo_dato = threading.Condition()
+
+        if transporte == "memoria":
+            self._iniciar_solo_memoria()
+        else:
+            self.conectar(espera_inicial)
+
+    def conectar(self, espera=2.0):
+        """
+        Inicia el thread de conexión (si no está corriendo) y espera hasta
+        `espera` segundos el primer intento. Retorna True si quedó conectado;
+        si no, el thread sigue reintentando en segundo plano.
+        """
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._primer_intento.clear()
+            self._hilo = threading.Thread(target=self._bucle, daemon=True, name="cliente-datos")
+            self._hilo.start()
+        self._primer_intento.wait(espera)
+        return self.conectado
+
+    def _bucle(self):
+        """Conectar -> leer hasta que se caiga -> esperar -> reconectar"""
+        intentos = 0
+        while not self._detener.is_set():
+            try:
+                self.socket, self.transporte_activo = _abrir_socket(
+                    self.host, self.puerto, self.ruta_unix, self.transporte, timeout=TIMEOUT_CONEXION
+                )
+                self.socket.settimeout(None)
+                self.socket.sendall(self._mensaje_hola())
+            except OSError as e:
+                self._cerrar_socket()
+                espera = espera_reconexion(intentos)
+                intentos += 1
+                print(f"❌ Error conectando al servidor: {e}. Reintento en {espera:.1f} s")
+                self._primer_intento.set()
+                self._detener.wait(espera)
+                continue
+
+            self.conexiones += 1
+            intentos = 0
+            self.conectado = True
+            self._primer_intento.set()
+            print(f"✅ Conectado al servidor en {self._destino()} ({self.transporte_activo})")
+
+            try:
+                self.leer_datos()
+                motivo = "el servidor cerró la conexión"
+            except (OSError, ValueError) as e:
+                motivo = str(e)
+            finally:
+                self.conectado = False
+                self._cerrar_socket()
+
+            if not self._detener.is_set():
+                espera = espera_reconexion(intentos)
+                intentos += 1
+                print(f"❌ Servidor desconectado ({motivo}). Reintento en {espera:.1f} s")
+                self._detener.wait(espera)
+
+    def leer_datos(self):
+        """Lee del socket hasta que se cierre (lanza OSError/ValueError si falla)"""
+        lector = LectorFlujo()
+        buffer = bytearray(TAMANO_RECV)
+        vista = memoryview(buffer)
+        while not self._detener.is_set():
+            n = self.socket.recv_into(buffer)
+            if not n:
+                return
+
+            # Procesar mensajes completos (JSON por líneas o frames binarios)
+            for mensaje in lector.alimentar(vista[:n]):
+                dato = self._procesar(mensaje)
+                if dato is None:
+                    continue
+                if self.suscripciones:
+                    llegada = time.monotonic()
+                    for suscripcion in self.suscripciones:
+                        suscripcion.encolar(dato, llegada)
+
+            # Un solo aviso por bloque recibido, no por mensaje
+            with self._nuevo_dato:
+                self._nuevo_dato.notify_all()
+
+    def suscribirse(self, callback, max_cola=MAX_COLA_SUSCRIPTOR, politica="descartar_viejo"):
+        """
+        Ejecuta `callback(dato)` en el pool de suscriptores por cada dato.
+        Si el callback se atrasa más de `max_cola` datos se aplica `politica`
+        (ver POLITICAS_SUSCRIPCION). Retorna la Suscripcion.
+        """
+        if self.transporte == "memoria":
+            raise ValueError("Con transporte='memoria' no hay flujo: usa obtener_datos() o 'auto'")
+        if self._ejecutor is None:
+            self._ejecutor = ThreadPoolExecutor(self.hilos_suscriptores, thread_name_prefix="suscriptor")
+        suscripcion = Suscripcion(callback, self._ejecutor, max_cola, politica)
+        # Copia nueva: el thread de lectura recorre la lista sin lock
+        self.suscripciones = self.suscripciones + [suscripcion]
+        return suscripcion
+
+    def desuscribirse(self, suscripcion):
+        """Quita una suscripción y descarta sus datos pendientes"""
+        suscripcion.cancelar()
+        self.suscripciones = [s for s in self.suscripciones if s is not suscripcion]
+
+    def estadisticas_suscriptores(self):
+        """Lista con los contadores de cada suscripción"""
+        return [s.estadisticas() for s in self.suscripciones]
+
+    def esperar_dato(self, max_edad=10.0, timeout=5.0, tema=None):
+        """
+        Retorna el último dato si el sensor dio señales hace <= `max_edad`
+        segundos; si no, espera hasta `timeout` a que llegue uno. None si no llega.
+        """
+        limite = time.monotonic() + timeout
+        with self._nuevo_dato:
+            while True:
+                dato, edad = self._dato_y_edad(tema)
+                if dato is not None and edad is not None and edad <= max_edad:
+                    return dato
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return None
+                # Solo con memoria compartida no hay quien avise: se consulta seguido
+                self._nuevo_dato.wait(min(restante, 0.05) if self.transporte == "memoria" else restante)
+
+    def _cerrar_socket(self):
+        sock, self.socket = self.socket, None
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)  # El servidor se entera al instante
+        except OSError:
+            pass
+        sock.close()
+
     def desconectar(self):
-        """Cierra la conexión"""
+        """Cierra la conexión y detiene el thread de lectura"""
+        self._detener.set()
         self.conectado = False
-        if self.socket:
-            self.socket.close()
-            print("Desconectado del servidor")
\ No newline at end of file
+        self._cerrar_memoria()
+        for suscripcion in self.suscripciones:
+            suscripcion.cancelar()  # Libera al thread de lectura si está bloqueado
+        self._cerrar_socket()  # Despierta al thread si está en recv()
+        if self._hilo and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout=2)
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown(wait=False)
+            self._ejecutor = None
+        print("Desconectado del servidor")
+
+class ClienteDatosAsync(_BaseCliente):
+    """
+    Versión asyncio del cliente: una sola tarea conecta, lee y reconecta.
+    Los datos se reciben con `async for dato in cliente`, `await cliente.recibir()`
+    o con callbacks (funciones normales o corrutinas).
+    Si nadie consume, solo se guardan los últimos `max_cola` datos.
+    """
+
+    def __init__(self, host="127.0.0.1", puerto=5000, formato=FORMATO_JSON, historial_inicial=0, temas=None,
+                 intervalo=None, ventana=None, transporte="auto", ruta_unix=None, ruta_memoria=None,
+                 max_cola=MAX_COLA_ASYNC):
+        super().__init__(host, puerto, formato, historial_inicial, temas, intervalo, ventana,
+                         transporte, ruta_unix, ruta_memoria)
+        self.descartados = 0
+        self._cola = asyncio.Queue(maxsize=max_cola)
+        self._tarea = None
+        self._nuevo_dato = asyncio.Condition()
+
+    async def conectar(self):
+        """Inicia la tarea de conexión (no espera a que conecte)"""
+        if self.transporte == "memoria":
+            self._iniciar_solo_memoria()
+        elif self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._bucle())
+
+    async def _abrir(self):
+        ruta = _ruta_unix_disponible(self.host, self.puerto, self.ruta_unix, self.transporte)
+        if ruta:
+            try:
+                lector, escritor = await asyncio.open_unix_connection(ruta)
+                return lector, escritor, "unix"
+            except OSError:
+                if self.transporte == "unix":
+                    raise
+        lector, escritor = await asyncio.open_connection(self.host, self.puerto)
+        return lector, escritor, "tcp"
+
+    async def _bucle(self):
+        intentos = 0
+        while True:
+            try:
+                lector_red, escritor, self.transporte_activo = await asyncio.wait_for(
+                    self._abrir(), TIMEOUT_CONEXION
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                espera = espera_reconexion(intentos)
+                intentos += 1
+                print(f"❌ Error conectando al servidor: {e or 'timeout'}. Reintento en {espera:.1f} s")
+                await asyncio.sleep(espera)
+                continue
+
+            self.conexiones += 1
+            intentos = 0
+            self.conectado = True
+            print(f"✅ Conectado al servidor en {self._destino()} ({self.transporte_activo})")
+
+            try:
+                escritor.write(self._mensaje_hola())
+                await escritor.drain()
+                lector = LectorFlujo()
+                while True:
+                    datos = await lector_red.read(TAMANO_RECV)
+                    if not datos:
+                        motivo = "el servidor cerró la conexión"
+                        break
+                    for mensaje in lector.alimentar(datos):
+                        dato = self._procesar(mensaje)
+                        if dato is not None:
+                            await self._entregar(dato)
+                    async with self._nuevo_dato:
+                        self._nuevo_dato.notify_all()
+            except (OSError, ValueError) as e:
+                motivo = str(e)
+            finally:
+                self.conectado = False
+                escritor.close()
+
+            espera = espera_reconexion(intentos)
+            intentos += 1
+            print(f"❌ Servidor desconectado ({motivo}). Reintento en {espera:.1f} s")
+            await asyncio.sleep(espera)
+
+    async def _entregar(self, dato):
+        for callback in self.callbacks:
+            try:
+                resultado = callback(dato)
+                if asyncio.iscoroutine(resultado):
+                    await resultado
+            except Exception as e:
+                print(f"⚠️ Error en callback: {e}")
+
+        if self._cola.full():
+            # El consumidor va lento: se tira lo más viejo
+            self._cola.get_nowait()
+            self.descartados += 1
+        self._cola.put_nowait(dato)
+
+    async def recibir(self):
+        """Espera el siguiente dato del flujo"""
+        return await self._cola.get()
+
+    async def esperar_dato(self, max_edad=10.0, timeout=5.0, tema=None):
+        """Igual que ClienteDatos.esperar_dato, sin bloquear el loop"""
+        limite = time.monotonic() + timeout
+        async with self._nuevo_dato:
+            while True:
+                dato, edad = self._dato_y_edad(tema)
+                if dato is not None and edad is not None and edad <= max_edad:
+                    return dato
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return None
+                if self.transporte == "memoria":
+                    restante = min(restante, 0.05)
+                try:
+                    await asyncio.wait_for(self._nuevo_dato.wait(), restante)
+                except asyncio.TimeoutError:
+                    pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.recibir()
+
+    async def desconectar(self):
+        """Detiene la tarea de conexión y cierra el socket"""
+        if self._tarea:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        self.conectado = False
+        self._cerrar_memoria()
+
+    async def __aenter__(self):
+        await self.conectar()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.desconectar()
+
+def consultar(comando, host="127.0.0.1", puerto=5000, timeout=3.0):
+    """
+    Consulta de un solo viaje, sin suscripción ni thread de lectura.
+    Útil para scripts cortos o para el bot:
+        consultar({"cmd": "ultimo"})   -> {"resp": "ultimo", "datos": {...}}
+        consultar({"cmd": "ping"})     -> {"resp": "ping", "hora": ...}
+    Lanza OSError (o socket.timeout) si el servidor no responde.
+    En el mismo equipo usa el socket Unix si existe.
+    """
+    cmd = comando.get("cmd")
+    sock, _ = _abrir_socket(host, puerto, timeout=timeout)
+    with sock:
+        hola = {"cmd": "hola", "suscribir": False}
+        sock.sendall(json.dumps(hola).encode() + b"\n" + json.dumps(comando).encode() + b"\n")
+
+        lector = LectorFlujo()
+        while True:
+            datos = sock.recv(4096)
+            if not datos:
+                raise ConnectionError("El servidor cerró la conexión")
+            for mensaje in lector.alimentar(datos):
+                if mensaje.get("resp") == cmd:
+                    return mensaje
@@ -1,10 +1,32 @@
+import os
 import sqlite3
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 
-DB_NAME = "registros.db"
+# Junto a este archivo, sin importar desde qué carpeta se ejecute
+DB_NAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "registros.db")
 
-def crear_tabla():
-    conn = sqlite3.connect(DB_NAME)
+SQL_INSERTAR_REGISTRO = """
+    INSERT INTO registros (fecha, lechugas, temperatura, humedad, imagen, imagen_procesada)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# Columnas agregadas después de la primera versión de la tabla
+COLUMNAS_NUEVAS = {
+    "imagen": "TEXT",            # Foto original, relativa a la carpeta de la BD
+    "imagen_procesada": "TEXT",  # Foto con las detecciones dibujadas
+}
+
+def inicializar(db_path=DB_NAME):
+    """
+    Crea la tabla, agrega las columnas nuevas y el índice de fechas.
+    Lo llaman los programas que escriben (main.py, bot.py, BaseDatosAsync),
+    no el import: leer o exportar otra BD no toca registros.db.
+    """
+    conn = sqlite3.connect(db_path)
     cur = conn.cursor()
     cur.execute("""
         CREATE TABLE IF NOT EXISTS registros (
@@ -15,21 +37,237 @@ def crear_tabla():
             humedad REAL
         )
     """)
+    existentes = {fila[1] for fila in cur.execute("PRAGMA table_info(registros)")}
+    for columna, tipo in COLUMNAS_NUEVAS.items():
+        if columna not in existentes:
+            cur.execute(f"ALTER TABLE registros ADD COLUMN {columna} {tipo}")
+    # Las gráficas y exportaciones consultan por rango de fechas
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_registros_fecha ON registros (fecha)")
     conn.commit()
     conn.close()
 
-def guardar_registro(lechugas, temperatura, humedad):
+def ruta_relativa(ruta):
+    """Ruta de una imagen tal como se guarda en la BD (relativa a su carpeta)"""
+    if ruta is None:
+        return None
+    return os.path.relpath(ruta, os.path.dirname(DB_NAME))
+
+def guardar_registro(lechugas, temperatura, humedad, imagen=None, imagen_procesada=None):
     conn = sqlite3.connect(DB_NAME)
     cur = conn.cursor()
     fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    cur.execute("""
-        INSERT INTO registros (fecha, lechugas, temperatura, humedad)
-        VALUES (?, ?, ?, ?)
-    """, (fecha, lechugas, temperatura, humedad))
+    cur.execute(SQL_INSERTAR_REGISTRO, (fecha, lechugas, temperatura, humedad,
+                                        ruta_relativa(imagen), ruta_relativa(imagen_procesada)))
 
     conn.commit()
     conn.close()
 
-# Crear tabla automáticamente al importar
-crear_tabla()
+# ============================================
+# ACCESO NO BLOQUEANTE
+# ============================================
+class BaseDatosAsync:
+    """
+    Fachada no bloqueante sobre registros.db.
+    Todas las escrituras pasan por un único hilo escritor (en orden) y las
+    lecturas se atienden en un pool pequeño de hilos lectores.
+    Cada operación retorna un concurrent.futures.Future; desde asyncio se
+    puede esperar con `await asyncio.wrap_future(futuro)`.
+    """
+
+    def __init__(self, db_path=None, lectores=2, busy_timeout=5.0, max_cola=1000, max_lote=50):
+        self.db_path = db_path or DB_NAME
+        self.busy_timeout = busy_timeout
+        inicializar(self.db_path)
+        self.max_lote = max_lote
+
+        self._cola = queue.Queue(maxsize=max_cola)
+        self._local = threading.local()
+        self._conexiones_lectura = []
+        self._conexiones_lock = threading.Lock()
+        self._lectores = ThreadPoolExecutor(max_workers=lectores, thread_name_prefix="db-lector")
+        self._cerrada = False
+        # Comprobar _cerrada y encolar es atómico respecto a cerrar(): nada
+        # puede quedar en la cola detrás del None que detiene al escritor
+        self._cierre_lock = threading.Lock()
+
+        self._metricas_lock = threading.Lock()
+        self._metricas = {
+            "escritura": {"operaciones": 0, "errores": 0, "espera_total": 0.0, "espera_max": 0.0},
+            "lectura": {"operaciones": 0, "errores": 0, "espera_total": 0.0, "espera_max": 0.0},
+        }
+
+        # La conexión del escritor se abre aquí: si la BD no se puede abrir,
+        # falla el constructor en vez de dejar futures esperando para siempre
+        conn = self._abrir_conexion()
+        try:
+            # WAL permite que el dashboard y las exportaciones lean mientras escribimos
+            conn.execute("PRAGMA journal_mode = WAL")
+        except Exception:
+            conn.close()
+            raise
+        self._escritor = threading.Thread(target=self._bucle_escritor, args=(conn,), daemon=True,
+                                          name="db-escritor")
+        self._escritor.start()
+
+    # ---------- Conexiones ----------
+    def _abrir_conexion(self):
+        # Cada conexión la usa un solo hilo; check_same_thread=False solo
+        # permite abrirla aquí y cerrarla desde cerrar()
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        return conn
+
+    def _conexion_lectura(self):
+        """Una conexión por hilo lector (sqlite3 no comparte conexiones entre hilos)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._abrir_conexion()
+            self._local.conn = conn
+            with self._conexiones_lock:
+                self._conexiones_lectura.append(conn)
+        return conn
+
+    def _registrar_espera(self, tipo, espera, error=False):
+        with self._metricas_lock:
+            m = self._metricas[tipo]
+            m["operaciones"] += 1
+            m["espera_total"] += espera
+            m["espera_max"] = max(m["espera_max"], espera)
+            if error:
+                m["errores"] += 1
+
+    # ---------- Escritura ----------
+    def escribir(self, sql, parametros=()):
+        """
+        Encola una escritura. Retorna un Future con el lastrowid.
+        Nunca bloquea: con la cola llena el Future falla con queue.Full.
+        """
+        futuro = Future()
+        with self._cierre_lock:
+            if self._cerrada or not self._escritor.is_alive():
+                futuro.set_exception(RuntimeError("El escritor de la BD está detenido"))
+                return futuro
+            try:
+                self._cola.put_nowait((time.monotonic(), sql, parametros, futuro))
+            except queue.Full as e:
+                self._registrar_espera("escritura", 0.0, error=True)
+                futuro.set_exception(e)
+        return futuro
+
+    def guardar_registro(self, lechugas, temperatura, humedad, imagen=None, imagen_procesada=None):
+        """Versión no bloqueante de guardar_registro (la fecha se toma al encolar)"""
+        fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return self.escribir(SQL_INSERTAR_REGISTRO, (fecha, lechugas, temperatura, humedad,
+                                                     ruta_relativa(imagen), ruta_relativa(imagen_procesada)))
+
+    def _bucle_escritor(self, conn):
+        """Hilo escritor: agrupa lo que haya en cola en una sola transacción"""
+        try:
+            self._escribir_lotes(conn)
+        except Exception as e:
+            print(f"❌ El escritor de la BD se detuvo: {e}")
+        finally:
+            conn.close()
+            # Lo que quedó en cola ya no se va a escribir: que nadie espere
+            while True:
+                try:
+                    item = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None and item[3].set_running_or_notify_cancel():
+                    item[3].set_exception(RuntimeError("El escritor de la BD se detuvo"))
+
+    def _escribir_lotes(self, conn):
+        while True:
+            item = self._cola.get()
+            if item is None:
+                break
+
+            lote = [item]
+            while len(lote) < self.max_lote:
+                try:
+                    siguiente = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if siguiente is None:
+                    self._cola.put(None)  # Procesar el lote y luego salir
+                    break
+                lote.append(siguiente)
+
+            ahora = time.monotonic()
+            resultados = []
+            for encolado, sql, parametros, futuro in lote:
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+                try:
+                    cur = conn.execute(sql, parametros)
+                    resultados.append((futuro, cur.lastrowid, ahora - encolado))
+                except Exception as e:
+                    self._registrar_espera("escritura", ahora - encolado, error=True)
+                    futuro.set_exception(e)
+
+            try:
+                conn.commit()
+            except Exception as e:
+                print(f"❌ Error guardando en BD: {e}")
+                # Sin rollback, estas filas se guardarían con el siguiente lote
+                # aunque ya se reportaron como fallidas
+                try:
+                    conn.rollback()
+                except Exception as e_rollback:
+                    print(f"❌ Error deshaciendo la transacción: {e_rollback}")
+                for futuro, _, espera in resultados:
+                    self._registrar_espera("escritura", espera, error=True)
+                    futuro.set_exception(e)
+                continue
+
+            for futuro, rowid, espera in resultados:
+                self._registrar_espera("escritura", espera)
+                futuro.set_result(rowid)
+
+    # ---------- Lectura ----------
+    def leer(self, sql, parametros=()):
+        """Ejecuta una consulta en el pool de lectores. Retorna un Future con las filas"""
+        encolado = time.monotonic()
+
+        def tarea():
+            espera = time.monotonic() - encolado
+            try:
+                filas = self._conexion_lectura().execute(sql, parametros).fetchall()
+            except Exception:
+                self._registrar_espera("lectura", espera, error=True)
+                raise
+            self._registrar_espera("lectura", espera)
+            return filas
+
+        return self._lectores.submit(tarea)
+
+    # ---------- Métricas y cierre ----------
+    def obtener_metricas(self):
+        """Retorna operaciones, errores y tiempo de espera en cola (ms) por tipo"""
+        with self._metricas_lock:
+            resumen = {}
+            for tipo, m in self._metricas.items():
+                ops = m["operaciones"]
+                resumen[tipo] = {
+                    "operaciones": ops,
+                    "errores": m["errores"],
+                    "espera_promedio_ms": (m["espera_total"] / ops * 1000) if ops else 0.0,
+                    "espera_max_ms": m["espera_max"] * 1000,
+                }
+            resumen["escritura"]["en_cola"] = self._cola.qsize()
+            return resumen
+
+    def cerrar(self, timeout=5):
+        """Termina las escrituras pendientes y detiene los hilos"""
+        with self._cierre_lock:
+            ya_cerrada, self._cerrada = self._cerrada, True
+            if not ya_cerrada and self._escritor.is_alive():
+                self._cola.put(None)
+        self._escritor.join(timeout)
+        self._lectores.shutdown(wait=True)
+        with self._conexiones_lock:
+            for conn in self._conexiones_lectura:
+                conn.close()
+            self._conexiones_lectura.clear()
@@ -0,0 +1,200 @@
+# ============================================
+# EXPORTADOR DE REGISTROS - Para análisis offline
+# Archivo: exportar.py
+# ============================================
+#
+# Exporta las tablas de registros.db a archivos .npz columnares,
+# leyendo por lotes con un cursor para que la memoria no crezca
+# con el tamaño de la tabla.
+#
+# Uso:
+#   python exportar.py                                  # todo
+#   python exportar.py --desde "2025-03-01" --hasta "2025-06-01"
+#   python exportar.py --incremental                    # solo lo nuevo (sin --desde/--hasta)
+#
+# Cada lote queda en <salida>/<tabla>/<tabla>_<primer id>-<último id>.npz
+# y se carga con:  np.load(ruta)["temperatura"]
+
+import argparse
+import json
+import os
+import sqlite3
+
+import numpy as np
+
+from db import DB_NAME
+
+TAMANO_LOTE = 10000
+DIRECTORIO_SALIDA = "exportaciones"
+ARCHIVO_ESTADO = ".estado_exportacion.json"
+
+# Tablas que se exportan si existen (registros siempre existe)
+TABLAS_EXPORTABLES = ["registros", "detecciones", "lecturas_sensor"]
+
+
+def cargar_estado(salida):
+    """Lee el último id exportado de cada tabla"""
+    ruta = os.path.join(salida, ARCHIVO_ESTADO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_estado(salida, estado):
+    """Guarda el estado de forma atómica (escribe y luego renombra)"""
+    ruta = os.path.join(salida, ARCHIVO_ESTADO)
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2)
+    os.replace(temporal, ruta)
+
+
+def obtener_columnas(conn, tabla):
+    """Retorna [(nombre, tipo_declarado)] de una tabla"""
+    filas = conn.execute(f"PRAGMA table_info({tabla})").fetchall()
+    return [(fila[1], (fila[2] or "").upper()) for fila in filas]
+
+
+def tablas_presentes(conn):
+    existentes = {
+        fila[0] for fila in
+        conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    return [t for t in TABLAS_EXPORTABLES if t in existentes]
+
+
+def a_fecha(valor):
+    """datetime64[s] de un valor de SQLite, NaT si no se puede interpretar"""
+    try:
+        return np.datetime64(valor, "s")
+    except (ValueError, TypeError):
+        return np.datetime64("NaT", "s")
+
+
+def columna_a_array(nombre, tipo, valores):
+    """Convierte una lista de valores de SQLite en un array de NumPy"""
+    if nombre == "fecha":
+        # Siempre datetime64[s]: una fecha ilegible queda como NaT en vez
+        # de cambiar el tipo de todo el lote
+        try:
+            return np.array(valores, dtype="datetime64[s]")
+        except ValueError:
+            return np.array([a_fecha(v) for v in valores], dtype="datetime64[s]")
+
+    if "INT" in tipo:
+        if None in valores:
+            # Los enteros no tienen NaN: con nulos se guardan como float
+            return np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+        return np.array(valores, dtype=np.int64)
+
+    if "REAL" in tipo or "FLOA" in tipo or "DOUB" in tipo:
+        return np.array([np.nan if v is None else v for v in valores], dtype=np.float64)
+
+    return np.array(["" if v is None else str(v) for v in valores], dtype=str)
+
+
+def exportar_tabla(conn, tabla, salida, desde=None, hasta=None, desde_id=0):
+    """
+    Exporta una tabla por lotes de TAMANO_LOTE filas.
+    Retorna (filas_exportadas, último_id).
+    """
+    columnas = obtener_columnas(conn, tabla)
+    nombres = [nombre for nombre, _ in columnas]
+
+    condiciones = ["rowid > ?"]
+    parametros = [desde_id]
+    if "fecha" in nombres:
+        if desde:
+            condiciones.append("fecha >= ?")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append("fecha < ?")
+            parametros.append(hasta)
+
+    consulta = (
+        f"SELECT rowid, {', '.join(nombres)} FROM {tabla} "
+        f"WHERE {' AND '.join(condiciones)} ORDER BY rowid"
+    )
+
+    carpeta = os.path.join(salida, tabla)
+    os.makedirs(carpeta, exist_ok=True)
+
+    cur = conn.cursor()
+    cur.arraysize = TAMANO_LOTE
+    cur.execute(consulta, parametros)
+
+    total = 0
+    ultimo_id = desde_id
+    while True:
+        lote = cur.fetchmany(TAMANO_LOTE)
+        if not lote:
+            break
+
+        # Transponer filas -> columnas
+        columnas_lote = list(zip(*lote))
+        rowids = columnas_lote[0]
+        arrays = {
+            nombre: columna_a_array(nombre, tipo, list(valores))
+            for (nombre, tipo), valores in zip(columnas, columnas_lote[1:])
+        }
+
+        archivo = os.path.join(carpeta, f"{tabla}_{rowids[0]}-{rowids[-1]}.npz")
+        np.savez_compressed(archivo, **arrays)
+
+        total += len(lote)
+        ultimo_id = rowids[-1]
+        print(f"  💾 {archivo} ({len(lote)} filas)")
+
+    return total, ultimo_id
+
+
+def exportar(salida=DIRECTORIO_SALIDA, desde=None, hasta=None, incremental=False, db_path=DB_NAME):
+    """Exporta todas las tablas presentes. Retorna {tabla: filas_exportadas}"""
+    if incremental and (desde or hasta):
+        # El estado guarda solo el último id: con un filtro de fechas, las
+        # filas fuera de la ventana quedarían saltadas para siempre
+        raise ValueError("--incremental no se puede combinar con --desde/--hasta")
+    os.makedirs(salida, exist_ok=True)
+    estado = cargar_estado(salida) if incremental else {}
+
+    # Solo lectura: no bloquea al bot mientras escribe
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    resumen = {}
+    try:
+        for tabla in tablas_presentes(conn):
+            print(f"📤 Exportando {tabla}...")
+            filas, ultimo_id = exportar_tabla(
+                conn, tabla, salida,
+                desde=desde, hasta=hasta,
+                desde_id=estado.get(tabla, 0)
+            )
+            resumen[tabla] = filas
+            if incremental:
+                estado[tabla] = ultimo_id
+                guardar_estado(salida, estado)
+            print(f"✔ {tabla}: {filas} filas")
+    finally:
+        conn.close()
+
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta registros.db a archivos .npz por lotes")
+    parser.add_argument("--salida", default=DIRECTORIO_SALIDA, help="Carpeta de salida")
+    parser.add_argument("--desde", help="Fecha inicial inclusiva (YYYY-MM-DD [HH:MM:SS])")
+    parser.add_argument("--hasta", help="Fecha final exclusiva (YYYY-MM-DD [HH:MM:SS])")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Exporta solo lo agregado desde la última exportación incremental")
+    parser.add_argument("--db", default=DB_NAME, help="Ruta de la base de datos")
+    args = parser.parse_args()
+    if args.incremental and (args.desde or args.hasta):
+        parser.error("--incremental no se puede combinar con --desde/--hasta")
+
+    resumen = exportar(args.salida, args.desde, args.hasta, args.incremental, args.db)
+    print(f"\n✅ Exportación terminada: {resumen}")
+
+
+if __name__ == "__main__":
+    main()
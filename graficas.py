@@ -0,0 +1,212 @@
+# ============================================
+# GRÁFICAS - Historial de registros.db como imagen PNG para el bot
+# Archivo: graficas.py
+# ============================================
+#
+# Dibuja temperatura, humedad y conteo de lechugas de un rango en un solo
+# PNG en memoria (con OpenCV, que el bot ya usa) y lo guarda en caché:
+#
+#   from graficas import GraficasHistorial, buscar_rango
+#   graficas = GraficasHistorial()
+#   futuro = graficas.solicitar(buscar_rango("7d"))   # no bloquea
+#   png, resumen = futuro.result()
+#
+# La llave del caché es (rango, versión de la BD, corte de tiempo): pedir
+# la misma gráfica otra vez no cuesta nada hasta que entra un análisis
+# nuevo o el rango avanza lo que dura un punto. Varias peticiones iguales
+# al mismo tiempo comparten un solo dibujo. Hasta la llave (que consulta la
+# BD) se calcula en el hilo de gráficas: solicitar() nunca bloquea al bot.
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from db import DB_NAME
+from historial import RANGOS, VigilanteBD, leer_registros, reducir
+
+# Nombres cortos para /historial <rango>
+ALIAS_RANGOS = {
+    "5m": "5 minutos",
+    "1h": "1 hora",
+    "24h": "24 horas",
+    "1d": "24 horas",
+    "7d": "7 días",
+    "30d": "30 días",
+    "temporada": "Temporada (6 meses)",
+    "6m": "Temporada (6 meses)",
+}
+RANGO_DEFECTO = "24 horas"
+
+# Tamaño de la imagen (un panel por serie, uno debajo de otro)
+ANCHO = 960
+ALTO_PANEL = 240
+MARGEN_IZQ = 70
+MARGEN_DER = 20
+MARGEN_SUP = 30
+MARGEN_INF = 30
+
+# Hershey no tiene acentos ni "°": títulos en ASCII
+PANELES = (
+    ("temperatura", "Temperatura (C)", (60, 76, 231)),
+    ("humedad", "Humedad (%)", (219, 152, 52)),
+    ("lechugas", "Lechugas", (113, 204, 46)),
+)
+
+# Con pocos puntos se marcan también con círculos (análisis sueltos)
+MAX_PUNTOS_MARCADOS = 60
+MIN_CORTE = 60           # segundos mínimos entre redibujos del mismo rango
+MAX_ENTRADAS_CACHE = 16
+
+FUENTE = cv2.FONT_HERSHEY_SIMPLEX
+
+def buscar_rango(texto):
+    """Nombre de RANGOS para `texto` ("7d", "7 días", ...). None si no existe"""
+    texto = (texto or "").strip().lower()
+    if not texto:
+        return RANGO_DEFECTO
+    if texto in ALIAS_RANGOS:
+        return ALIAS_RANGOS[texto]
+    for nombre in RANGOS:
+        if nombre.lower() == texto or nombre.lower().startswith(texto):
+            return nombre
+    return None
+
+def _formato_fecha(t, segundos):
+    fecha = t.astype("datetime64[s]").item()
+    return fecha.strftime("%H:%M" if segundos <= 24 * 3600 else "%d/%m %H:%M")
+
+def _dibujar_panel(img, y0, t, y, titulo, color, segundos):
+    x_ini, x_fin = MARGEN_IZQ, ANCHO - MARGEN_DER
+    y_ini, y_fin = y0 + MARGEN_SUP, y0 + ALTO_PANEL - MARGEN_INF
+    cv2.putText(img, titulo, (x_ini, y0 + 20), FUENTE, 0.6, (40, 40, 40), 1, cv2.LINE_AA)
+    cv2.rectangle(img, (x_ini, y_ini), (x_fin, y_fin), (200, 200, 200), 1)
+
+    t, y = reducir(t, y, x_fin - x_ini)
+    if len(y) == 0:
+        cv2.putText(img, "Sin datos", ((x_ini + x_fin) // 2 - 45, (y_ini + y_fin) // 2),
+                    FUENTE, 0.6, (150, 150, 150), 1, cv2.LINE_AA)
+        return
+
+    minimo, maximo = float(y.min()), float(y.max())
+    if maximo - minimo < 1e-9:
+        minimo, maximo = minimo - 1, maximo + 1
+    holgura = (maximo - minimo) * 0.05
+    minimo, maximo = minimo - holgura, maximo + holgura
+
+    # Cuadrícula y etiquetas del eje vertical
+    for i in range(5):
+        fy = y_fin - (y_fin - y_ini) * i // 4
+        cv2.line(img, (x_ini, fy), (x_fin, fy), (235, 235, 235), 1)
+        etiqueta = f"{minimo + (maximo - minimo) * i / 4:.1f}"
+        cv2.putText(img, etiqueta, (5, fy + 4), FUENTE, 0.4, (90, 90, 90), 1, cv2.LINE_AA)
+
+    # Eje horizontal: el rango completo, aunque los datos empiecen después
+    segundos_t = t.astype("datetime64[s]").astype(np.int64)
+    # La BD guarda hora local, igual que leer_registros()
+    fin = int(np.datetime64(datetime.now(), "s").astype(np.int64))
+    inicio = fin - segundos
+    px = x_ini + (segundos_t - inicio) * (x_fin - x_ini) / max(1, fin - inicio)
+    py = y_fin - (y - minimo) * (y_fin - y_ini) / (maximo - minimo)
+    puntos = np.stack([px, py], axis=1).round().astype(np.int32)
+
+    cv2.polylines(img, [puntos], False, color, 2, cv2.LINE_AA)
+    if len(puntos) <= MAX_PUNTOS_MARCADOS:
+        for p in puntos:
+            cv2.circle(img, tuple(int(v) for v in p), 3, color, -1, cv2.LINE_AA)
+
+    inicio_txt = _formato_fecha(np.datetime64(inicio, "s"), segundos)
+    fin_txt = _formato_fecha(np.datetime64(fin, "s"), segundos)
+    cv2.putText(img, inicio_txt, (x_ini, y_fin + 20), FUENTE, 0.45, (90, 90, 90), 1, cv2.LINE_AA)
+    (ancho_txt, _), _ = cv2.getTextSize(fin_txt, FUENTE, 0.45, 1)
+    cv2.putText(img, fin_txt, (x_fin - ancho_txt, y_fin + 20), FUENTE, 0.45, (90, 90, 90), 1, cv2.LINE_AA)
+
+def dibujar_historial(rango, db_path=DB_NAME):
+    """
+    PNG (bytes) con las tres series del rango y un resumen en texto.
+    Retorna (png, resumen)
+    """
+    segundos = RANGOS[rango]
+    datos = leer_registros(segundos, db_path)
+
+    img = np.full((ALTO_PANEL * len(PANELES), ANCHO, 3), 255, dtype=np.uint8)
+    for i, (columna, titulo, color) in enumerate(PANELES):
+        _dibujar_panel(img, i * ALTO_PANEL, datos["t"], datos[columna], titulo, color, segundos)
+
+    ok, png = cv2.imencode(".png", img, [cv2.IMWRITE_PNG_COMPRESSION, 3])
+    if not ok:
+        raise RuntimeError("No se pudo codificar la gráfica")
+
+    lineas = [f"📈 Historial: {rango} ({len(datos['t'])} registros)"]
+    for columna, nombre, unidad in (("temperatura", "🌡️ Temperatura", "°C"),
+                                    ("humedad", "💧 Humedad", "%"),
+                                    ("lechugas", "🌱 Lechugas", "")):
+        serie = datos[columna][~np.isnan(datos[columna])]
+        if len(serie):
+            lineas.append(f"{nombre}: {serie.min():.1f}–{serie.max():.1f}{unidad} "
+                          f"(prom. {serie.mean():.1f}{unidad})")
+    return png.tobytes(), "\n".join(lineas)
+
+class GraficasHistorial:
+    """
+    Dibuja las gráficas en un hilo aparte y las guarda en caché por
+    (rango, versión de la BD, corte). solicitar() retorna un Future.
+    """
+
+    def __init__(self, vigilante=None, hilos=1, max_entradas=MAX_ENTRADAS_CACHE, db_path=DB_NAME):
+        self._vigilante_propio = vigilante is None
+        self.vigilante = vigilante or VigilanteBD(db_path)
+        self.db_path = db_path
+        self.max_entradas = max_entradas
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="graficas")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.dibujos = 0
+
+    def _llave(self, rango):
+        paso = max(MIN_CORTE, RANGOS[rango] / ANCHO)
+        return (rango, self.vigilante.version(), int(time.time() // paso))
+
+    def solicitar(self, rango):
+        """Future con (png, resumen) del rango; reutiliza el del caché si sigue vigente"""
+        if rango not in RANGOS:
+            raise KeyError(rango)
+        return self._ejecutor.submit(self._resolver, rango)
+
+    def _resolver(self, rango):
+        # Corre en el ejecutor: la llave consulta la BD (PRAGMA data_version)
+        llave = self._llave(rango)
+        with self._lock:
+            futuro = self._cache.get(llave)
+            if futuro is not None:
+                self._cache.move_to_end(llave)
+                self.aciertos += 1
+            else:
+                propio = self._cache[llave] = Future()
+                self.dibujos += 1
+                while len(self._cache) > self.max_entradas:
+                    self._cache.popitem(last=False)
+        if futuro is not None:
+            return futuro.result()  # Ya dibujada o dibujándose en otro hilo
+
+        try:
+            resultado = dibujar_historial(rango, self.db_path)
+        except BaseException as e:
+            propio.set_exception(e)
+            # Un error no se queda en caché: la siguiente petición lo reintenta
+            with self._lock:
+                if self._cache.get(llave) is propio:
+                    del self._cache[llave]
+            raise
+        propio.set_result(resultado)
+        return resultado
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+        if self._vigilante_propio:
+            self.vigilante.cerrar()
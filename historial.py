@@ -0,0 +1,159 @@
+# ============================================
+# HISTORIAL - Registros por rango de tiempo, listos para graficar
+# Archivo: historial.py
+# ============================================
+#
+# Lee registros.db para un rango (de 5 minutos a una temporada) y reduce
+# cada serie a un número fijo de puntos con LTTB (Largest-Triangle-Three-
+# Buckets), que conserva picos y caídas. Así una gráfica de 6 meses pesa
+# lo mismo que una de 5 minutos:
+#
+#   from historial import RANGOS, leer_registros, reducir
+#   datos = leer_registros(RANGOS["7 días"])
+#   t, temperatura = reducir(datos["t"], datos["temperatura"])
+#
+# Para no consultar de más, VigilanteBD avisa cuándo hubo escrituras
+# (PRAGMA data_version) y se puede usar como llave de caché:
+#   vigilante = VigilanteBD()
+#   vigilante.version()          -> cambia solo si alguien escribió
+#   vigilante.ultimos_conteos()  -> [(fecha, lechugas), ...] del más viejo al más nuevo
+#   vigilante.pagina_fotos(12)   -> análisis con foto, del más nuevo al más viejo
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from db import DB_NAME
+
+RANGOS = {
+    "5 minutos": 5 * 60,
+    "1 hora": 3600,
+    "24 horas": 24 * 3600,
+    "7 días": 7 * 24 * 3600,
+    "30 días": 30 * 24 * 3600,
+    "Temporada (6 meses)": 182 * 24 * 3600,
+}
+
+# Puntos máximos por serie que se mandan a una gráfica
+PUNTOS_GRAFICA = 800
+
+COLUMNAS = ("temperatura", "humedad", "lechugas")
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+# Análisis que se usan para la tendencia del conteo
+ANALISIS_TENDENCIA = 10
+
+def leer_registros(segundos, db_path=DB_NAME):
+    """
+    Registros de los últimos `segundos`, ordenados por fecha.
+    Retorna {"t": datetime64[s], "temperatura": float, ...} (None -> NaN)
+    """
+    desde = (datetime.now() - timedelta(seconds=segundos)).strftime(FORMATO_FECHA)
+    conn = sqlite3.connect(db_path, timeout=5)
+    try:
+        filas = conn.execute(
+            f"SELECT fecha, {', '.join(COLUMNAS)} FROM registros WHERE fecha >= ? ORDER BY fecha",
+            (desde,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    datos = {"t": np.array([f[0] for f in filas], dtype="datetime64[s]")}
+    for i, columna in enumerate(COLUMNAS, start=1):
+        datos[columna] = np.array([f[i] for f in filas], dtype=float)  # None queda como NaN
+    return datos
+
+def lttb(x, y, puntos=PUNTOS_GRAFICA):
+    """
+    Índices de `puntos` muestras que conservan la forma de (x, y).
+    Siempre incluye la primera y la última. x debe estar ordenado.
+    """
+    n = len(x)
+    if puntos >= n or puntos < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # puntos - 2 cubetas entre la primera y la última muestra
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(np.int64)
+    indices = np.empty(puntos, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for i in range(puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        # Punto promedio de la cubeta siguiente (la última apunta al punto final)
+        if i + 2 < len(bordes):
+            cx = x[fin:bordes[i + 2]].mean()
+            cy = y[fin:bordes[i + 2]].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+
+        # El que forma el triángulo más grande con el elegido anterior y ese promedio
+        areas = np.abs((x[a] - cx) * (y[inicio:fin] - y[a]) - (x[a] - x[inicio:fin]) * (cy - y[a]))
+        a = inicio + int(areas.argmax())
+        indices[i + 1] = a
+    return indices
+
+def reducir(t, y, puntos=PUNTOS_GRAFICA):
+    """Quita los NaN de la serie y la reduce con LTTB. Retorna (t, y)"""
+    validos = ~np.isnan(y)
+    t, y = t[validos], y[validos]
+    indices = lttb(t.astype("datetime64[s]").astype(np.int64), y, puntos)
+    return t[indices], y[indices]
+
+class VigilanteBD:
+    """
+    Detecta escrituras de otros procesos (main.py) sin leer las tablas:
+    PRAGMA data_version cambia cada vez que otra conexión hace commit.
+    Usa una sola conexión persistente; se puede llamar desde varios hilos.
+    """
+
+    def __init__(self, db_path=DB_NAME):
+        self._conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._version = 0
+
+    def version(self):
+        """Contador que sube cada vez que la BD cambió desde la última llamada"""
+        with self._lock:
+            (data_version,) = self._conn.execute("PRAGMA data_version").fetchone()
+            if data_version != self._data_version:
+                self._data_version = data_version
+                self._version += 1
+            return self._version
+
+    def ultimos_conteos(self, n=ANALISIS_TENDENCIA):
+        """Últimos `n` análisis con conteo: [(fecha, lechugas)] del más viejo al más nuevo"""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT fecha, lechugas FROM registros WHERE lechugas IS NOT NULL ORDER BY id DESC LIMIT ?",
+                (n,),
+            ).fetchall()
+        return filas[::-1]
+
+    def contar_fotos(self):
+        """Cuántos análisis tienen foto guardada"""
+        with self._lock:
+            (total,) = self._conn.execute(
+                "SELECT COUNT(*) FROM registros WHERE imagen IS NOT NULL OR imagen_procesada IS NOT NULL"
+            ).fetchone()
+        return total
+
+    def pagina_fotos(self, limite, desplazamiento=0):
+        """Análisis con foto, del más nuevo al más viejo, como diccionarios"""
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT id, fecha, lechugas, temperatura, humedad, imagen, imagen_procesada FROM registros "
+                "WHERE imagen IS NOT NULL OR imagen_procesada IS NOT NULL ORDER BY id DESC LIMIT ? OFFSET ?",
+                (limite, desplazamiento),
+            )
+            nombres = [c[0] for c in cur.description]
+            return [dict(zip(nombres, fila)) for fila in cur.fetchall()]
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
@@ -1,7 +1,10 @@
 import telebot
 from script_lechugas import recortar_lechugas_optimizado
-from db import guardar_registro
-from cliente_datos import ClienteDatos
+from db import BaseDatosAsync
+from cliente_datos import ClienteDatos, consultar
+from alertas import MotorAlertas, cargar_config, describir_config, suscribir_chat
+from graficas import ALIAS_RANGOS, GraficasHistorial, buscar_rango
+import io
 import os
 import cv2
 import numpy as np
@@ -28,6 +31,22 @@ CAMERA_INDEX = 0  # 0 para la cámara por defecto, 1, 2... para otras cámaras
 # Crear cliente de datos (se conecta al servidor)
 cliente = ClienteDatos(host="127.0.0.1", puerto=5000)
 
+# Clima que se guarda con cada análisis: promedio de la última ventana,
+# solo si el sensor dio señales hace poco (si no, se guarda "No disponible")
+VENTANA_CLIMA = 60      # segundos
+MAX_EDAD_SENSOR = 30    # segundos
+ESPERA_SENSOR = 5       # segundos a esperar una lectura fresca
+
+# Acceso a la BD fuera del hilo de polling (un escritor + lectores)
+bd = BaseDatosAsync(busy_timeout=10.0)
+
+# Alertas del sensor para los chats suscritos con /alertas on
+motor_alertas = MotorAlertas(cliente, enviar=lambda chat_id, texto: bot.send_message(chat_id, texto))
+motor_alertas.iniciar()
+
+# Gráficas de /historial: se dibujan en otro hilo y se guardan en caché
+graficas = GraficasHistorial(vigilante=motor_alertas.vigilante)
+
 # -------------------------------
 # FUNCIONES
 # -------------------------------
@@ -143,6 +162,35 @@ def obtener_datos_sensor():
     print("⏳ Obteniendo datos del sensor...")
     return cliente.obtener_datos()
 
+def obtener_clima():
+    """
+    Temperatura y humedad promedio de los últimos VENTANA_CLIMA segundos,
+    garantizando que el sensor respondió hace menos de MAX_EDAD_SENSOR.
+    Retorna None si no hay datos frescos.
+    """
+    print("⏳ Obteniendo datos del sensor...")
+    dato = cliente.esperar_dato(max_edad=MAX_EDAD_SENSOR, timeout=ESPERA_SENSOR)
+    if dato is None:
+        return None
+
+    resumen = cliente.estadisticas_ventana(VENTANA_CLIMA)
+    if not resumen or "temperatura" not in resumen or "humedad" not in resumen:
+        return dato  # Con banda muerta puede no haber lecturas en la ventana
+
+    return {
+        "temperatura": resumen["temperatura"]["media"],
+        "humedad": resumen["humedad"]["media"],
+        "muestras": resumen["muestras"],
+    }
+
+def reportar_guardado(futuro):
+    """Callback del Future de guardado: solo informa en consola"""
+    error = futuro.exception()
+    if error:
+        print(f"❌ Error guardando registro: {error}")
+    else:
+        print(f"✓ Registro guardado (id {futuro.result()})")
+
 # -------------------------------
 # COMANDOS DEL BOT
 # -------------------------------
@@ -155,6 +203,8 @@ def enviar_bienvenida(msg):
 Comandos disponibles:
 /analizar - Captura foto y analiza lechugas
 /estado - Verifica estado del bot
+/alertas on|off - Recibir avisos del sensor en este chat
+/historial [rango] - Gráfica de temperatura, humedad y lechugas (5m, 1h, 24h, 7d, 30d, temporada)
 /ayuda - Muestra este mensaje
 
 Envía cualquier mensaje para analizar lechugas 📸
@@ -173,14 +223,76 @@ def enviar_estado(msg):
     sensor_data = obtener_datos_sensor()
     sensor_ok = sensor_data is not None
     
+    # Estado del servidor de datos (consulta de un solo viaje)
+    try:
+        stats = consultar({"cmd": "stats"}, host=cliente.host, puerto=cliente.puerto, timeout=2)
+        servidor_txt = f"✅ {stats['clientes']} clientes | {len(stats['temas'])} sensores | seq {stats['seq']}"
+    except Exception:
+        servidor_txt = "❌ Sin respuesta"
+    
+    # Estado de la cola de la BD
+    metricas_bd = bd.obtener_metricas()["escritura"]
+    
     texto = f"""
 🔍 **Estado del Sistema**
 
 📷 Cámara: {'✅ Funcionando' if camara_ok else '❌ No disponible'}
 🌡️ Sensor: {'✅ Conectado' if sensor_ok else '❌ Desconectado'}
+🛰️ Servidor de datos: {servidor_txt}
+🗄️ BD: {metricas_bd['en_cola']} en cola | espera promedio {metricas_bd['espera_promedio_ms']:.1f} ms
 """
     bot.send_message(msg.chat.id, texto, parse_mode="Markdown")
 
+@bot.message_handler(commands=['alertas'])
+def alertas_comando(msg):
+    """Suscribe o desuscribe el chat de las alertas, o muestra las reglas"""
+    partes = msg.text.split()
+    opcion = partes[1].lower() if len(partes) > 1 else ""
+    
+    if opcion in ("on", "si", "sí"):
+        suscribir_chat(msg.chat.id, True)
+        bot.send_message(msg.chat.id, "🔔 Alertas activadas para este chat")
+        return
+    if opcion in ("off", "no"):
+        suscribir_chat(msg.chat.id, False)
+        bot.send_message(msg.chat.id, "🔕 Alertas desactivadas para este chat")
+        return
+    
+    config = cargar_config()
+    suscrito = msg.chat.id in config["chats"]
+    texto = (f"🔔 Alertas: {'activadas' if suscrito else 'desactivadas'} en este chat\n\n"
+             f"{describir_config(config)}\n\n"
+             "Usa /alertas on o /alertas off")
+    bot.send_message(msg.chat.id, texto)
+
+@bot.message_handler(commands=['historial'])
+def historial_comando(msg):
+    """Envía la gráfica del rango pedido sin bloquear el hilo del bot"""
+    chat_id = msg.chat.id
+    partes = msg.text.split(maxsplit=1)
+    rango = buscar_rango(partes[1] if len(partes) > 1 else "")
+    
+    if rango is None:
+        opciones = ", ".join(ALIAS_RANGOS)
+        bot.send_message(chat_id, f"❌ Rango no válido. Usa: /historial <rango> ({opciones})")
+        return
+    
+    def enviar_grafica(futuro):
+        error = futuro.exception()
+        if error:
+            print(f"❌ Error dibujando historial: {error}")
+            bot.send_message(chat_id, "❌ No se pudo generar la gráfica")
+            return
+        png, resumen = futuro.result()
+        foto = io.BytesIO(png)
+        foto.name = "historial.png"
+        try:
+            bot.send_photo(chat_id, foto, caption=resumen)
+        except Exception as e:
+            print(f"Error al enviar gráfica: {e}")
+    
+    graficas.solicitar(rango).add_done_callback(enviar_grafica)
+
 @bot.message_handler(commands=['analizar'])
 def analizar_comando(msg):
     """Comando específico para analizar"""
@@ -230,6 +342,7 @@ def procesar_analisis(msg):
         return
     
     # 3. Dibujar recuadros en la imagen
+    imagen_procesada = None
     if lechugas_info and len(lechugas_info) > 0:
         imagen_procesada = dibujar_detecciones(imagen_path, lechugas_info)
         
@@ -263,8 +376,8 @@ def procesar_analisis(msg):
         except Exception as e:
             print(f"Error al enviar foto: {e}")
     
-    # 4. Datos del sensor (del servidor compartido)
-    sensor = obtener_datos_sensor()
+    # 4. Datos del sensor (promedio reciente y fresco)
+    sensor = obtener_clima()
     print("Datos del sensor:", sensor)
     if sensor:
         temperatura = sensor.get("temperatura", "No disponible")
@@ -272,13 +385,22 @@ def procesar_analisis(msg):
     else:
         temperatura = "No disponible"
         humedad = "No disponible"
+    if sensor and sensor.get("muestras"):
+        nota_clima = f"\n📈 Promedio de {sensor['muestras']} lecturas ({VENTANA_CLIMA} s)"
+    elif sensor:
+        nota_clima = ""
+    else:
+        nota_clima = "\n⚠️ Sin lecturas recientes del sensor"
     
-    # 5. Guardar en SQLite
-    guardar_registro(
+    # 5. Guardar en SQLite (no bloquea: lo escribe el hilo de la BD)
+    futuro = bd.guardar_registro(
         cantidad,
         None if temperatura == "No disponible" else float(temperatura),
-        None if humedad == "No disponible" else float(humedad)
+        None if humedad == "No disponible" else float(humedad),
+        imagen=imagen_path,
+        imagen_procesada=imagen_procesada
     )
+    futuro.add_done_callback(reportar_guardado)
     
     # 6. Mensaje final con resultados detallados
     if lechugas_info and len(lechugas_info) > 0:
@@ -296,7 +418,7 @@ def procesar_analisis(msg):
 
 🌱 Lechugas detectadas: **{cantidad}**
 🌡️ Temperatura: **{temperatura}°C**
-💧 Humedad: **{humedad}%**
+💧 Humedad: **{humedad}%**{nota_clima}
 
 📊 **Detalle de lechugas:**
 {detalles}
@@ -309,7 +431,7 @@ def procesar_analisis(msg):
 
 🌱 Lechugas detectadas: **0**
 🌡️ Temperatura: **{temperatura}°C**
-💧 Humedad: **{humedad}%**
+💧 Humedad: **{humedad}%**{nota_clima}
 
 💡 **Sugerencias:**
 • Verifica la iluminación
@@ -332,4 +454,7 @@ try:
     bot.infinity_polling()
 except KeyboardInterrupt:
     print("\n✋ Bot detenido")
-    cliente.desconectar()
\ No newline at end of file
+    motor_alertas.detener()
+    graficas.cerrar()
+    cliente.desconectar()
+    bd.cerrar()
\ No newline at end of file
@@ -0,0 +1,164 @@
+# ============================================
+# MEMORIA COMPARTIDA - Último valor de cada tema sin sockets
+# Archivo: memoria_compartida.py
+# ============================================
+#
+# serial_server.py escribe aquí el último dato de cada tema y cualquier
+# proceso del mismo equipo lo lee con una lectura de memoria, sin thread
+# de lectura ni viaje por socket:
+#
+#   from memoria_compartida import LectorUltimo, ruta_segmento
+#   lector = LectorUltimo(ruta_segmento(5000))
+#   lector.leer()   -> {"sesion": ..., "temas": {"cama1": {...}}, "senales": {...}} o None
+#
+# El segmento es un archivo mapeado con mmap (en /dev/shm si existe, así
+# vive en RAM) dentro de la carpeta privada del usuario, con permisos 0600.
+# Se protege con un seqlock: el escritor pone `secuencia` en
+# impar, escribe y la deja en par; el lector reintenta si la ve impar o si
+# cambió mientras copiaba. Los lectores nunca bloquean al servidor.
+#
+# Distribución (little endian):
+#   0   magia      4s   b"TLB1"
+#   4   capacidad  uint32  bytes disponibles para el contenido
+#   8   secuencia  uint64  seqlock
+#   16  vivo       float64 epoch de la última señal del servidor
+#   24  longitud   uint32  bytes de contenido (0 = servidor detenido)
+#   32  contenido  JSON compacto {"sesion": ..., "temas": {tema: dato},
+#                                 "senales": {tema: epoch del último dato o latido}}
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from protocolo import directorio_privado
+
+MAGIA = b"TLB1"
+CAPACIDAD = 64 * 1024
+CABECERA = struct.Struct("<4sI")
+SECUENCIA = struct.Struct("<Q")
+VIVO = struct.Struct("<d")
+LONGITUD = struct.Struct("<I")
+POS_SECUENCIA, POS_VIVO, POS_LONGITUD, POS_CONTENIDO = 8, 16, 24, 32
+
+# Si el servidor no da señales en este tiempo el segmento se considera viejo
+MAX_SILENCIO = 3.0
+INTENTOS_LECTURA = 100
+
+def ruta_segmento(puerto):
+    """Segmento del servidor que escucha en `puerto` (None si no hay carpeta privada)"""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    carpeta = directorio_privado(base)
+    return os.path.join(carpeta, f"tlalibot_{puerto}") if carpeta else None
+
+class PublicadorUltimo:
+    """Lado del servidor: un solo escritor (el loop de eventos)"""
+
+    def __init__(self, ruta, capacidad=CAPACIDAD):
+        self.ruta = ruta
+        self.capacidad = capacidad
+        tamano = POS_CONTENIDO + capacidad
+
+        # Se reutiliza el mismo archivo (no se borra) para que los lectores
+        # que ya lo tienen mapeado vean al servidor nuevo
+        fd = os.open(ruta, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+        try:
+            if hasattr(os, "getuid") and os.fstat(fd).st_uid != os.getuid():
+                raise OSError(f"{ruta} es de otro usuario")
+            os.ftruncate(fd, tamano)
+            self._mapa = mmap.mmap(fd, tamano)
+        finally:
+            os.close(fd)
+
+        (secuencia,) = SECUENCIA.unpack_from(self._mapa, POS_SECUENCIA)
+        self._secuencia = secuencia + (secuencia & 1)  # Por si el anterior murió escribiendo
+        CABECERA.pack_into(self._mapa, 0, MAGIA, capacidad)
+        self._escribir(b"")
+
+    def _escribir(self, contenido):
+        mapa = self._mapa
+        self._secuencia += 1
+        SECUENCIA.pack_into(mapa, POS_SECUENCIA, self._secuencia)
+        LONGITUD.pack_into(mapa, POS_LONGITUD, len(contenido))
+        mapa[POS_CONTENIDO:POS_CONTENIDO + len(contenido)] = contenido
+        self._secuencia += 1
+        SECUENCIA.pack_into(mapa, POS_SECUENCIA, self._secuencia)
+        self.latido()
+
+    def publicar(self, sesion, temas, senales=None):
+        """Escribe el último dato de cada tema ({tema: dict}) y su última señal ({tema: epoch})"""
+        estado = {"sesion": sesion, "temas": temas}
+        if senales is not None:
+            estado["senales"] = senales
+        contenido = json.dumps(estado, separators=(",", ":")).encode()
+        if len(contenido) > self.capacidad:
+            print(f"⚠️ Último valor demasiado grande para la memoria compartida ({len(contenido)} bytes)")
+            return
+        self._escribir(contenido)
+
+    def latido(self):
+        """Marca que el servidor sigue vivo aunque no haya datos nuevos"""
+        VIVO.pack_into(self._mapa, POS_VIVO, time.time())
+
+    def cerrar(self):
+        """Deja el segmento vacío para que los lectores usen otro transporte"""
+        try:
+            self._escribir(b"")
+            self._mapa.close()
+        except (ValueError, OSError):
+            pass
+
+class LectorUltimo:
+    """Lado de los clientes. Lanza OSError si el segmento no existe"""
+
+    def __init__(self, ruta, max_silencio=MAX_SILENCIO):
+        self.ruta = ruta
+        self.max_silencio = max_silencio
+        with open(ruta, "rb") as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magia, _ = CABECERA.unpack_from(self._mapa, 0)
+        if magia != MAGIA:
+            self._mapa.close()
+            raise OSError(f"{ruta} no es un segmento de Tlalibot")
+
+        # Solo se decodifica el JSON cuando cambia la secuencia
+        self._secuencia = None
+        self._valor = None
+
+    def vivo(self):
+        """True si el servidor dio señales hace poco"""
+        (vivo,) = VIVO.unpack_from(self._mapa, POS_VIVO)
+        return time.time() - vivo <= self.max_silencio
+
+    def leer(self):
+        """
+        Retorna {"sesion": ..., "temas": {tema: dato}, "senales": {tema: epoch}}
+        o None si el servidor está detenido o no responde
+        """
+        if not self.vivo():
+            return None
+
+        mapa = self._mapa
+        for _ in range(INTENTOS_LECTURA):
+            (antes,) = SECUENCIA.unpack_from(mapa, POS_SECUENCIA)
+            if antes & 1:
+                time.sleep(0)  # Escritura en curso: ceder el GIL y reintentar
+                continue
+            if antes == self._secuencia:
+                return self._valor
+
+            (longitud,) = LONGITUD.unpack_from(mapa, POS_LONGITUD)
+            contenido = mapa[POS_CONTENIDO:POS_CONTENIDO + min(longitud, len(mapa) - POS_CONTENIDO)]
+            (despues,) = SECUENCIA.unpack_from(mapa, POS_SECUENCIA)
+            if antes != despues:
+                continue  # Cambió mientras copiábamos
+
+            self._secuencia = antes
+            self._valor = json.loads(contenido) if contenido else None
+            return self._valor
+        return None
+
+    def cerrar(self):
+        self._mapa.close()
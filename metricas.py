@@ -0,0 +1,228 @@
+# ============================================
+# MÉTRICAS - Registro en proceso con formato Prometheus
+# Archivo: metricas.py
+# ============================================
+#
+# Uso:
+#   from metricas import REGISTRO, iniciar_servidor_metricas
+#   lineas = REGISTRO.contador("lineas_total", "Líneas leídas", ["tema"])
+#   lineas.etiquetas(tema="cama1").inc()
+#   iniciar_servidor_metricas(9108)   # http://127.0.0.1:9108/metrics
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Límites por defecto para latencias (segundos)
+LIMITES_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _formatear_etiquetas(nombres, valores, extra=None):
+    pares = list(zip(nombres, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in pares) + "}"
+
+def _formatear_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.nombres_etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._hijos = {}
+        if not self.nombres_etiquetas:
+            self._hijos[()] = self._nuevo_hijo()  # Exponer 0 desde el inicio
+
+    def etiquetas(self, **valores):
+        """Retorna la serie con esas etiquetas (se crea la primera vez)"""
+        clave = tuple(str(valores[n]) for n in self.nombres_etiquetas)
+        hijo = self._hijos.get(clave)
+        if hijo is None:
+            with self._lock:
+                hijo = self._hijos.setdefault(clave, self._nuevo_hijo())
+        return hijo
+
+    def _serie_sin_etiquetas(self):
+        return self.etiquetas()
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for clave, hijo in list(self._hijos.items()):
+            lineas.extend(hijo.exponer(self.nombre, self.nombres_etiquetas, clave))
+        return lineas
+
+class _ValorSimple:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valor = 0
+
+    def inc(self, cantidad=1):
+        with self._lock:
+            self.valor += cantidad
+
+    def set(self, valor):
+        self.valor = valor
+
+    def exponer(self, nombre, nombres, valores):
+        return [f"{nombre}{_formatear_etiquetas(nombres, valores)} {_formatear_numero(self.valor)}"]
+
+class Contador(_Metrica):
+    """Valor que solo crece (p. ej. bytes enviados)"""
+    tipo = "counter"
+
+    def _nuevo_hijo(self):
+        return _ValorSimple()
+
+    def inc(self, cantidad=1):
+        self._serie_sin_etiquetas().inc(cantidad)
+
+class Medidor(_Metrica):
+    """Valor que sube y baja (p. ej. clientes conectados)"""
+    tipo = "gauge"
+
+    def _nuevo_hijo(self):
+        return _ValorSimple()
+
+    def set(self, valor):
+        self._serie_sin_etiquetas().set(valor)
+
+class _SerieHistograma:
+    def __init__(self, limites):
+        self._lock = threading.Lock()
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.cuenta = 0
+
+    def observar(self, valor):
+        i = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            self.cubetas[i] += 1
+            self.suma += valor
+            self.cuenta += 1
+
+    def exponer(self, nombre, nombres, valores):
+        with self._lock:
+            cubetas = list(self.cubetas)
+            suma, cuenta = self.suma, self.cuenta
+        lineas = []
+        acumulado = 0
+        for limite, n in zip(list(self.limites) + [float("inf")], cubetas):
+            acumulado += n
+            etiquetas = _formatear_etiquetas(nombres, valores, ("le", _formatear_numero(float(limite))))
+            lineas.append(f"{nombre}_bucket{etiquetas} {acumulado}")
+        etiquetas = _formatear_etiquetas(nombres, valores)
+        lineas.append(f"{nombre}_sum{etiquetas} {_formatear_numero(suma)}")
+        lineas.append(f"{nombre}_count{etiquetas} {cuenta}")
+        return lineas
+
+class Histograma(_Metrica):
+    """Distribución de valores en cubetas acumuladas (p. ej. latencias)"""
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        self.limites = tuple(sorted(limites))
+        super().__init__(nombre, ayuda, etiquetas)
+
+    def _nuevo_hijo(self):
+        return _SerieHistograma(self.limites)
+
+    def observar(self, valor):
+        self._serie_sin_etiquetas().observar(valor)
+
+class Registro:
+    """Conjunto de métricas de un proceso"""
+
+    def __init__(self, prefijo="tlalibot_"):
+        self.prefijo = prefijo
+        self._metricas = {}
+        self._recolectores = []
+        self._lock = threading.Lock()
+
+    def _registrar(self, clase, nombre, *args, **kwargs):
+        nombre = self.prefijo + nombre
+        with self._lock:
+            metrica = self._metricas.get(nombre)
+            if metrica is None:
+                metrica = clase(nombre, *args, **kwargs)
+                self._metricas[nombre] = metrica
+            return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador, nombre, ayuda, etiquetas)
+
+    def medidor(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Medidor, nombre, ayuda, etiquetas)
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        return self._registrar(Histograma, nombre, ayuda, etiquetas, limites=limites)
+
+    def recolector(self, funcion):
+        """
+        Registra una función que se llama en cada consulta, para valores
+        que se leen en el momento (p. ej. profundidad de cola por cliente).
+        Debe retornar [(nombre, tipo, ayuda, [(dict_etiquetas, valor), ...])].
+        """
+        self._recolectores.append(funcion)
+
+    def exponer_texto(self):
+        lineas = []
+        for metrica in list(self._metricas.values()):
+            lineas.extend(metrica.exponer())
+
+        for funcion in self._recolectores:
+            try:
+                familias = funcion()
+            except Exception as e:
+                print(f"❌ Error en recolector de métricas: {e}")
+                continue
+            for nombre, tipo, ayuda, muestras in familias:
+                nombre = self.prefijo + nombre
+                lineas.append(f"# HELP {nombre} {ayuda}")
+                lineas.append(f"# TYPE {nombre} {tipo}")
+                for etiquetas, valor in muestras:
+                    texto = _formatear_etiquetas(list(etiquetas), list(etiquetas.values()))
+                    lineas.append(f"{nombre}{texto} {_formatear_numero(valor)}")
+
+        return "\n".join(lineas) + "\n"
+
+# Registro compartido por todo el proceso
+REGISTRO = Registro()
+
+def iniciar_servidor_metricas(puerto, host="127.0.0.1", registro=REGISTRO):
+    """Expone /metrics en un hilo aparte. Retorna el servidor HTTP"""
+
+    class Manejador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            cuerpo = registro.exponer_texto().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", TIPO_CONTENIDO)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass  # No llenar la consola con cada consulta
+
+    servidor = ThreadingHTTPServer((host, puerto), Manejador)
+    servidor.daemon_threads = True
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    return servidor
@@ -0,0 +1,117 @@
+# ============================================
+# MINIATURAS - Caché en disco para la galería de fotos
+# Archivo: miniaturas.py
+# ============================================
+#
+# Las capturas pesan varios MB; la galería solo muestra miniaturas JPEG
+# chicas que se generan una vez y se guardan en DIRECTORIO_MINIATURAS:
+#
+#   from miniaturas import obtener_miniatura, limpiar_cache
+#   ruta = obtener_miniatura("fotos_procesadas/procesada_20250301_101500.jpg")
+#   limpiar_cache()   # borra las menos usadas si el caché pasa de MAX_BYTES_CACHE
+#
+# La llave incluye la fecha de modificación y el tamaño del original, así
+# que si la foto cambia se genera otra miniatura. Cada uso actualiza la
+# fecha del archivo en caché y limpiar_cache() borra primero las más viejas
+# (se llama sola cada LIMPIAR_CADA miniaturas nuevas).
+
+import hashlib
+import os
+import threading
+
+import cv2
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_MINIATURAS = os.path.join(BASE_DIR, ".miniaturas")
+
+TAMANO_MINIATURA = 320      # Lado mayor en píxeles
+CALIDAD_JPEG = 80
+MAX_BYTES_CACHE = 200 * 1024 * 1024
+LIMPIAR_CADA = 50
+
+# Originales más grandes que esto se leen ya reducidos por el decodificador
+# JPEG (mucho más rápido que decodificar completo y luego achicar)
+BYTES_LECTURA_REDUCIDA = 1024 * 1024
+
+_nuevas = 0
+
+def _llave(ruta, tamano):
+    info = os.stat(ruta)
+    texto = f"{os.path.abspath(ruta)}|{info.st_mtime_ns}|{info.st_size}|{tamano}"
+    return hashlib.sha1(texto.encode()).hexdigest()
+
+def _leer_reducida(ruta):
+    if os.path.getsize(ruta) > BYTES_LECTURA_REDUCIDA:
+        img = cv2.imread(ruta, cv2.IMREAD_REDUCED_COLOR_4)
+        if img is not None and max(img.shape[:2]) >= TAMANO_MINIATURA:
+            return img
+    return cv2.imread(ruta)
+
+def obtener_miniatura(ruta, tamano=TAMANO_MINIATURA, directorio=DIRECTORIO_MINIATURAS):
+    """Ruta de la miniatura de `ruta` (la genera si no está). None si no se puede leer"""
+    global _nuevas
+    try:
+        llave = _llave(ruta, tamano)
+    except OSError:
+        return None
+    destino = os.path.join(directorio, f"{llave}.jpg")
+
+    if os.path.exists(destino):
+        try:
+            os.utime(destino)  # Recién usada: la última en borrarse
+        except OSError:
+            pass
+        return destino
+
+    img = _leer_reducida(ruta)
+    if img is None:
+        return None
+    alto, ancho = img.shape[:2]
+    escala = tamano / max(alto, ancho)
+    if escala < 1:
+        img = cv2.resize(img, (max(1, int(ancho * escala)), max(1, int(alto * escala))),
+                         interpolation=cv2.INTER_AREA)
+
+    # Escribir aparte y renombrar: otra sesión nunca ve un archivo a medias
+    os.makedirs(directorio, exist_ok=True)
+    ok, datos = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, CALIDAD_JPEG])
+    if not ok:
+        return None
+    temporal = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos.tobytes())
+    os.replace(temporal, destino)
+
+    _nuevas += 1
+    if _nuevas % LIMPIAR_CADA == 0:
+        limpiar_cache(directorio=directorio)
+    return destino
+
+def limpiar_cache(max_bytes=MAX_BYTES_CACHE, directorio=DIRECTORIO_MINIATURAS):
+    """Borra las miniaturas usadas hace más tiempo hasta quedar bajo `max_bytes`. Retorna cuántas borró"""
+    try:
+        entradas = [e for e in os.scandir(directorio) if e.is_file() and e.name.endswith(".jpg")]
+    except FileNotFoundError:
+        return 0
+
+    archivos = []
+    total = 0
+    for entrada in entradas:
+        try:
+            info = entrada.stat()
+        except OSError:
+            continue
+        archivos.append((info.st_mtime, info.st_size, entrada.path))
+        total += info.st_size
+
+    borradas = 0
+    for _, tamano, ruta in sorted(archivos):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(ruta)
+        except OSError:
+            continue
+        total -= tamano
+        borradas += 1
+    return borradas
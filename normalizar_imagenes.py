@@ -0,0 +1,300 @@
+# ============================================
+# NORMALIZADOR DE IMÁGENES - Redimensiona lotes de fotos
+# Archivo: normalizar_imagenes.py
+# ============================================
+#
+# Lleva todas las imágenes de una carpeta (o de un patrón glob) a un mismo
+# tamaño, repartiendo el trabajo entre varios procesos. Solo procesa lo
+# que cambió desde la última corrida, así que se puede correr cada noche:
+#
+# Uso:
+#   python normalizar_imagenes.py fotos --referencia fotos/1.png
+#   python normalizar_imagenes.py "fotos_capturadas/*.jpg" --tamano 1280x720 --mantener-aspecto
+#   python normalizar_imagenes.py fotos_capturadas --tamano 640x480 --hash --procesos 4
+#
+# Cada salida queda en <salida>/<ruta relativa a la entrada>. El manifiesto
+# <salida>/.manifiesto_normalizacion.json guarda fecha de modificación,
+# tamaño (y sha1 con --hash) de cada original: si no cambió, ni se abre.
+# Si un original se borró, su salida y su entrada del manifiesto también.
+# Dos originales que irían a la misma salida (mismo nombre en dos entradas,
+# o a.jpg y a.png con --formato) se rechazan antes de empezar.
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import cv2
+
+DIRECTORIO_SALIDA = "fotos_redimensionadas"
+ARCHIVO_MANIFIESTO = ".manifiesto_normalizacion.json"
+EXTENSIONES = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+# Formatos de salida que no guardan transparencia
+FORMATOS_SIN_ALFA = (".jpg", ".jpeg", ".bmp")
+
+# Imágenes por tarea enviada a cada proceso y cada cuántas se guarda el manifiesto
+LOTE_PROCESOS = 16
+GUARDAR_CADA = 500
+
+COLOR_RELLENO = (0, 0, 0)
+
+def leer_tamano(texto):
+    """'640x480' -> (640, 480)"""
+    try:
+        ancho, alto = (int(v) for v in texto.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Tamaño inválido '{texto}', usa ANCHOxALTO (ej. 640x480)")
+    if ancho <= 0 or alto <= 0:
+        raise argparse.ArgumentTypeError("El tamaño debe ser positivo")
+    return ancho, alto
+
+def listar_imagenes(entradas, recursivo=False):
+    """
+    Genera (ruta, relativa) de cada imagen de `entradas` (carpetas o patrones
+    glob). `relativa` es la ruta dentro de la carpeta o de la parte fija del patrón.
+    """
+    vistas = set()
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            base = entrada
+            if recursivo:
+                rutas = (os.path.join(d, n) for d, _, nombres in os.walk(entrada) for n in sorted(nombres))
+            else:
+                rutas = (e.path for e in sorted(os.scandir(entrada), key=lambda e: e.name))
+        else:
+            # La base es lo que va antes del primer comodín
+            partes = entrada.replace("\\", "/").split("/")
+            fijas = []
+            for parte in partes[:-1]:
+                if glob.has_magic(parte):
+                    break
+                fijas.append(parte)
+            base = "/".join(fijas) or "."
+            rutas = glob.iglob(entrada, recursive=recursivo)
+
+        for ruta in rutas:
+            if not ruta.lower().endswith(EXTENSIONES) or not os.path.isfile(ruta):
+                continue
+            real = os.path.abspath(ruta)
+            if real in vistas:
+                continue
+            vistas.add(real)
+            yield ruta, os.path.relpath(ruta, base)
+
+def sha1_archivo(ruta, bloque=1024 * 1024):
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for parte in iter(lambda: f.read(bloque), b""):
+            h.update(parte)
+    return h.hexdigest()
+
+def redimensionar(img, tamano, mantener_aspecto=False):
+    """Lleva `img` a `tamano` (ancho, alto). Con aspecto: la ajusta dentro y rellena los bordes"""
+    ancho, alto = tamano
+    alto_img, ancho_img = img.shape[:2]
+    if (ancho_img, alto_img) == (ancho, alto):
+        return img
+
+    if not mantener_aspecto:
+        interpolacion = cv2.INTER_AREA if ancho * alto < ancho_img * alto_img else cv2.INTER_LINEAR
+        return cv2.resize(img, (ancho, alto), interpolation=interpolacion)
+
+    escala = min(ancho / ancho_img, alto / alto_img)
+    nuevo = (max(1, round(ancho_img * escala)), max(1, round(alto_img * escala)))
+    interpolacion = cv2.INTER_AREA if escala < 1 else cv2.INTER_LINEAR
+    img = cv2.resize(img, nuevo, interpolation=interpolacion)
+    arriba = (alto - nuevo[1]) // 2
+    izquierda = (ancho - nuevo[0]) // 2
+    return cv2.copyMakeBorder(img, arriba, alto - nuevo[1] - arriba, izquierda, ancho - nuevo[0] - izquierda,
+                              cv2.BORDER_CONSTANT, value=COLOR_RELLENO)
+
+def normalizar_una(tarea):
+    """
+    Trabajo de cada proceso: (ruta, relativa, destino, tamano, mantener_aspecto, usar_hash, previo).
+    Retorna (ruta, relativa, estado, registro) con estado "normalizada", "sin_cambios" o "error"
+    """
+    ruta, relativa, destino, tamano, mantener_aspecto, usar_hash, previo = tarea
+    try:
+        info = os.stat(ruta)
+        registro = {"mtime_ns": info.st_mtime_ns, "bytes": info.st_size}
+        if usar_hash:
+            registro["sha1"] = sha1_archivo(ruta)
+            # Tocada pero igual por dentro: basta con actualizar el manifiesto
+            if previo and previo.get("sha1") == registro["sha1"] and os.path.exists(destino):
+                return ruta, relativa, "sin_cambios", registro
+
+        img = cv2.imread(ruta, cv2.IMREAD_UNCHANGED)
+        if img is None:
+            return ruta, relativa, "error", "no se pudo leer"
+        extension = os.path.splitext(destino)[1]
+        # Un PNG con transparencia no se puede codificar como jpg
+        if img.ndim == 3 and img.shape[2] == 4 and extension.lower() in FORMATOS_SIN_ALFA:
+            img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
+        img = redimensionar(img, tamano, mantener_aspecto)
+
+        # Escribir aparte y renombrar: nunca queda una salida a medias
+        os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+        ok, datos = cv2.imencode(extension, img)
+        if not ok:
+            return ruta, relativa, "error", f"no se pudo codificar como {extension}"
+        temporal = f"{destino}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(datos.tobytes())
+        os.replace(temporal, destino)
+        return ruta, relativa, "normalizada", registro
+    except Exception as e:
+        return ruta, relativa, "error", str(e)
+
+def cargar_manifiesto(salida):
+    ruta = os.path.join(salida, ARCHIVO_MANIFIESTO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def guardar_manifiesto(salida, manifiesto):
+    os.makedirs(salida, exist_ok=True)
+    ruta = os.path.join(salida, ARCHIVO_MANIFIESTO)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f)
+    os.replace(ruta + ".tmp", ruta)
+
+def listar_destinos(entradas, recursivo=False, formato=None):
+    """
+    {relativa: ruta} de todo lo que se va a normalizar. Lanza ValueError si
+    dos originales irían al mismo archivo de salida.
+    """
+    destinos = {}
+    vistas = {}  # relativa normalizada (sin mayúsculas en Windows) -> ruta
+    for ruta, relativa in listar_imagenes(entradas, recursivo):
+        if formato:
+            relativa = os.path.splitext(relativa)[0] + "." + formato.lstrip(".")
+        llave = os.path.normcase(relativa)
+        if llave in vistas:
+            raise ValueError(f"{vistas[llave]} y {ruta} irían a la misma salida ({relativa}); "
+                             "normalízalas por separado con distinta --salida")
+        vistas[llave] = ruta
+        destinos[relativa] = ruta
+    return destinos
+
+def podar(salida, archivos, destinos):
+    """
+    Anota el original de cada entrada listada y borra (salida y entrada del
+    manifiesto) las que no se listaron y cuyo original ya no existe. Lo que
+    solo quedó fuera de las `entradas` de esta corrida no se toca.
+    Retorna cuántas se eliminaron.
+    """
+    eliminadas = 0
+    for relativa, registro in list(archivos.items()):
+        if relativa in destinos:
+            registro["origen"] = os.path.abspath(destinos[relativa])
+            continue
+        origen = registro.get("origen")
+        if origen is None or os.path.exists(origen):
+            continue
+        try:
+            os.remove(os.path.join(salida, relativa))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ No se pudo borrar {relativa}: {e}")
+            continue
+        del archivos[relativa]
+        eliminadas += 1
+    return eliminadas
+
+def normalizar(entradas, salida=DIRECTORIO_SALIDA, tamano=None, referencia=None, mantener_aspecto=False,
+               usar_hash=False, procesos=None, formato=None, recursivo=False, forzar=False):
+    """
+    Normaliza las imágenes de `entradas` a `tamano` (ancho, alto) o al de
+    `referencia`. Retorna un diccionario con cuántas se normalizaron,
+    omitieron, fallaron y se eliminaron porque ya no existe el original.
+    """
+    if referencia is not None:
+        img_ref = cv2.imread(referencia)
+        if img_ref is None:
+            raise FileNotFoundError(f"No se pudo abrir la imagen de referencia: {referencia}")
+        tamano = (img_ref.shape[1], img_ref.shape[0])
+    if tamano is None:
+        raise ValueError("Indica un tamaño o una imagen de referencia")
+
+    # Los parámetros van en el manifiesto: si cambian, se rehace todo
+    parametros = {"tamano": list(tamano), "mantener_aspecto": mantener_aspecto, "formato": formato}
+    manifiesto = cargar_manifiesto(salida)
+    if forzar or manifiesto.get("parametros") != parametros:
+        manifiesto = {"parametros": parametros, "archivos": {}}
+    archivos = manifiesto["archivos"]
+
+    resumen = {"normalizadas": 0, "omitidas": 0, "errores": 0, "eliminadas": 0}
+    inicio = time.monotonic()
+    # Todo el listado y el manifiesto se manejan en este hilo: a los
+    # procesos solo viajan tuplas y la relativa regresa con el resultado
+    destinos = listar_destinos(entradas, recursivo, formato)
+
+    tareas = []
+    for relativa, ruta in destinos.items():
+        destino = os.path.join(salida, relativa)
+        previo = archivos.get(relativa)
+        try:
+            info = os.stat(ruta)
+        except OSError:
+            continue
+        # Camino rápido: misma fecha y tamaño que la última vez, sin abrir el archivo
+        if (previo and previo["mtime_ns"] == info.st_mtime_ns and previo["bytes"] == info.st_size
+                and os.path.exists(destino)):
+            resumen["omitidas"] += 1
+            continue
+        tareas.append((ruta, relativa, destino, tuple(tamano), mantener_aspecto, usar_hash, previo))
+
+    procesadas = 0
+    with Pool(processes=procesos) as pool:
+        for ruta, relativa, estado, registro in pool.imap_unordered(normalizar_una, tareas,
+                                                                    chunksize=LOTE_PROCESOS):
+            if estado == "error":
+                resumen["errores"] += 1
+                print(f"❌ {ruta}: {registro}")
+                continue
+            archivos[relativa] = registro
+            resumen["normalizadas" if estado == "normalizada" else "omitidas"] += 1
+            procesadas += 1
+            if procesadas % GUARDAR_CADA == 0:
+                guardar_manifiesto(salida, manifiesto)
+                print(f"  ... {procesadas} procesadas ({time.monotonic() - inicio:.1f} s)")
+
+    resumen["eliminadas"] = podar(salida, archivos, destinos)
+    guardar_manifiesto(salida, manifiesto)
+    resumen["segundos"] = time.monotonic() - inicio
+    return resumen
+
+def main():
+    parser = argparse.ArgumentParser(description="Redimensiona lotes de imágenes a un mismo tamaño")
+    parser.add_argument("entradas", nargs="+", help="Carpetas o patrones glob (ej. \"fotos/*.jpg\")")
+    destino = parser.add_mutually_exclusive_group(required=True)
+    destino.add_argument("--tamano", type=leer_tamano, help="Tamaño final ANCHOxALTO (ej. 640x480)")
+    destino.add_argument("--referencia", help="Usar el tamaño de esta imagen")
+    parser.add_argument("--salida", default=DIRECTORIO_SALIDA, help="Carpeta de salida")
+    parser.add_argument("--mantener-aspecto", action="store_true",
+                        help="Ajustar sin deformar y rellenar los bordes")
+    parser.add_argument("--hash", action="store_true",
+                        help="Comparar por contenido (sha1) cuando cambió la fecha del archivo")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos a usar (por defecto, uno por CPU)")
+    parser.add_argument("--formato", help="Extensión de salida (ej. png); por defecto la del original")
+    parser.add_argument("--recursivo", action="store_true", help="Incluir subcarpetas (y ** en patrones)")
+    parser.add_argument("--forzar", action="store_true", help="Ignorar el manifiesto y rehacer todo")
+    args = parser.parse_args()
+
+    try:
+        resumen = normalizar(args.entradas, salida=args.salida, tamano=args.tamano, referencia=args.referencia,
+                             mantener_aspecto=args.mantener_aspecto, usar_hash=args.hash, procesos=args.procesos,
+                             formato=args.formato, recursivo=args.recursivo, forzar=args.forzar)
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(str(e))
+    print(f"✓ {resumen['normalizadas']} normalizadas | {resumen['omitidas']} sin cambios | "
+          f"{resumen['errores']} errores | {resumen['eliminadas']} eliminadas | "
+          f"{resumen['segundos']:.1f} s → {args.salida}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# ============================================
+# PROTOCOLO DE DATOS - Compartido por servidor y clientes
+# Archivo: protocolo.py
+# ============================================
+#
+# Formatos de envío:
+#   "json" (por defecto) -> una línea JSON por lectura, terminada en \n
+#   "bin"                -> frames binarios con prefijo de longitud
+#
+# Negociación: al conectarse el cliente envía una línea
+#   {"cmd": "hola", "formato": "bin"}
+# y el servidor responde (todavía en JSON) con
+#   {"resp": "hola", "formato": "bin"}
+# A partir de esa respuesta todo llega en el formato pedido. Un cliente que
+# no envía nada sigue recibiendo JSON como siempre.
+#
+# Frame binario (big endian):
+#   longitud uint32  -> bytes que siguen a este campo
+#   tipo     uint8
+#   seq      uint64
+#   ts       float64 (epoch en segundos)
+#   payload  (longitud - 17 bytes)
+#
+#   TIPO_LECTURA: payload = temperatura float32, humedad float32, tema UTF-8
+#   TIPO_JSON:    payload = JSON compacto UTF-8 (cualquier otro dato)
+#
+# Al decodificar, seq y ts de la cabecera se agregan al dato como en JSON.
+# Las respuestas a comandos van con seq 0 (sin secuencia): no se agregan,
+# y un campo "seq"/"ts" propio del payload nunca se sobrescribe.
+#
+# Cada lectura lleva el tema (dispositivo) de donde viene, p. ej. "cama1".
+# En JSON va como campo "tema". Los clientes se suscriben con patrones:
+#   {"cmd": "hola", "temas": ["cama*"]}
+#
+# El mismo protocolo se sirve por TCP y, en el mismo equipo, por un socket
+# Unix en ruta_socket_unix(puerto) (sin pila TCP). El último valor de cada
+# tema también se publica en memoria compartida (ver memoria_compartida.py).
+# Ambos viven en una carpeta privada del usuario (directorio_privado): otro
+# usuario del equipo no puede crearlos antes para hacerse pasar por el servidor.
+
+import json
+import os
+import socket
+import stat
+import struct
+import tempfile
+import time
+
+FORMATO_JSON = "json"
+FORMATO_BINARIO = "bin"
+FORMATOS = (FORMATO_JSON, FORMATO_BINARIO)
+
+TIPO_LECTURA = 1
+TIPO_JSON = 2
+
+LONGITUD = struct.Struct("!I")
+CABECERA = struct.Struct("!BQd")
+LECTURA = struct.Struct("!ff")
+
+# Frames más grandes que esto se consideran corruptos
+MAX_FRAME = 1 << 20
+
+def es_privado(ruta, mascara=0o022):
+    """
+    True si `ruta` (sin seguir enlaces) es del usuario actual y no tiene
+    ninguno de los permisos de `mascara` para otros (por defecto, escritura)
+    """
+    if not hasattr(os, "getuid"):
+        return True  # Windows: sin dueños POSIX, la carpeta temporal ya es del usuario
+    try:
+        info = os.lstat(ruta)
+    except OSError:
+        return False
+    return (info.st_uid == os.getuid() and not stat.S_ISLNK(info.st_mode)
+            and not info.st_mode & mascara)
+
+def directorio_privado(base=None):
+    """
+    <base>/tlalibot-<uid> con permisos 0700 (la crea si no existe). None si
+    existe pero es de otro usuario o la pueden ver otros.
+    """
+    base = base or tempfile.gettempdir()
+    if not hasattr(os, "getuid"):
+        return base
+    ruta = os.path.join(base, f"tlalibot-{os.getuid()}")
+    try:
+        os.mkdir(ruta, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return None
+    return ruta if es_privado(ruta, 0o077) else None
+
+def ruta_socket_unix(puerto):
+    """
+    Socket Unix del servidor que escucha en `puerto` (None si el sistema no
+    lo soporta o no hay carpeta privada)
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    carpeta = directorio_privado()
+    return os.path.join(carpeta, f"tlalibot_{puerto}.sock") if carpeta else None
+
+CAMPOS_LECTURA = ("temperatura", "humedad")
+
+def _json_compacto(obj):
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+def es_lectura_simple(dato):
+    """True si el dato es exactamente {temperatura, humedad} numéricos"""
+    return (
+        len(dato) == 2
+        and all(isinstance(dato.get(c), (int, float)) for c in CAMPOS_LECTURA)
+    )
+
+class Mensaje:
+    """
+    Una lectura con su número de secuencia y marca de tiempo.
+    Cada formato se codifica una sola vez y los mismos bytes se
+    comparten entre todos los clientes que lo piden.
+    """
+    __slots__ = ("dato", "seq", "ts", "tema", "_codificado")
+
+    def __init__(self, dato, seq, ts=None, tema=None):
+        self.dato = dato
+        self.seq = seq
+        self.ts = time.time() if ts is None else ts
+        self.tema = tema
+        self._codificado = {}
+
+    def codificar(self, formato=FORMATO_JSON):
+        frame = self._codificado.get(formato)
+        if frame is None:
+            if formato == FORMATO_BINARIO:
+                frame = codificar_binario(self.dato, self.seq, self.ts, self.tema)
+            else:
+                frame = codificar_json(self.dato, self.seq, self.ts, self.tema)
+            self._codificado[formato] = frame
+        return frame
+
+def codificar_json(dato, seq=None, ts=None, tema=None):
+    """Línea JSON; seq, ts y tema se agregan como campos extra"""
+    if seq is not None:
+        dato = {**dato, "seq": seq, "ts": ts}
+    if tema is not None:
+        dato = {**dato, "tema": tema}
+    return _json_compacto(dato) + b"\n"
+
+def codificar_binario(dato, seq=0, ts=0.0, tema=None):
+    if es_lectura_simple(dato):
+        tipo = TIPO_LECTURA
+        payload = LECTURA.pack(dato["temperatura"], dato["humedad"])
+        if tema:
+            payload += tema.encode()
+    else:
+        tipo = TIPO_JSON
+        payload = _json_compacto(dato if tema is None else {**dato, "tema": tema})
+
+    cuerpo = CABECERA.pack(tipo, seq or 0, ts or 0.0) + payload
+    return LONGITUD.pack(len(cuerpo)) + cuerpo
+
+def decodificar_cuerpo(cuerpo):
+    """
+    Convierte el cuerpo de un frame binario (sin longitud) en dict.
+    Un frame corrupto o truncado lanza ValueError, igual que en JSON.
+    """
+    try:
+        return _decodificar_cuerpo(cuerpo)
+    except struct.error as e:
+        raise ValueError(f"Frame truncado: {e}") from None
+
+def _decodificar_cuerpo(cuerpo):
+    tipo, seq, ts = CABECERA.unpack_from(cuerpo)
+    payload = cuerpo[CABECERA.size:]
+
+    if tipo == TIPO_LECTURA:
+        temperatura, humedad = LECTURA.unpack_from(payload)
+        # float32 -> redondear para no mostrar 23.100000381469727
+        dato = {"temperatura": round(temperatura, 2), "humedad": round(humedad, 2)}
+        if len(payload) > LECTURA.size:
+            dato["tema"] = bytes(payload[LECTURA.size:]).decode()
+    elif tipo == TIPO_JSON:
+        dato = json.loads(bytes(payload))
+        if not isinstance(dato, dict):
+            raise ValueError("El payload JSON del frame no es un objeto")
+    else:
+        raise ValueError(f"Tipo de frame desconocido: {tipo}")
+
+    if seq:
+        dato.setdefault("seq", seq)
+        dato.setdefault("ts", ts)
+    return dato
+
+class LectorFlujo:
+    """
+    Separa el flujo de bytes del servidor en mensajes (dicts).
+    Empieza en JSON por líneas y cambia a binario cuando llega la
+    respuesta {"resp": "hola", "formato": "bin"}.
+    """
+
+    def __init__(self):
+        self.formato = FORMATO_JSON
+        self.buffer = bytearray()
+        # Hasta dónde ya se buscó \n sin encontrarlo: una línea que llega en
+        # muchos pedazos no se vuelve a recorrer desde el principio
+        self._revisado = 0
+
+    def alimentar(self, datos):
+        """Agrega bytes recibidos (bytes o memoryview) y retorna los mensajes completos"""
+        self.buffer += datos
+        mensajes = []
+        inicio = 0
+
+        while True:
+            if self.formato == FORMATO_BINARIO:
+                if len(self.buffer) - inicio < LONGITUD.size:
+                    break
+                (longitud,) = LONGITUD.unpack_from(self.buffer, inicio)
+                if longitud < CABECERA.size or longitud > MAX_FRAME:
+                    raise ValueError(f"Frame inválido (longitud {longitud})")
+                fin = inicio + LONGITUD.size + longitud
+                if len(self.buffer) < fin:
+                    break
+                mensajes.append(decodificar_cuerpo(bytes(self.buffer[inicio + LONGITUD.size:fin])))
+                inicio = fin
+            else:
+                fin = self.buffer.find(b"\n", max(inicio, self._revisado))
+                if fin < 0:
+                    if len(self.buffer) - inicio > MAX_FRAME:
+                        raise ValueError("Línea JSON demasiado larga")
+                    self._revisado = len(self.buffer)
+                    break
+                linea = bytes(self.buffer[inicio:fin]).strip()
+                inicio = fin + 1
+                if not linea:
+                    continue
+                try:
+                    mensaje = json.loads(linea)
+                except json.JSONDecodeError:
+                    print(f"⚠️ Datos inválidos: {linea[:80]}")
+                    continue
+                if isinstance(mensaje, dict) and mensaje.get("resp") == "hola":
+                    self.formato = mensaje.get("formato", FORMATO_JSON)
+                mensajes.append(mensaje)
+
+        del self.buffer[:inicio]
+        self._revisado = max(0, self._revisado - inicio)
+        return mensajes
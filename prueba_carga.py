@@ -0,0 +1,543 @@
+# ============================================
+# PRUEBA DE CARGA - serial_server.py con muchos clientes
+# Archivo: prueba_carga.py
+# ============================================
+#
+# Levanta serial_server.py con un serial falso a la tasa indicada, conecta
+# cientos de clientes compatibles con ClienteDatos (algunos lentos a
+# propósito) y mide latencia extremo a extremo, throughput, pérdidas, CPU y
+# memoria del servidor.
+#
+# Uso:
+#   python prueba_carga.py --tasa 100 --clientes 300 --lentos 20
+#   python prueba_carga.py --tasa 1000 --clientes 200 --procesos 4 --json base.json
+#   python prueba_carga.py --tasa 1000 --clientes 200 --procesos 4 --comparar base.json
+#   python prueba_carga.py --tasa 100 --transporte unix --comparar base.json
+#
+# La latencia se mide con el campo "t" que agrega el serial falso
+# (falso:marcar=1) al generar la lectura, así incluye la lectura serial,
+# el loop del servidor, la red local y la decodificación del cliente.
+#
+# Las pérdidas se cuentan por huecos de seq. Con banda muerta, latidos o
+# varios seriales (pasados al servidor después de --) el seq tiene huecos
+# legítimos: en esos modos no se reportan pérdidas ni % entregado.
+
+import argparse
+import json
+import multiprocessing
+import os
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from array import array
+
+from protocolo import FORMATOS, FORMATO_JSON, LectorFlujo
+
+HOST = "127.0.0.1"
+SERVIDOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serial_server.py")
+
+LENTO_BYTES = 2048        # Lo que lee un cliente lento en cada turno
+LENTO_INTERVALO = 0.2     # Cada cuánto lee un cliente lento (segundos)
+LENTO_BUFFER = 16384      # SO_RCVBUF de los clientes lentos
+PERCENTILES = (50, 90, 99, 99.9)
+
+# ============================================
+# SERVIDOR BAJO PRUEBA
+# ============================================
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+def seq_continua(servidor_args):
+    """
+    False si con estos argumentos el servidor deja huecos de seq que no son
+    pérdidas: banda muerta, latidos o más de un serial
+    """
+    args = [a for a in servidor_args if a != "--"]
+    for i, arg in enumerate(args):
+        opcion, _, valor = arg.partition("=")
+        if not valor and i + 1 < len(args):
+            valor = args[i + 1]
+        if opcion in ("--banda", "--serial"):
+            return False
+        if opcion == "--latido":
+            try:
+                if float(valor) > 0:
+                    return False
+            except ValueError:
+                return False
+    return True
+
+def iniciar_servidor(tasa, puerto, puerto_metricas, ruta_unix=None, extra=()):
+    comando = [
+        sys.executable, SERVIDOR,
+        "--serial", f"falso:tasa={tasa:g},marcar=1",
+        "--host", HOST, "--puerto", str(puerto),
+        "--metricas", str(puerto_metricas),
+        "--unix", ruta_unix or "", "--memoria", "",
+        "--silencioso", *extra,
+    ]
+    return subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+def esperar_puerto(puerto, proceso, timeout=10.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El servidor terminó al iniciar (código {proceso.returncode})")
+        try:
+            socket.create_connection((HOST, puerto), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("El servidor no abrió el puerto a tiempo")
+
+def detener_servidor(proceso):
+    if proceso.poll() is None:
+        proceso.send_signal(signal.SIGINT)
+        try:
+            proceso.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+            proceso.wait()
+
+class MonitorRecursos:
+    """Muestrea CPU y memoria (RSS) de un proceso: psutil si está, si no /proc"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.muestras_cpu = []
+        self.rss_max = 0
+        self._anterior = None
+        try:
+            import psutil
+            self._proceso = psutil.Process(pid)
+        except ImportError:
+            self._proceso = None
+        self._tick = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _leer(self):
+        """Retorna (segundos de CPU, bytes de RSS) o None si no se puede medir"""
+        if self._proceso is not None:
+            tiempos = self._proceso.cpu_times()
+            return tiempos.user + tiempos.system, self._proceso.memory_info().rss
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                campos = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self.pid}/status") as f:
+                rss = next(int(l.split()[1]) * 1024 for l in f if l.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            return None
+        # utime y stime son los campos 14 y 15 (contando desde 1 con pid y comm)
+        return (int(campos[11]) + int(campos[12])) / self._tick, rss
+
+    def muestrear(self):
+        lectura = self._leer()
+        if lectura is None:
+            return
+        ahora = time.monotonic()
+        cpu, rss = lectura
+        self.rss_max = max(self.rss_max, rss)
+        if self._anterior is not None:
+            t0, cpu0 = self._anterior
+            if ahora > t0:
+                self.muestras_cpu.append(100.0 * (cpu - cpu0) / (ahora - t0))
+        self._anterior = (ahora, cpu)
+
+    def resumen(self):
+        if not self.muestras_cpu:
+            return {"cpu_promedio": None, "cpu_max": None, "rss_max_mb": None}
+        return {
+            "cpu_promedio": round(sum(self.muestras_cpu) / len(self.muestras_cpu), 1),
+            "cpu_max": round(max(self.muestras_cpu), 1),
+            "rss_max_mb": round(self.rss_max / 2**20, 1),
+        }
+
+def leer_metricas(puerto_metricas):
+    """Lee /metrics del servidor sumando las series de cada métrica"""
+    valores = {}
+    try:
+        with urllib.request.urlopen(f"http://{HOST}:{puerto_metricas}/metrics", timeout=3) as r:
+            texto = r.read().decode()
+    except OSError as e:
+        print(f"⚠️ No se pudieron leer las métricas del servidor: {e}")
+        return valores
+    for linea in texto.splitlines():
+        if linea.startswith("#") or not linea.strip():
+            continue
+        serie, _, valor = linea.rpartition(" ")
+        nombre = serie.split("{", 1)[0].replace("tlalibot_", "", 1)
+        try:
+            valores[nombre] = valores.get(nombre, 0.0) + float(valor)
+        except ValueError:
+            pass
+    return valores
+
+# ============================================
+# CLIENTES (se ejecutan en procesos aparte)
+# ============================================
+class _Estado:
+    """Contadores de un grupo de clientes (normales o lentos)"""
+
+    def __init__(self):
+        self.mensajes = 0
+        self.perdidos = 0
+        self.bytes = 0
+        self.desconectados = 0
+        self.latencias = array("d")
+
+    def como_dict(self):
+        return {
+            "mensajes": self.mensajes,
+            "perdidos": self.perdidos,
+            "bytes": self.bytes,
+            "desconectados": self.desconectados,
+            "latencias": self.latencias.tobytes(),
+        }
+
+def ejecutar_clientes(destino, normales, lentos, formato, ventana, listos, resultados, contar_perdidos=True):
+    """
+    Conecta `normales` + `lentos` clientes y los atiende en un solo loop.
+    Los normales leen todo lo que llega; los lentos solo LENTO_BYTES cada
+    LENTO_INTERVALO. Avisa en `listos` al terminar de conectar y solo cuenta
+    lo recibido dentro de `ventana` (inicio, fin), que fija el proceso principal.
+    `destino` es (host, puerto) para TCP o la ruta del socket Unix.
+    Sin `contar_perdidos` los huecos de seq no se cuentan (ver seq_continua).
+    """
+    familia = socket.AF_UNIX if isinstance(destino, str) else socket.AF_INET
+    selector = selectors.DefaultSelector()
+    grupos = {"normales": _Estado(), "lentos": _Estado()}
+    clientes = []
+    errores_conexion = 0
+
+    hola = (json.dumps({"cmd": "hola", "formato": formato}) + "\n").encode()
+    for i in range(normales + lentos):
+        lento = i >= normales
+        try:
+            sock = socket.socket(familia, socket.SOCK_STREAM)
+            if lento:
+                # Buffer chico: el servidor nota la lentitud enseguida
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, LENTO_BUFFER)
+            sock.settimeout(5)
+            sock.connect(destino)
+            sock.sendall(hola)
+            sock.setblocking(False)
+        except OSError:
+            errores_conexion += 1
+            continue
+        cliente = {
+            "sock": sock,
+            "lector": LectorFlujo(),
+            "grupo": grupos["lentos" if lento else "normales"],
+            "ultimo_seq": None,
+            "saludado": False,
+        }
+        clientes.append(cliente)
+        if not lento:
+            selector.register(sock, selectors.EVENT_READ, cliente)
+    listos.put(errores_conexion)
+
+    def procesar(cliente, datos):
+        ahora = time.time()
+        inicio, fin = ventana[:]
+        medir = 0 < inicio <= ahora < fin
+        grupo = cliente["grupo"]
+        if medir:
+            grupo.bytes += len(datos)
+        try:
+            mensajes = cliente["lector"].alimentar(datos)
+        except ValueError:
+            return False
+        for mensaje in mensajes:
+            if mensaje.get("resp") == "hola":
+                cliente["saludado"] = True
+                continue
+            seq = mensaje.get("seq")
+            # Lo que llega antes del saludo es la lectura guardada, no tráfico en vivo
+            if seq is None or not cliente["saludado"]:
+                continue
+            anterior = cliente["ultimo_seq"]
+            cliente["ultimo_seq"] = seq
+            if not medir:
+                continue
+            grupo.mensajes += 1
+            if contar_perdidos and anterior is not None and seq > anterior + 1:
+                grupo.perdidos += seq - anterior - 1
+            if "t" in mensaje:
+                grupo.latencias.append(ahora - mensaje["t"])
+        return True
+
+    def cerrar(cliente):
+        if cliente["grupo"] is grupos["normales"]:
+            selector.unregister(cliente["sock"])
+        cliente["sock"].close()
+        cliente["grupo"].desconectados += 1
+        clientes.remove(cliente)
+
+    siguiente_lento = time.time()
+    while not (ventana[1] and time.time() >= ventana[1]):
+        for clave, _ in selector.select(timeout=0.05):
+            cliente = clave.data
+            try:
+                datos = cliente["sock"].recv(65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                datos = b""
+            if not datos or not procesar(cliente, datos):
+                cerrar(cliente)
+
+        if lentos and time.time() >= siguiente_lento:
+            siguiente_lento += LENTO_INTERVALO
+            for cliente in [c for c in clientes if c["grupo"] is grupos["lentos"]]:
+                try:
+                    datos = cliente["sock"].recv(LENTO_BYTES)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    datos = b""
+                if not datos or not procesar(cliente, datos):
+                    cerrar(cliente)
+
+    for cliente in clientes:
+        cliente["sock"].close()
+    selector.close()
+
+    resultados.put({
+        "errores_conexion": errores_conexion,
+        **{nombre: g.como_dict() for nombre, g in grupos.items()},
+    })
+
+def repartir(total, partes):
+    base, resto = divmod(total, partes)
+    return [base + (1 if i < resto else 0) for i in range(partes)]
+
+# ============================================
+# REPORTE
+# ============================================
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    i = min(len(ordenados) - 1, max(0, round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[i]
+
+def resumir_grupo(partes, segundos, contar_perdidos=True):
+    latencias = array("d")
+    total = {"mensajes": 0, "perdidos": 0, "bytes": 0, "desconectados": 0}
+    for parte in partes:
+        for clave in total:
+            total[clave] += parte[clave]
+        latencias.frombytes(parte["latencias"])
+
+    ordenadas = sorted(latencias)
+    esperados = total["mensajes"] + total["perdidos"]
+    resumen = {
+        **total,
+        "mensajes_por_segundo": round(total["mensajes"] / segundos, 1),
+        "mb_por_segundo": round(total["bytes"] / segundos / 2**20, 3),
+        "perdida_pct": round(100.0 * total["perdidos"] / esperados, 3) if esperados else 0.0,
+        "latencia_ms": {},
+    }
+    if not contar_perdidos:
+        resumen["perdidos"] = resumen["perdida_pct"] = None
+    for p in PERCENTILES:
+        valor = percentil(ordenadas, p)
+        resumen["latencia_ms"][f"p{p:g}"] = None if valor is None else round(valor * 1000, 3)
+    resumen["latencia_ms"]["max"] = round(ordenadas[-1] * 1000, 3) if ordenadas else None
+    return resumen
+
+def imprimir_reporte(reporte, base=None):
+    def delta(actual, anterior):
+        if base is None or actual is None or anterior is None:
+            return ""
+        if anterior == 0:
+            return f"  (antes {anterior})"
+        return f"  ({100.0 * (actual - anterior) / anterior:+.1f}%)"
+
+    def dato(ruta):
+        valor = reporte
+        anterior = base
+        for clave in ruta:
+            valor = valor.get(clave) if isinstance(valor, dict) else None
+            anterior = anterior.get(clave) if isinstance(anterior, dict) else None
+        return valor, anterior
+
+    c = reporte["configuracion"]
+    print("=" * 60)
+    print(f"📊 PRUEBA DE CARGA - {c['tasa']:g} Hz, {c['clientes']} clientes "
+          f"({c['lentos']} lentos), {c['formato']}/{c.get('transporte', 'tcp')}, {c['duracion']:g} s")
+    print("=" * 60)
+
+    for grupo in ("normales", "lentos"):
+        if grupo == "lentos" and not c["lentos"]:
+            continue
+        print(f"\n👥 Clientes {grupo}:")
+        for etiqueta, ruta in (
+            ("Mensajes/s", (grupo, "mensajes_por_segundo")),
+            ("Entregado %", (grupo, "entregado_pct")),
+            ("MB/s", (grupo, "mb_por_segundo")),
+            ("Perdidos", (grupo, "perdidos")),
+            ("Pérdida %", (grupo, "perdida_pct")),
+            ("Desconectados", (grupo, "desconectados")),
+        ):
+            valor, anterior = dato(ruta)
+            if valor is not None:
+                print(f"   {etiqueta:<14} {valor}{delta(valor, anterior)}")
+        for clave in reporte[grupo]["latencia_ms"]:
+            valor, anterior = dato((grupo, "latencia_ms", clave))
+            texto = "n/d" if valor is None else f"{valor:.3f} ms"
+            print(f"   Latencia {clave:<5} {texto}{delta(valor, anterior)}")
+
+    print("\n🖥️ Servidor:")
+    for etiqueta, ruta in (
+        ("Lecturas/s", ("servidor", "lecturas_por_segundo")),
+        ("CPU prom. %", ("servidor", "cpu_promedio")),
+        ("CPU máx. %", ("servidor", "cpu_max")),
+        ("RSS máx. MB", ("servidor", "rss_max_mb")),
+        ("Descartados", ("servidor", "mensajes_descartados_total")),
+        ("Expulsados", ("servidor", "clientes_expulsados_total")),
+    ):
+        valor, anterior = dato(ruta)
+        print(f"   {etiqueta:<14} {'n/d' if valor is None else valor}{delta(valor, anterior)}")
+
+    entregado = reporte["normales"].get("entregado_pct")
+    if entregado is not None and entregado < 95:
+        print(f"\n⚠️ Los clientes normales recibieron solo {entregado}% de lo esperado: "
+              f"si el servidor no descartó, prueba con más --procesos")
+    if not c.get("contar_perdidos", True):
+        print("\nℹ️ Con banda muerta, latidos o varios seriales el seq tiene huecos legítimos: "
+              "no se reportan pérdidas ni % entregado")
+    if reporte["errores_conexion"]:
+        print(f"\n⚠️ Conexiones fallidas: {reporte['errores_conexion']}")
+
+# ============================================
+# MAIN
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de serial_server.py")
+    parser.add_argument("--tasa", type=float, default=10.0, help="Lecturas por segundo del serial falso (1 a 1000)")
+    parser.add_argument("--clientes", type=int, default=200, help="Clientes normales")
+    parser.add_argument("--lentos", type=int, default=10, help="Clientes que leen despacio a propósito")
+    parser.add_argument("--formato", choices=FORMATOS, default=FORMATO_JSON)
+    parser.add_argument("--transporte", choices=("tcp", "unix"), default="tcp")
+    parser.add_argument("--duracion", type=float, default=15.0, help="Segundos de medición")
+    parser.add_argument("--calentamiento", type=float, default=2.0, help="Segundos que no se miden al inicio")
+    parser.add_argument("--procesos", type=int, default=1,
+                        help="Procesos que reparten a los clientes (subir a tasas altas)")
+    parser.add_argument("--json", help="Guardar el reporte en este archivo")
+    parser.add_argument("--comparar", help="Reporte JSON anterior para mostrar diferencias")
+    parser.add_argument("servidor_args", nargs=argparse.REMAINDER,
+                        help="Argumentos extra para serial_server.py (después de --)")
+    args = parser.parse_args()
+
+    extra = [a for a in args.servidor_args if a != "--"]
+    contar_perdidos = seq_continua(extra)
+    puerto, puerto_metricas = puerto_libre(), puerto_libre()
+    # Rutas propias de la prueba: no pisar el socket Unix del servidor real
+    ruta_unix = None
+    destino = (HOST, puerto)
+    if args.transporte == "unix":
+        ruta_unix = os.path.join(tempfile.gettempdir(), f"tlalibot_carga_{os.getpid()}.sock")
+        destino = ruta_unix
+
+    print(f"🚀 Iniciando servidor en {HOST}:{puerto} con serial falso a {args.tasa:g} Hz...")
+    servidor = iniciar_servidor(args.tasa, puerto, puerto_metricas, ruta_unix, extra)
+    try:
+        esperar_puerto(puerto, servidor)
+        if ruta_unix:
+            # El socket Unix se crea después del TCP
+            limite = time.monotonic() + 5
+            while not os.path.exists(ruta_unix) and time.monotonic() < limite:
+                time.sleep(0.05)
+        monitor = MonitorRecursos(servidor.pid)
+
+        ventana = multiprocessing.Array("d", 2)
+        listos = multiprocessing.Queue()
+        resultados = multiprocessing.Queue()
+        procesos = []
+        for normales, lentos in zip(repartir(args.clientes, args.procesos),
+                                    repartir(args.lentos, args.procesos)):
+            p = multiprocessing.Process(
+                target=ejecutar_clientes,
+                args=(destino, normales, lentos, args.formato, ventana, listos, resultados, contar_perdidos),
+                daemon=True,
+            )
+            p.start()
+            procesos.append(p)
+
+        print(f"👥 Conectando {args.clientes} clientes + {args.lentos} lentos en {args.procesos} proceso(s)...")
+        for _ in procesos:
+            listos.get(timeout=120)
+
+        # La medición empieza cuando todos están conectados y pasó el calentamiento
+        inicio_medicion = time.time() + args.calentamiento
+        fin = inicio_medicion + args.duracion
+        ventana[:] = [inicio_medicion, fin]
+        print(f"⏱️ Calentando {args.calentamiento:g} s y midiendo {args.duracion:g} s...")
+
+        lineas_inicio = None
+        while time.time() < fin:
+            time.sleep(0.5)
+            if time.time() >= inicio_medicion:
+                monitor.muestrear()
+                if lineas_inicio is None:
+                    lineas_inicio = leer_metricas(puerto_metricas).get("lineas_serial_total", 0.0)
+
+        metricas = leer_metricas(puerto_metricas)
+        partes = [resultados.get(timeout=30) for _ in procesos]
+        for p in procesos:
+            p.join(timeout=5)
+    finally:
+        detener_servidor(servidor)
+
+    lecturas = metricas.get("lineas_serial_total", 0.0) - (lineas_inicio or 0.0)
+    reporte = {
+        "configuracion": {
+            "tasa": args.tasa,
+            "clientes": args.clientes,
+            "lentos": args.lentos,
+            "formato": args.formato,
+            "transporte": args.transporte,
+            "duracion": args.duracion,
+            "procesos": args.procesos,
+            "servidor_args": extra,
+            "contar_perdidos": contar_perdidos,
+        },
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "errores_conexion": sum(p["errores_conexion"] for p in partes),
+        "normales": resumir_grupo([p["normales"] for p in partes], args.duracion, contar_perdidos),
+        "lentos": resumir_grupo([p["lentos"] for p in partes], args.duracion, contar_perdidos),
+        "servidor": {
+            **monitor.resumen(),
+            "lecturas_por_segundo": round(lecturas / args.duracion, 1) if lecturas else None,
+            "mensajes_descartados_total": metricas.get("mensajes_descartados_total"),
+            "clientes_expulsados_total": metricas.get("clientes_expulsados_total"),
+        },
+    }
+
+    # Si los clientes reciben bastante menos de lo que el servidor lee, el
+    # cuello de botella puede ser esta herramienta (subir --procesos)
+    # (solo si cada lectura se difunde: con banda muerta o latidos no aplica)
+    esperado = lecturas * args.clientes if contar_perdidos else 0
+    reporte["normales"]["entregado_pct"] = (
+        round(100.0 * reporte["normales"]["mensajes"] / esperado, 1) if esperado else None
+    )
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+    imprimir_reporte(reporte, base)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Reporte guardado en {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,46 @@
 import cv2
+import json
 import numpy as np
 from pathlib import Path
 import requests
 from itertools import product
 
+# Umbrales calculados con calibrar_hsv.py (si existe el archivo)
+CONFIG_HSV = Path(__file__).with_name("config_hsv.json")
+
+# Parámetros por defecto
+PARAMS_DEFECTO = {
+    # og 'lower_green': np.array([25, 100, 80]),
+    'lower_green': np.array([30, 120, 100]),
+    # og 'upper_green': np.array([37, 255, 192]),
+    'upper_green': np.array([37, 255, 192]),
+    'min_area': 50,
+    'max_area': 1100
+}
+
+def cargar_config_hsv(ruta=CONFIG_HSV):
+    """
+    Parámetros de detección: los por defecto actualizados con los de `ruta`.
+    Retorna None si no hay calibración guardada.
+    """
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"⚠️ No se pudo leer {ruta}: {e}")
+        return None
+
+    params = dict(PARAMS_DEFECTO)
+    for llave in ('lower_green', 'upper_green'):
+        if llave in config:
+            params[llave] = np.array(config[llave], dtype=np.uint8)
+    for llave in ('min_area', 'max_area'):
+        if llave in config:
+            params[llave] = config[llave]
+    return params
+
 def recortar_lechugas_optimizado(imagen_path, output_dir="lechugas_recortadas", auto_optimizar=True):
     """
     Detecta y recorta cada lechuga individualmente de una imagen aérea.
@@ -23,9 +60,11 @@ def recortar_lechugas_optimizado(imagen_path, output_dir="lechugas_recortadas",
         print(f"Error: No se pudo cargar la imagen {imagen_path}")
         return
     
+    calibrados = cargar_config_hsv()
+    
     if auto_optimizar:
         print(" Iniciando búsqueda de parámetros óptimos...\n")
-        mejor_config = optimizar_parametros(img)
+        mejor_config = optimizar_parametros(img, calibrados)
         print(f"\n✓ Mejor configuración encontrada:")
         print(f"  - HSV inferior: {mejor_config['lower_green']}")
         print(f"  - HSV superior: {mejor_config['upper_green']}")
@@ -35,29 +74,37 @@ def recortar_lechugas_optimizado(imagen_path, output_dir="lechugas_recortadas",
         
         params = mejor_config
     else:
-        # Parámetros por defecto
-        params = {
-            # og 'lower_green': np.array([25, 100, 80]),
-            'lower_green': np.array([30, 120, 100]),
-            # og 'upper_green': np.array([37, 255, 192]),
-            'upper_green': np.array([37, 255, 192]),
-            'min_area': 50,
-            'max_area': 1100
-        }
+        # Calibrados con calibrar_hsv.py, o los por defecto
+        params = calibrados or PARAMS_DEFECTO
     
     lechugas = detectar_y_recortar(img, params, output_dir)
     return lechugas
 
 
-def optimizar_parametros(img):
+def optimizar_parametros(img, base=None):
+    """
+    Prueba combinaciones de parámetros y se queda con la que detecta más.
+    Con `base` (calibración de calibrar_hsv.py) solo busca alrededor de ella.
+    """
 
-    h_min_range = range(20, 40, 3)      
-    h_max_range = range(30, 50, 3)     
-    s_min_range = range(40, 120, 20)    
-    v_min_range = range(40, 120, 20)    
+    s_max, v_max = 255, 255
+    if base is not None:
+        h_min, s_min, v_min = (int(v) for v in base['lower_green'])
+        h_max, s_max, v_max = (int(v) for v in base['upper_green'])
+        h_min_range = range(max(0, h_min - 3), h_min + 4, 3)
+        h_max_range = range(h_max - 3, min(179, h_max + 3) + 1, 3)
+        s_min_range = range(max(0, s_min - 20), s_min + 21, 20)
+        v_min_range = range(max(0, v_min - 20), v_min + 21, 20)
+        min_area_range = sorted({max(1, base['min_area'] // 2), base['min_area']})
+        max_area_range = sorted({base['max_area'], base['max_area'] * 3 // 2})
+    else:
+        h_min_range = range(20, 40, 3)      
+        h_max_range = range(30, 50, 3)     
+        s_min_range = range(40, 120, 20)    
+        v_min_range = range(40, 120, 20)    
 
-    min_area_range = [30, 50, 80, 100]
-    max_area_range = [800, 1000, 1200, 1500, 2000]
+        min_area_range = [30, 50, 80, 100]
+        max_area_range = [800, 1000, 1200, 1500, 2000]
     
     mejor_config = {
         'count': 0,
@@ -86,7 +133,7 @@ def optimizar_parametros(img):
         # Crear parámetros de prueba
         params = {
             'lower_green': np.array([h_min, s_min, v_min]),
-            'upper_green': np.array([h_max, 255, 255]),
+            'upper_green': np.array([h_max, s_max, v_max]),
             'min_area': min_area,
             'max_area': max_area
         }
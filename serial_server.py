@@ -1,167 +1,1074 @@
-import serial
+import argparse
+import fnmatch
+import os
 import socket
+import selectors
 import json
 import time
 import threading
+from collections import deque
 
-PUERTO_SERIAL = "COM7"
+from memoria_compartida import PublicadorUltimo, ruta_segmento
+from metricas import REGISTRO, iniciar_servidor_metricas
+from protocolo import Mensaje, FORMATO_JSON, FORMATO_BINARIO, FORMATOS, codificar_binario, ruta_socket_unix
+from transporte_serial import abrir_transporte
+
+# Puerto serial o transporte (ver transporte_serial.py), p. ej. "COM7",
+# "/dev/ttyUSB0", "pty" o "falso:tasa=10". Se puede cambiar con
+# --serial o con la variable de entorno TLALIBOT_SERIAL.
+PUERTO_SERIAL = os.environ.get("TLALIBOT_SERIAL", "COM7")
 BAUD = 9600
 
 HOST = "127.0.0.1"
 PUERTO_SOCKET = 5000
 
-# Lista de clientes conectados
-clientes = []
-clientes_lock = threading.Lock()
-
-# Último dato recibido (se comparte con todos los clientes)
-ultimo_dato = None
-dato_lock = threading.Lock()
-
-def broadcast_data(data):
-    """Envía datos a todos los clientes conectados"""
-    global clientes
-    
-    with clientes_lock:
-        clientes_desconectados = []
-        
-        for cliente in clientes:
+# Métricas en formato Prometheus: http://127.0.0.1:9108/metrics (0 = desactivado)
+PUERTO_METRICAS = 9108
+
+# Cola de salida por cliente (mensajes pendientes de enviar)
+MAX_COLA_CLIENTE = 100
+# Qué hacer con un cliente lento cuya cola se llena:
+#   "descartar"   -> se tiran sus mensajes más viejos
+#   "desconectar" -> se cierra su conexión
+POLITICA_LENTOS = "descartar"
+
+# Máximo de bytes sin \n que aceptamos de un cliente
+MAX_ENTRADA_CLIENTE = 64 * 1024
+
+# Conexiones nuevas que se aceptan en una sola vuelta del loop
+MAX_ACEPTAR_POR_VUELTA = 64
+
+# Lecturas recientes que se guardan para clientes que se reconectan
+MAX_HISTORIAL = 1000
+
+# Tema de las lecturas cuando hay un solo dispositivo sin nombre
+TEMA_POR_DEFECTO = "dht"
+
+# Banda muerta: una lectura solo se difunde si algún campo se movió más
+# que su umbral respecto a lo último enviado, p. ej.
+# {"temperatura": 0.2, "humedad": 1.0}. None = difundir todo.
+BANDA_MUERTA = None
+# Si un tema lleva este tiempo sin difundir (porque nada cambió) se envía
+# un latido con el último valor y "latido": true. 0 = sin latidos.
+INTERVALO_LATIDO = 0
+
+# Límites para las entregas reducidas ({"intervalo": S} / {"ventana": S})
+MIN_INTERVALO = 0.1
+MIN_VENTANA = 1.0
+
+# Cada cuánto el loop deja una foto de las métricas en vivo para /metrics
+INTERVALO_METRICAS = 1.0
+
+# ---------- Métricas ----------
+M_LINEAS = REGISTRO.contador("lineas_serial_total", "Líneas leídas del serial", ["tema"])
+M_ERRORES_JSON = REGISTRO.contador("errores_json_total", "Líneas del serial que no son un objeto JSON válido", ["tema"])
+M_ERRORES_SERIAL = REGISTRO.contador("errores_serial_total", "Errores leyendo el puerto serial", ["tema"])
+M_LATENCIA = REGISTRO.histograma(
+    "latencia_difusion_segundos",
+    "Desde que se lee la línea hasta que queda encolada/enviada a todos los clientes"
+)
+M_BYTES = REGISTRO.contador("bytes_enviados_total", "Bytes enviados a clientes")
+M_DESCARTADOS = REGISTRO.contador("mensajes_descartados_total", "Mensajes descartados por clientes lentos")
+M_EXPULSADOS = REGISTRO.contador("clientes_expulsados_total", "Clientes desconectados por lentos o abusivos")
+M_CONEXIONES = REGISTRO.contador("conexiones_total", "Conexiones de clientes aceptadas")
+M_RECONEXIONES = REGISTRO.contador("reconexiones_total", "Clientes que reanudaron con desde_seq")
+
+class ClienteConectado:
+    """Estado de un cliente dentro del loop de eventos"""
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.cola = deque()      # Mensajes completos pendientes
+        self.enviando = None     # memoryview del mensaje enviado a medias
+        self.descartados = 0
+        self.esperando_escritura = False
+        self.pendiente_desde = None  # Desde cuándo tiene datos sin enviar (retraso)
+        self.formato = FORMATO_JSON  # Se negocia con {"cmd": "hola"}
+        self.entrada = bytearray()   # Bytes recibidos aún sin procesar
+        self.patrones = ("*",)       # Temas suscritos (fnmatch)
+        self.suscrito = True         # False = solo consultas, no recibe difusiones
+        self.canal = None            # None = lecturas crudas; si no, clave de CanalEntrega
+        self.reenvio = 0             # Mensajes del historial reenviados que siguen en cola
+
+    def pendientes(self):
+        return len(self.cola) + (1 if self.enviando is not None else 0)
+
+    def suscrito_a(self, tema):
+        return self.suscrito and any(fnmatch.fnmatchcase(tema, patron) for patron in self.patrones)
+
+class HistorialLecturas:
+    """
+    Buffer circular con los últimos mensajes difundidos. Los números de
+    secuencia son crecientes, así que las búsquedas son binarias.
+    """
+    def __init__(self, maximo=MAX_HISTORIAL):
+        self._mensajes = deque(maxlen=maximo)
+        self.ultimo_descartado = 0  # seq del último mensaje que salió del buffer
+
+    def __len__(self):
+        return len(self._mensajes)
+
+    def agregar(self, mensaje):
+        if len(self._mensajes) == self._mensajes.maxlen:
+            self.ultimo_descartado = self._mensajes[0].seq
+        self._mensajes.append(mensaje)
+
+    def primer_seq(self):
+        return self._mensajes[0].seq if self._mensajes else None
+
+    def desde(self, seq):
+        """Mensajes con número de secuencia mayor que `seq`"""
+        bajo, alto = 0, len(self._mensajes)
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._mensajes[medio].seq <= seq:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return [self._mensajes[i] for i in range(bajo, len(self._mensajes))]
+
+    def ultimos(self, cantidad):
+        if cantidad <= 0:
+            return []
+        inicio = max(0, len(self._mensajes) - cantidad)
+        return [self._mensajes[i] for i in range(inicio, len(self._mensajes))]
+
+class FiltroBandaMuerta:
+    """
+    Decide qué lecturas se difunden (banda muerta) y cuándo toca un latido.
+    También lleva los contadores por tema para medir la compresión lograda.
+    """
+
+    def __init__(self, umbrales=BANDA_MUERTA, latido=INTERVALO_LATIDO):
+        self.umbrales = umbrales
+        self.latido = latido
+        self._enviado = {}      # tema -> último dato difundido
+        self._t_enviado = {}    # tema -> momento del último envío o latido
+        self._t_recibido = {}   # tema -> momento de la última lectura
+        self.contadores = {}    # tema -> {"recibidas", "enviadas", "latidos"}
+
+    def _contador(self, tema):
+        contador = self.contadores.get(tema)
+        if contador is None:
+            contador = {"recibidas": 0, "enviadas": 0, "latidos": 0}
+            self.contadores[tema] = contador
+        return contador
+
+    def debe_enviar(self, tema, dato, ahora):
+        contador = self._contador(tema)
+        contador["recibidas"] += 1
+        self._t_recibido[tema] = ahora
+
+        anterior = self._enviado.get(tema)
+        if self.umbrales is None or anterior is None or self._cambio(anterior, dato):
+            self._enviado[tema] = dato
+            self._t_enviado[tema] = ahora
+            contador["enviadas"] += 1
+            return True
+        return False
+
+    def _cambio(self, anterior, dato):
+        if anterior.keys() != dato.keys():
+            return True
+        for campo, valor in dato.items():
+            previo = anterior[campo]
+            if isinstance(valor, (int, float)) and isinstance(previo, (int, float)):
+                if abs(valor - previo) > self.umbrales.get(campo, 0.0):
+                    return True
+            elif valor != previo:
+                return True
+        return False
+
+    def latidos_vencidos(self, ahora):
+        """
+        Temas que siguen recibiendo lecturas (el sensor vive) pero llevan
+        `latido` segundos sin difundir nada. Si el sensor calla, no hay latido.
+        """
+        if not self.latido:
+            return []
+        vencidos = []
+        for tema, t_enviado in self._t_enviado.items():
+            if ahora - t_enviado >= self.latido and self._t_recibido[tema] > t_enviado:
+                self._t_enviado[tema] = ahora
+                self._contador(tema)["latidos"] += 1
+                vencidos.append((tema, self._enviado[tema]))
+        return vencidos
+
+    def estadisticas(self):
+        """tema -> contadores y razón de compresión (recibidas / difundidas)"""
+        resumen = {}
+        for tema, c in self.contadores.items():
+            difundidas = c["enviadas"] + c["latidos"]
+            resumen[tema] = {**c, "compresion": (c["recibidas"] / difundidas) if difundidas else 0.0}
+        return resumen
+
+class CanalEntrega:
+    """
+    Entrega reducida compartida por todos los clientes que pidieron la
+    misma especificación. Se calcula una sola vez por tema y por ventana,
+    sin importar cuántos clientes la reciban.
+      "intervalo": como máximo una lectura (la más reciente) cada S segundos
+      "ventana":   media/mín/máx de los campos numéricos cada S segundos
+    """
+
+    def __init__(self, modo, segundos):
+        self.modo = modo
+        self.segundos = segundos
+        self.suscritos = 0
+        self._estado = {}  # tema -> estado de la ventana/intervalo
+
+    @staticmethod
+    def clave_de(comando):
+        """Obtiene (modo, segundos) de un comando hola, o None si pide crudo"""
+        for modo, minimo in (("intervalo", MIN_INTERVALO), ("ventana", MIN_VENTANA)):
+            valor = comando.get(modo)
+            if isinstance(valor, (int, float)) and valor > 0:
+                # Redondear para que más clientes compartan el mismo canal
+                return (modo, max(minimo, round(float(valor), 1)))
+        return None
+
+    def procesar(self, tema, dato, ahora):
+        """Agrega una lectura. Retorna la lista de datos a emitir ahora"""
+        estado = self._estado.get(tema)
+
+        if self.modo == "intervalo":
+            if estado is None or ahora - estado["enviado"] >= self.segundos:
+                self._estado[tema] = {"enviado": ahora, "pendiente": None}
+                return [dato]
+            estado["pendiente"] = dato
+            return []
+
+        emitir = []
+        if estado is not None and ahora - estado["inicio"] >= self.segundos:
+            emitir.append(self._cerrar_ventana(tema, estado))
+            estado = None
+        if estado is None:
+            estado = {"inicio": ahora, "n": 0, "suma": {}, "min": {}, "max": {}}
+            self._estado[tema] = estado
+
+        estado["n"] += 1
+        for campo, valor in dato.items():
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                estado["suma"][campo] = estado["suma"].get(campo, 0.0) + valor
+                estado["min"][campo] = min(estado["min"].get(campo, valor), valor)
+                estado["max"][campo] = max(estado["max"].get(campo, valor), valor)
+        return emitir
+
+    def vencidos(self, ahora):
+        """Datos cuyo intervalo/ventana ya terminó aunque no lleguen lecturas"""
+        emitir = []
+        for tema, estado in list(self._estado.items()):
+            if self.modo == "intervalo":
+                if estado["pendiente"] is not None and ahora - estado["enviado"] >= self.segundos:
+                    emitir.append((tema, estado["pendiente"]))
+                    estado["pendiente"] = None
+                    estado["enviado"] = ahora
+            elif ahora - estado["inicio"] >= self.segundos:
+                emitir.append((tema, self._cerrar_ventana(tema, estado)))
+                del self._estado[tema]
+        return emitir
+
+    def _cerrar_ventana(self, tema, estado):
+        n = estado["n"]
+        dato = {campo: round(total / n, 2) for campo, total in estado["suma"].items()}
+        for campo in estado["suma"]:
+            dato[f"{campo}_min"] = estado["min"][campo]
+            dato[f"{campo}_max"] = estado["max"][campo]
+        dato["muestras"] = n
+        dato["ventana"] = self.segundos
+        return dato
+
+class ServidorDifusion:
+    """
+    Servidor de difusión con un único loop de eventos (selectors).
+    Los sockets son no bloqueantes y cada cliente tiene su propia cola
+    acotada, así un cliente lento nunca frena la lectura del serial ni
+    al resto de los clientes. El número de hilos no crece con los clientes.
+    """
+
+    def __init__(self, host=HOST, puerto=PUERTO_SOCKET,
+                 max_cola=MAX_COLA_CLIENTE, politica=POLITICA_LENTOS,
+                 max_historial=MAX_HISTORIAL, banda_muerta=BANDA_MUERTA,
+                 latido=INTERVALO_LATIDO, ruta_unix=None, ruta_memoria=None):
+        if politica not in ("descartar", "desconectar"):
+            raise ValueError(f"Política desconocida: {politica}")
+
+        self.host = host
+        self.puerto = puerto
+        self.max_cola = max_cola
+        self.politica = politica
+
+        self.selector = selectors.DefaultSelector()
+        self.clientes = {}  # socket -> ClienteConectado
+        self.ultimo_mensaje = None
+        self.ultimos = {}  # tema -> último Mensaje
+        # tema -> time.time() del último dato o latido difundido (va a la
+        # memoria compartida: con banda muerta un valor estable solo manda latidos)
+        self.senales = {}
+        # Un solo contador para todo lo difundido (lecturas, latidos y
+        # entregas reducidas): cada cliente ve seq crecientes pero con huecos,
+        # que no son pérdidas. Las pérdidas reales se avisan en el saludo
+        # ("incompleto") y en los descartes por cliente lento.
+        self.seq = 0
+        self.historial = HistorialLecturas(max_historial)
+        # Identifica esta ejecución: los seq de otra ejecución no sirven
+        self.sesion = os.urandom(4).hex()
+        self.inicio = time.time()
+        self.activo = False
+        self.server = None
+        # Transportes para consumidores del mismo equipo (None = desactivado)
+        self.ruta_unix = ruta_unix
+        self.server_unix = None
+        self.ruta_memoria = ruta_memoria
+        self.memoria = None
+        self._memoria_sucia = False
+        self._ultimo_latido_memoria = 0.0
+
+        # (canal, tema) -> clientes suscritos. Se calcula una vez por tema
+        # nuevo y se actualiza al conectar/desconectar/cambiar patrones, así
+        # difundir no evalúa patrones por cada mensaje.
+        self._indice_temas = {}
+        # Entregas reducidas activas: clave -> CanalEntrega
+        self.canales = {}
+        self.filtro = FiltroBandaMuerta(banda_muerta, latido)
+
+        # Datos publicados desde otros hilos (p. ej. el lector serial)
+        self._pendientes = deque()
+        self._pendientes_lock = threading.Lock()
+        # Par de sockets para despertar al selector cuando hay datos nuevos
+        self._despertar_r, self._despertar_w = socket.socketpair()
+        self._despertar_r.setblocking(False)
+        self._despertar_w.setblocking(False)
+
+        # /metrics y el resumen de main() corren en otros hilos: leen la foto
+        # que deja el loop, nunca los diccionarios que el loop está modificando
+        self._tomar_foto()
+        self._ultima_foto_metricas = time.monotonic()
+
+    @property
+    def ultimo_dato(self):
+        mensaje = self.ultimo_mensaje
+        return mensaje.dato if mensaje else None
+
+    # ---------- Arranque y parada ----------
+    def iniciar(self):
+        """Crea el socket de escucha (puede lanzar excepción)"""
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.host, self.puerto))
+        self.server.listen(128)
+        self.server.setblocking(False)
+
+        self.selector.register(self.server, selectors.EVENT_READ, self._aceptar)
+        self.selector.register(self._despertar_r, selectors.EVENT_READ, self._procesar_pendientes)
+
+        if self.ruta_unix:
+            self._iniciar_unix()
+        if self.ruta_memoria:
+            try:
+                self.memoria = PublicadorUltimo(self.ruta_memoria)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Sin memoria compartida en {self.ruta_memoria}: {e}")
+        self.activo = True
+
+    def _iniciar_unix(self):
+        """Socket Unix para clientes locales; si falla se sigue solo con TCP"""
+        try:
+            # Un archivo de socket viejo (p. ej. tras un cierre abrupto) impide el bind
+            if os.path.exists(self.ruta_unix):
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as prueba:
+                    if prueba.connect_ex(self.ruta_unix) == 0:
+                        raise OSError("otro servidor ya lo está usando")
+                os.unlink(self.ruta_unix)
+            self.server_unix = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.server_unix.bind(self.ruta_unix)
+            self.server_unix.listen(128)
+            self.server_unix.setblocking(False)
+            self.selector.register(self.server_unix, selectors.EVENT_READ, self._aceptar)
+        except OSError as e:
+            print(f"⚠️ Sin socket Unix en {self.ruta_unix}: {e}")
+            if self.server_unix:
+                self.server_unix.close()
+            self.server_unix = None
+
+    def ejecutar(self):
+        """Loop de eventos (bloquea hasta que se llame a detener())"""
+        print(f"🚀 Servidor listo en {self.host}:{self.puerto}")
+        if self.server_unix:
+            print(f"🔗 Socket Unix en {self.ruta_unix}")
+        if self.memoria:
+            print(f"🧠 Último valor en memoria compartida: {self.ruta_memoria}")
+        print("⏳ Esperando conexiones...")
+
+        while self.activo:
+            try:
+                eventos = self.selector.select(timeout=0.5)
+            except OSError as e:
+                if not self.activo:
+                    break
+                print(f"❌ Error en el selector: {e}")
+                continue
+
+            for key, mascara in eventos:
+                callback = key.data
+                try:
+                    callback(key.fileobj, mascara)
+                except Exception as e:
+                    print(f"❌ Error atendiendo evento: {e}")
+
+            self._revisar_temporizadores()
+
+        self._cerrar_todo()
+
+    def detener(self):
+        """Detiene el loop de forma segura desde cualquier hilo"""
+        self.activo = False
+        self._despertar()
+
+    def _cerrar_todo(self):
+        for cliente in list(self.clientes.values()):
+            self._cerrar_cliente(cliente, motivo=None)
+        for sock in (self.server, self.server_unix, self._despertar_r, self._despertar_w):
             try:
-                cliente.send(json.dumps(data).encode() + b"\n")
-            except Exception as e:
-                print(f"❌ Error enviando a cliente: {e}")
-                clientes_desconectados.append(cliente)
-        
-        # Eliminar clientes desconectados
-        for cliente in clientes_desconectados:
+                if sock:
+                    sock.close()
+            except Exception:
+                pass
+        if self.server_unix:
             try:
-                cliente.close()
-            except:
+                os.unlink(self.ruta_unix)
+            except OSError:
                 pass
-            clientes.remove(cliente)
-            print(f"📤 Cliente desconectado. Total: {len(clientes)}")
+        if self.memoria:
+            self.memoria.cerrar()
+        self.selector.close()
 
-def leer_serial(ser):
-    """Thread que lee datos del puerto serial"""
-    global ultimo_dato
-    
-    print("📖 Iniciando lectura del puerto serial...")
-    
-    while True:
+    # ---------- Publicación (seguro entre hilos) ----------
+    def publicar(self, data, tema=TEMA_POR_DEFECTO, t_lectura=None):
+        """Encola un dato (un dict) para difundirlo a los clientes suscritos a `tema`"""
+        if not isinstance(data, dict):
+            raise TypeError(f"El dato debe ser un objeto JSON, no {type(data).__name__}")
+        if t_lectura is None:
+            t_lectura = time.monotonic()
+        with self._pendientes_lock:
+            self._pendientes.append((tema, data, t_lectura))
+        self._despertar()
+
+    def _despertar(self):
         try:
-            if ser.in_waiting > 0:
-                line = ser.readline().decode().strip()
+            self._despertar_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # Ya hay un despertar pendiente o el servidor se cerró
 
-                if not line:
-                    continue
+    def _procesar_pendientes(self, sock, mascara):
+        try:
+            while sock.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
 
-                print(f"📨 Serial: {line}")
+        with self._pendientes_lock:
+            datos = list(self._pendientes)
+            self._pendientes.clear()
 
-                try:
-                    data = json.loads(line)
-                    
-                    # Guardar último dato
-                    with dato_lock:
-                        ultimo_dato = data
-                    
-                    # Enviar a todos los clientes
-                    broadcast_data(data)
-                    
-                except json.JSONDecodeError:
-                    print("❗ No es JSON válido")
+        ahora = time.monotonic()
+        for tema, data, t_lectura in datos:
+            # Las entregas reducidas ven todas las lecturas, incluso las
+            # que la banda muerta no difunde, para que los promedios sean exactos
+            for clave, canal in list(self.canales.items()):
+                for reducido in canal.procesar(tema, data, ahora):
+                    self._difundir_reducido(clave, tema, reducido)
 
-        except Exception as e:
-            print(f"❌ Error leyendo serial: {e}")
-            time.sleep(1)
+            if not self.filtro.debe_enviar(tema, data, ahora):
+                continue  # Sin cambio relevante
 
-def manejar_cliente(conn, addr):
-    """Thread para manejar cada cliente individualmente"""
-    print(f"📡 Nuevo cliente conectado: {addr}")
-    
-    with clientes_lock:
-        clientes.append(conn)
-        print(f"👥 Total de clientes: {len(clientes)}")
-    
-    try:
-        # Enviar último dato disponible al conectarse
-        if ultimo_dato:
-            conn.send(json.dumps(ultimo_dato).encode() + b"\n")
-        
-        # Mantener conexión abierta
+            self.seq += 1
+            mensaje = Mensaje(data, self.seq, tema=tema)
+            self.ultimo_mensaje = mensaje
+            self.ultimos[tema] = mensaje
+            self.senales[tema] = mensaje.ts
+            self.historial.agregar(mensaje)
+            self._difundir(mensaje)
+            self._memoria_sucia = True
+            M_LATENCIA.observar(time.monotonic() - t_lectura)
+
+        # Una sola escritura por tanda: a los lectores solo les importa lo último
+        self._actualizar_memoria()
+
+    def _actualizar_memoria(self):
+        if self.memoria is None or not self._memoria_sucia:
+            return
+        self._memoria_sucia = False
+        temas = {tema: self._como_dict(m) for tema, m in self.ultimos.items()}
+        self.memoria.publicar(self.sesion, temas, self.senales)
+        self._ultimo_latido_memoria = time.monotonic()
+
+    def _revisar_temporizadores(self):
+        """
+        Se llama en cada vuelta del loop: cierra ventanas/intervalos vencidos
+        y envía latidos de los temas que no han cambiado
+        """
+        ahora = time.monotonic()
+        for clave, canal in list(self.canales.items()):
+            for tema, reducido in canal.vencidos(ahora):
+                self._difundir_reducido(clave, tema, reducido)
+
+        for tema, dato in self.filtro.latidos_vencidos(ahora):
+            # Mismo valor con "latido": true; los clientes viejos solo ven
+            # repetido el último dato. No se guarda en el historial.
+            self.seq += 1
+            latido = Mensaje({**dato, "latido": True}, self.seq, tema=tema)
+            self._difundir(latido)
+            self.senales[tema] = latido.ts
+            self._memoria_sucia = True
+        self._actualizar_memoria()
+
+        # Los lectores de memoria compartida saben que seguimos vivos
+        if self.memoria and ahora - self._ultimo_latido_memoria >= 1.0:
+            self.memoria.latido()
+            self._ultimo_latido_memoria = ahora
+
+        if ahora - self._ultima_foto_metricas >= INTERVALO_METRICAS:
+            self._tomar_foto()
+            self._ultima_foto_metricas = ahora
+
+    def _difundir_reducido(self, clave, tema, dato):
+        # Los reducidos no van al historial, pero llevan seq para que los
+        # clientes puedan descartar repetidos
+        self.seq += 1
+        self._difundir(Mensaje(dato, self.seq, tema=tema), canal=clave)
+
+    # ---------- Clientes ----------
+    def num_clientes(self):
+        return len(self.clientes)
+
+    def metricas_en_vivo(self):
+        """Recolector para metricas.Registro: última foto tomada por el loop"""
+        return self._metricas
+
+    def resumen_temas(self):
+        """[(tema, último dato, estadísticas del filtro)] de la última foto del loop"""
+        return self._resumen_temas
+
+    def _tomar_foto(self):
+        # Solo desde el hilo del loop (o antes de arrancarlo)
+        estadisticas = self.filtro.estadisticas()
+        self._metricas = self._foto_metricas(estadisticas)
+        self._resumen_temas = [
+            (tema, mensaje.dato, estadisticas.get(tema, {}))
+            for tema, mensaje in sorted(self.ultimos.items())
+        ]
+
+    def _foto_metricas(self, estadisticas):
+        ahora = time.monotonic()
+        clientes = list(self.clientes.values())
+        cola, retraso, descartados = [], [], []
+        for c in clientes:
+            etiquetas = {"cliente": f"{c.addr[0]}:{c.addr[1]}" if isinstance(c.addr, tuple) else str(c.addr)}
+            cola.append((etiquetas, c.pendientes()))
+            retraso.append((etiquetas, ahora - c.pendiente_desde if c.pendiente_desde else 0.0))
+            descartados.append((etiquetas, c.descartados))
+
+        return [
+            ("clientes_conectados", "gauge", "Clientes conectados", [({}, len(clientes))]),
+            ("cola_cliente", "gauge", "Mensajes pendientes por cliente", cola),
+            ("retraso_cliente_segundos", "gauge", "Tiempo que el cliente lleva con datos sin enviar", retraso),
+            ("descartados_cliente", "gauge", "Mensajes descartados por cliente", descartados),
+            ("historial_mensajes", "gauge", "Mensajes en el historial", [({}, len(self.historial))]),
+            ("seq", "gauge", "Último número de secuencia", [({}, self.seq)]),
+            ("lecturas_recibidas_total", "counter", "Lecturas recibidas por tema",
+             [({"tema": t}, e["recibidas"]) for t, e in estadisticas.items()]),
+            ("lecturas_difundidas_total", "counter", "Lecturas difundidas por tema (tras la banda muerta)",
+             [({"tema": t}, e["enviadas"]) for t, e in estadisticas.items()]),
+            ("latidos_total", "counter", "Latidos enviados por tema",
+             [({"tema": t}, e["latidos"]) for t, e in estadisticas.items()]),
+        ]
+
+    def _suscriptores(self, tema, canal=None):
+        clave = (canal, tema)
+        clientes = self._indice_temas.get(clave)
+        if clientes is None:
+            clientes = {
+                c for c in self.clientes.values()
+                if c.canal == canal and c.suscrito_a(tema)
+            }
+            self._indice_temas[clave] = clientes
+        return clientes
+
+    def _indexar_cliente(self, cliente):
+        for (canal, tema), clientes in self._indice_temas.items():
+            if cliente.canal == canal and cliente.suscrito_a(tema):
+                clientes.add(cliente)
+            else:
+                clientes.discard(cliente)
+
+    def _cambiar_canal(self, cliente, clave):
+        """Mueve al cliente a otra entrega (None = crudo) y libera canales sin uso"""
+        if cliente.canal == clave:
+            return
+        anterior = self.canales.get(cliente.canal)
+        if anterior is not None:
+            anterior.suscritos -= 1
+            if anterior.suscritos <= 0:
+                del self.canales[cliente.canal]
+                for indice in [k for k in self._indice_temas if k[0] == cliente.canal]:
+                    del self._indice_temas[indice]
+
+        if clave is not None:
+            canal = self.canales.get(clave)
+            if canal is None:
+                canal = CanalEntrega(*clave)
+                self.canales[clave] = canal
+            canal.suscritos += 1
+        cliente.canal = clave
+
+    def _aceptar(self, server, mascara):
+        # Vaciar la cola de conexiones pendientes: con mucho tráfico cada
+        # vuelta del loop es larga y aceptar de a una deja clientes esperando
+        for _ in range(MAX_ACEPTAR_POR_VUELTA):
+            try:
+                conn, addr = server.accept()
+            except BlockingIOError:
+                return
+            self._registrar_cliente(conn, addr)
+
+    def _registrar_cliente(self, conn, addr):
+        conn.setblocking(False)
+        if conn.family == socket.AF_INET:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            addr = f"unix:{conn.fileno()}"  # Los clientes Unix no tienen dirección
+        cliente = ClienteConectado(conn, addr)
+        self.clientes[conn] = cliente
+        self._indexar_cliente(cliente)
+        self.selector.register(conn, selectors.EVENT_READ, self._evento_cliente)
+        M_CONEXIONES.inc()
+        print(f"📡 Nuevo cliente conectado: {addr} | 👥 Total: {len(self.clientes)}")
+
+        # Enviar el último dato de cada tema al conectarse (siempre en JSON,
+        # el formato y los temas se negocian después)
+        for mensaje in sorted(self.ultimos.values(), key=lambda m: m.seq):
+            self._encolar(cliente, mensaje.codificar(FORMATO_JSON))
+
+    def _evento_cliente(self, conn, mascara):
+        cliente = self.clientes.get(conn)
+        if cliente is None:
+            return
+
+        if mascara & selectors.EVENT_READ:
+            try:
+                data = conn.recv(4096)
+                if not data:
+                    self._cerrar_cliente(cliente)
+                    return
+                cliente.entrada += data
+                self._procesar_entrada(cliente)
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                self._cerrar_cliente(cliente, motivo=f"error: {e}")
+                return
+            if cliente.sock not in self.clientes:
+                return
+
+        if mascara & selectors.EVENT_WRITE:
+            self._vaciar_cola(cliente)
+
+    def _procesar_entrada(self, cliente):
+        """Procesa las líneas completas enviadas por el cliente"""
         while True:
-            # Recibir datos del cliente (keepalive)
-            data = conn.recv(1024)
-            if not data:
+            fin = cliente.entrada.find(b"\n")
+            if fin < 0:
                 break
-            time.sleep(0.1)
-            
-    except Exception as e:
-        print(f"❌ Error con cliente {addr}: {e}")
-    finally:
-        with clientes_lock:
-            if conn in clientes:
-                clientes.remove(conn)
-                print(f"📤 Cliente {addr} desconectado. Total: {len(clientes)}")
+            linea = bytes(cliente.entrada[:fin]).strip()
+            del cliente.entrada[:fin + 1]
+            if not linea:
+                continue  # Keepalive
+            try:
+                comando = json.loads(linea)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue  # Clientes viejos pueden mandar cualquier cosa
+            if isinstance(comando, dict):
+                self._atender_comando(cliente, comando)
+
+        if len(cliente.entrada) > MAX_ENTRADA_CLIENTE:
+            M_EXPULSADOS.inc()
+            self._cerrar_cliente(cliente, motivo="expulsado (línea demasiado larga)")
+
+    def _atender_comando(self, cliente, comando):
+        """
+        Comandos del cliente (una línea JSON cada uno):
+          {"cmd": "hola", ...}                       negociación (ver _saludar)
+          {"cmd": "ultimo", "tema": "cama1"}         último dato (de un tema o de todos)
+          {"cmd": "rango", "desde_seq": N, "hasta_seq": M, "tema": "cama*", "limite": K}
+          {"cmd": "stats"}                           estadísticas del servidor
+          {"cmd": "ping"}                            hora del servidor
+        Si el comando trae "id", la respuesta lo repite.
+        """
+        cmd = comando.get("cmd")
+        if cmd == "hola":
+            self._saludar(cliente, comando)
+            return
+
+        if cmd == "ultimo":
+            tema = comando.get("tema")
+            if tema is not None:
+                mensaje = self.ultimos.get(tema)
+                respuesta = {"dato": self._como_dict(mensaje) if mensaje else None}
+            else:
+                respuesta = {"datos": {t: self._como_dict(m) for t, m in self.ultimos.items()}}
+        elif cmd == "rango":
+            respuesta = {"lecturas": self._consultar_rango(comando)}
+        elif cmd == "stats":
+            respuesta = self._estadisticas()
+        elif cmd == "ping":
+            respuesta = {"hora": time.time()}
+        else:
+            respuesta = {"error": f"Comando desconocido: {cmd}"}
+
+        respuesta["resp"] = cmd
+        if "id" in comando:
+            respuesta["id"] = comando["id"]
+        self._responder(cliente, respuesta)
+
+    @staticmethod
+    def _como_dict(mensaje):
+        return {**mensaje.dato, "seq": mensaje.seq, "ts": mensaje.ts, "tema": mensaje.tema}
+
+    def _consultar_rango(self, comando):
+        desde_seq = comando.get("desde_seq", 0)
+        hasta_seq = comando.get("hasta_seq")
+        patron = comando.get("tema", "*")
+        limite = comando.get("limite", MAX_HISTORIAL)
+        if not isinstance(desde_seq, int) or not isinstance(limite, int):
+            return []
+
+        lecturas = []
+        for mensaje in self.historial.desde(desde_seq):
+            if isinstance(hasta_seq, int) and mensaje.seq > hasta_seq:
+                break
+            if fnmatch.fnmatchcase(mensaje.tema, patron):
+                lecturas.append(self._como_dict(mensaje))
+                if len(lecturas) >= limite:
+                    break
+        return lecturas
+
+    def _estadisticas(self):
+        return {
+            "sesion": self.sesion,
+            "seq": self.seq,
+            "primer_seq": self.historial.primer_seq(),
+            "clientes": len(self.clientes),
+            "activo_desde": self.inicio,
+            "temas": self.filtro.estadisticas(),
+            "canales": [list(clave) for clave in self.canales],
+        }
+
+    def _responder(self, cliente, respuesta):
+        # En el mismo formato que el resto del flujo del cliente; las
+        # respuestas no cuentan contra el límite de la cola
+        if cliente.formato == FORMATO_BINARIO:
+            frame = codificar_binario(respuesta)
+        else:
+            frame = json.dumps(respuesta).encode() + b"\n"
+        self._encolar(cliente, frame, forzar=True)
+
+    def _saludar(self, cliente, comando):
+        """
+        Negocia el formato y los temas ({"temas": ["cama*"]}) y, si el
+        cliente lo pide, reenvía lecturas del historial:
+        {"desde_seq": N} (todo lo posterior a N) o {"ultimos": K}.
+        Con {"suscribir": false} el cliente solo hace consultas.
+        Si el historial ya no tiene todo lo posterior a N, la respuesta
+        lleva "incompleto": true (los huecos de seq por sí solos no lo son).
+        """
+        formato = comando.get("formato", FORMATO_JSON)
+        if formato not in FORMATOS:
+            formato = FORMATO_JSON
+
+        if comando.get("suscribir") is False:
+            # Cliente de solo consultas (p. ej. un script o /estado del bot)
+            cliente.suscrito = False
+
+        temas = comando.get("temas")
+        if isinstance(temas, str):
+            temas = [temas]
+        if isinstance(temas, list) and temas:
+            cliente.patrones = tuple(str(t) for t in temas)
+
+        # Entrega reducida: {"intervalo": S} o {"ventana": S}
+        self._cambiar_canal(cliente, CanalEntrega.clave_de(comando))
+        self._indexar_cliente(cliente)
+
+        pendientes = []
+        incompleto = False
+        desde_seq = comando.get("desde_seq")
+        if cliente.canal is not None:
+            pass  # El historial guarda lecturas crudas: no aplica a entregas reducidas
+        elif isinstance(desde_seq, int):
+            M_RECONEXIONES.inc()
+            if comando.get("sesion") not in (None, self.sesion):
+                # El seq es de una ejecución anterior: todo el historial es nuevo
+                desde_seq = 0
+            incompleto = desde_seq < self.historial.ultimo_descartado
+            pendientes = self.historial.desde(desde_seq)
+        elif isinstance(comando.get("ultimos"), int):
+            pendientes = self.historial.ultimos(comando["ultimos"])
+        pendientes = [m for m in pendientes if cliente.suscrito_a(m.tema)]
+
+        # La respuesta va en JSON; lo que sigue ya en el formato pedido
+        respuesta = {
+            "resp": "hola",
+            "formato": formato,
+            "sesion": self.sesion,
+            "seq": self.seq,
+            "primer_seq": self.historial.primer_seq(),
+            "reenviados": len(pendientes),
+        }
+        if incompleto:
+            respuesta["incompleto"] = True
+        if cliente.canal is not None:
+            respuesta[cliente.canal[0]] = cliente.canal[1]
+        self._encolar(cliente, json.dumps(respuesta).encode() + b"\n")
+        cliente.formato = formato
+
+        # El reenvío no cuenta contra la cola (el historial ya está acotado)
+        # hasta que se termine de enviar: las difusiones que lleguen mientras
+        # tanto no expulsan al cliente ni tiran lo que se le acaba de prometer
+        for mensaje in pendientes:
+            cliente.reenvio += 1
+            self._encolar(cliente, mensaje.codificar(formato), forzar=True)
+
+    def _cerrar_cliente(self, cliente, motivo="desconectado"):
+        if self.clientes.pop(cliente.sock, None) is None:
+            return
+        for clientes in self._indice_temas.values():
+            clientes.discard(cliente)
+        self._cambiar_canal(cliente, None)
         try:
-            conn.close()
-        except:
+            self.selector.unregister(cliente.sock)
+        except (KeyError, ValueError):
             pass
+        try:
+            cliente.sock.close()
+        except Exception:
+            pass
+        if motivo:
+            print(f"📤 Cliente {cliente.addr} {motivo}. Total: {len(self.clientes)}")
+
+    # ---------- Envío ----------
+    def _difundir(self, mensaje, canal=None):
+        """
+        Envía el mensaje a los clientes suscritos a su tema (y a su canal de
+        entrega) sin bloquear. Se codifica una vez por formato y todos
+        comparten el mismo objeto bytes.
+        """
+        for cliente in list(self._suscriptores(mensaje.tema, canal)):
+            self._encolar(cliente, mensaje.codificar(cliente.formato))
+
+    def _encolar(self, cliente, mensaje, forzar=False):
+        if len(cliente.cola) - cliente.reenvio >= self.max_cola and not forzar:
+            if self.politica == "desconectar":
+                M_EXPULSADOS.inc()
+                self._cerrar_cliente(cliente, motivo="expulsado (cliente lento)")
+                return
+            # El más viejo que no sea parte del reenvío (que va al frente)
+            del cliente.cola[cliente.reenvio]
+            cliente.descartados += 1
+            M_DESCARTADOS.inc()
+
+        if cliente.pendiente_desde is None:
+            cliente.pendiente_desde = time.monotonic()
+        cliente.cola.append(mensaje)
+        if not cliente.esperando_escritura:
+            self._vaciar_cola(cliente)
+
+    def _vaciar_cola(self, cliente):
+        """Envía todo lo posible sin bloquear; si el socket se llena, espera EVENT_WRITE"""
+        try:
+            while True:
+                if cliente.enviando is None:
+                    if not cliente.cola:
+                        break
+                    cliente.enviando = memoryview(cliente.cola.popleft())
+                    if cliente.reenvio:
+                        cliente.reenvio -= 1
+
+                enviados = cliente.sock.send(cliente.enviando)
+                M_BYTES.inc(enviados)
+                cliente.enviando = cliente.enviando[enviados:]
+                if len(cliente.enviando) == 0:
+                    cliente.enviando = None
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            self._cerrar_cliente(cliente, motivo=f"error enviando: {e}")
+            return
+
+        quedan = cliente.enviando is not None
+        if not quedan:
+            cliente.pendiente_desde = None
+        if quedan != cliente.esperando_escritura:
+            eventos = selectors.EVENT_READ | (selectors.EVENT_WRITE if quedan else 0)
+            self.selector.modify(cliente.sock, eventos, self._evento_cliente)
+            cliente.esperando_escritura = quedan
+
+def leer_serial(ser, servidor, mostrar=True, tema=TEMA_POR_DEFECTO):
+    """
+    Thread que lee datos del puerto serial.
+    readline() bloquea hasta recibir una línea o hasta el timeout del
+    transporte, así que el hilo no consume CPU mientras el sensor calla.
+    """
+    print("📖 Iniciando lectura del puerto serial...")
 
-def aceptar_clientes(server):
-    """Thread que acepta nuevas conexiones"""
-    print(f"🚀 Servidor listo en {HOST}:{PUERTO_SOCKET}")
-    print("⏳ Esperando conexiones...")
-    
     while True:
         try:
-            conn, addr = server.accept()
-            
-            # Crear thread para manejar este cliente
-            client_thread = threading.Thread(
-                target=manejar_cliente, 
-                args=(conn, addr),
-                daemon=True
-            )
-            client_thread.start()
-            
+            line = ser.readline()
+            if not line:
+                continue  # Timeout sin datos
+            t_lectura = time.monotonic()
+
+            line = line.decode(errors="replace").strip()
+            if not line:
+                continue
+            M_LINEAS.etiquetas(tema=tema).inc()
+
+            if mostrar:
+                print(f"📨 Serial [{tema}]: {line}")
+
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError:
+                data = None
+            if not isinstance(data, dict):
+                # Un número o texto suelto también es JSON, pero no una lectura
+                M_ERRORES_JSON.etiquetas(tema=tema).inc()
+                print(f"❗ No es un objeto JSON válido: {line}")
+                continue
+
+            # Enviar a todos los clientes (lo hace el loop de eventos)
+            servidor.publicar(data, tema, t_lectura)
+
         except Exception as e:
-            print(f"❌ Error aceptando cliente: {e}")
+            M_ERRORES_SERIAL.etiquetas(tema=tema).inc()
+            print(f"❌ Error leyendo serial: {e}")
             time.sleep(1)
 
+def parsear_dispositivo(spec):
+    """
+    "cama1=COM7" -> ("cama1", "COM7"). Sin nombre se usa el tema por
+    defecto: "falso:tasa=10" -> ("dht", "falso:tasa=10")
+    """
+    nombre, separador, resto = spec.partition("=")
+    if separador and ":" not in nombre and nombre:
+        return nombre, resto
+    return TEMA_POR_DEFECTO, spec
+
+def parsear_umbrales(texto):
+    """"temperatura=0.2,humedad=1" -> {"temperatura": 0.2, "humedad": 1.0}"""
+    umbrales = {}
+    for parte in filter(None, texto.split(",")):
+        campo, _, valor = parte.partition("=")
+        umbrales[campo.strip()] = float(valor) if valor else 0.0
+    return umbrales
+
 def main():
+    parser = argparse.ArgumentParser(description="Servidor serial multi-cliente")
+    parser.add_argument("--serial", action="append",
+                        help="Puerto o transporte: COM7, /dev/ttyUSB0, pty, falso:tasa=10 ... "
+                             "Repetible con nombre de tema: --serial cama1=COM7 --serial cama2=COM8")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--puerto", type=int, default=PUERTO_SOCKET)
+    parser.add_argument("--historial", type=int, default=MAX_HISTORIAL,
+                        help="Lecturas recientes guardadas para reconexiones")
+    parser.add_argument("--banda", type=parsear_umbrales, default=BANDA_MUERTA,
+                        help="Banda muerta por campo, p. ej. temperatura=0.2,humedad=1")
+    parser.add_argument("--latido", type=float, default=INTERVALO_LATIDO,
+                        help="Segundos sin cambios antes de enviar un latido (0 = nunca)")
+    parser.add_argument("--unix",
+                        help="Socket Unix para clientes del mismo equipo "
+                             "(por defecto según --puerto, \"\" = desactivado)")
+    parser.add_argument("--memoria",
+                        help="Archivo de memoria compartida con el último valor "
+                             "(por defecto según --puerto, \"\" = desactivado)")
+    parser.add_argument("--metricas", type=int, default=PUERTO_METRICAS,
+                        help="Puerto HTTP local para /metrics (0 = desactivado)")
+    parser.add_argument("--silencioso", action="store_true",
+                        help="No imprimir cada lectura (útil a tasas altas)")
+    args = parser.parse_args()
+    if args.unix is None:
+        args.unix = ruta_socket_unix(args.puerto)
+    if args.memoria is None:
+        args.memoria = ruta_segmento(args.puerto)
+    dispositivos = [parsear_dispositivo(spec) for spec in (args.serial or [PUERTO_SERIAL])]
+
+    temas = [tema for tema, _ in dispositivos]
+    if len(set(temas)) != len(temas):
+        print(f"❌ Temas repetidos: {temas}. Usa --serial nombre=puerto")
+        return
+
     print("=" * 50)
     print("🔌 SERVIDOR SERIAL MULTI-CLIENTE")
     print("=" * 50)
-    
-    # Conectar al puerto serial
-    print(f"\n🔌 Conectando a {PUERTO_SERIAL} @ {BAUD} baud...")
-    try:
-        ser = serial.Serial(PUERTO_SERIAL, BAUD, timeout=1)
-        print("✔ Puerto serial conectado")
-    except Exception as e:
-        print(f"❌ Error conectando serial: {e}")
+
+    # Conectar a los puertos seriales
+    puertos = []
+    for tema, spec in dispositivos:
+        print(f"\n🔌 Conectando [{tema}] a {spec}...")
+        try:
+            ser = abrir_transporte(spec, BAUD)
+            print(f"✔ Puerto serial conectado: {ser.descripcion}")
+            puertos.append((tema, ser))
+        except Exception as e:
+            print(f"❌ Error conectando serial: {e}")
+
+    if not puertos:
         return
 
+    def cerrar_puertos():
+        for _, ser in puertos:
+            ser.close()
+
     # Crear servidor socket
-    print(f"\n🌐 Creando servidor socket en {HOST}:{PUERTO_SOCKET}...")
+    print(f"\n🌐 Creando servidor socket en {args.host}:{args.puerto}...")
+    servidor = ServidorDifusion(
+        args.host, args.puerto,
+        max_historial=args.historial,
+        banda_muerta=args.banda,
+        latido=args.latido,
+        ruta_unix=args.unix or None,
+        ruta_memoria=args.memoria or None,
+    )
     try:
-        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server.bind((HOST, PUERTO_SOCKET))
-        server.listen(5)  # Permitir hasta 5 conexiones en cola
+        servidor.iniciar()
         print("✔ Servidor socket listo")
     except Exception as e:
         print(f"❌ Error creando servidor: {e}")
-        ser.close()
+        cerrar_puertos()
         return
 
-    # Iniciar thread de lectura serial
-    serial_thread = threading.Thread(target=leer_serial, args=(ser,), daemon=True)
-    serial_thread.start()
+    # Métricas para Prometheus (solo en localhost)
+    if args.metricas:
+        try:
+            REGISTRO.recolector(servidor.metricas_en_vivo)
+            iniciar_servidor_metricas(args.metricas)
+            print(f"📈 Métricas en http://127.0.0.1:{args.metricas}/metrics")
+        except OSError as e:
+            print(f"⚠️ No se pudieron exponer las métricas: {e}")
 
-    # Iniciar thread de aceptación de clientes
-    accept_thread = threading.Thread(target=aceptar_clientes, args=(server,), daemon=True)
-    accept_thread.start()
+    # Un thread de lectura por dispositivo: cada uno bloquea en su propio
+    # readline() y publicar() nunca espera a la red, así no se frenan entre sí
+    for tema, ser in puertos:
+        serial_thread = threading.Thread(
+            target=leer_serial,
+            args=(ser, servidor, not args.silencioso, tema),
+            daemon=True
+        )
+        serial_thread.start()
+
+    # Iniciar loop de eventos (atiende a todos los clientes en un solo hilo)
+    red_thread = threading.Thread(target=servidor.ejecutar, daemon=True)
+    red_thread.start()
 
     print("\n✅ Sistema iniciado correctamente")
     print("📊 Estadísticas en tiempo real:")
@@ -171,28 +1078,20 @@ def main():
     try:
         while True:
             time.sleep(5)
-            with clientes_lock:
-                num_clientes = len(clientes)
-            
-            with dato_lock:
-                ultimo = ultimo_dato
-            
-            print(f"👥 Clientes conectados: {num_clientes} | 📨 Último dato: {ultimo}")
-            
+            print(f"👥 Clientes conectados: {servidor.num_clientes()}")
+            for tema, dato, e in servidor.resumen_temas():
+                print(f"   📨 [{tema}] Último dato: {dato} | "
+                      f"recibidas {e.get('recibidas', 0)}, difundidas {e.get('enviadas', 0)}, "
+                      f"latidos {e.get('latidos', 0)} (x{e.get('compresion', 0):.1f})")
+
     except KeyboardInterrupt:
         print("\n\n✋ Deteniendo servidor...")
-        
+
         # Cerrar todas las conexiones
-        with clientes_lock:
-            for cliente in clientes:
-                try:
-                    cliente.close()
-                except:
-                    pass
-        
-        server.close()
-        ser.close()
+        servidor.detener()
+        red_thread.join(timeout=5)
+        cerrar_puertos()
         print("✔ Servidor detenido correctamente")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
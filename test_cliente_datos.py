@@ -0,0 +1,63 @@
+# ============================================
+# PRUEBAS DEL CLIENTE - Reconexión ante frames corruptos
+# Archivo: test_cliente_datos.py
+# ============================================
+#
+#   python -m pytest -q test_cliente_datos.py
+
+import json
+import socket
+import threading
+
+from cliente_datos import ClienteDatos
+from protocolo import CABECERA, LONGITUD, TIPO_LECTURA
+
+
+def _servidor_falso(frames_por_conexion, conexiones):
+    """
+    Acepta conexiones en un puerto libre: responde el hola en binario y
+    envía el frame de `frames_por_conexion`. Cuenta las conexiones en la
+    lista `conexiones`. Retorna (socket de escucha, puerto).
+    """
+    servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    servidor.bind(("127.0.0.1", 0))
+    servidor.listen()
+
+    def atender():
+        while True:
+            try:
+                conn, _ = servidor.accept()
+            except OSError:
+                return
+            conexiones.append(conn)
+            archivo = conn.makefile("rb")
+            archivo.readline()  # {"cmd": "hola", ...}
+            conn.sendall(json.dumps({"resp": "hola", "formato": "bin"}).encode() + b"\n")
+            conn.sendall(frames_por_conexion)
+
+    threading.Thread(target=atender, daemon=True).start()
+    return servidor, servidor.getsockname()[1]
+
+
+def test_frame_lectura_truncado_reconecta():
+    # Frame de lectura con solo 2 bytes de payload (necesita 8)
+    cuerpo = CABECERA.pack(TIPO_LECTURA, 1, 0.0) + b"\x00\x01"
+    frame = LONGITUD.pack(len(cuerpo)) + cuerpo
+
+    conexiones = []
+    servidor, puerto = _servidor_falso(frame, conexiones)
+    cliente = ClienteDatos(puerto=puerto, formato="bin", transporte="tcp")
+    try:
+        assert cliente.conectado
+        # El hilo de lectura sigue vivo y vuelve a conectarse
+        for _ in range(50):
+            if len(conexiones) >= 2:
+                break
+            cliente._detener.wait(0.1)
+        assert len(conexiones) >= 2
+        assert cliente._hilo.is_alive()
+    finally:
+        cliente.desconectar()
+        servidor.close()
+        for conn in conexiones:
+            conn.close()
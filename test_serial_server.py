@@ -0,0 +1,64 @@
+# ============================================
+# PRUEBAS DEL SERVIDOR - Respuestas iguales en JSON y en binario
+# Archivo: test_serial_server.py
+# ============================================
+#
+#   python -m pytest -q test_serial_server.py
+
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from protocolo import FORMATO_BINARIO, FORMATO_JSON, LectorFlujo
+from serial_server import ServidorDifusion
+
+
+@pytest.fixture
+def servidor():
+    servidor = ServidorDifusion(host="127.0.0.1", puerto=0)
+    servidor.iniciar()
+    hilo = threading.Thread(target=servidor.ejecutar, daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.detener()
+    hilo.join(timeout=5)
+
+
+def _consultar(servidor, formato, comandos):
+    """Negocia `formato` sin suscribirse y retorna las respuestas a `comandos`"""
+    puerto = servidor.server.getsockname()[1]
+    with socket.create_connection(("127.0.0.1", puerto), timeout=5) as sock:
+        lineas = [{"cmd": "hola", "formato": formato, "suscribir": False}] + comandos
+        sock.sendall(b"".join(json.dumps(c).encode() + b"\n" for c in lineas))
+
+        lector = LectorFlujo()
+        respuestas = []
+        while len(respuestas) < len(comandos):
+            datos = sock.recv(4096)
+            assert datos, "El servidor cerró la conexión"
+            # Al conectar llega el último dato de cada tema: solo interesan las respuestas
+            respuestas += [m for m in lector.alimentar(datos) if m.get("resp") not in (None, "hola")]
+        return respuestas
+
+
+def test_respuestas_binarias_iguales_a_json(servidor):
+    servidor.publicar({"temperatura": 22.5, "humedad": 40.0}, tema="cama1")
+    for _ in range(50):
+        if servidor.seq:
+            break
+        time.sleep(0.05)
+    assert servidor.seq == 1
+
+    comandos = [{"cmd": "stats"}, {"cmd": "ultimo"}, {"cmd": "ultimo", "tema": "cama1"}]
+    en_json = _consultar(servidor, FORMATO_JSON, comandos)
+    en_binario = _consultar(servidor, FORMATO_BINARIO, comandos)
+
+    # El número de clientes cambia entre las dos consultas: no se compara
+    for respuestas in (en_json, en_binario):
+        respuestas[0].pop("clientes")
+    assert en_binario == en_json
+    assert en_binario[0]["seq"] == 1
+    assert en_binario[2]["dato"]["seq"] == 1
@@ -0,0 +1,187 @@
+# ============================================
+# TRANSPORTES SERIALES - De dónde leemos las lecturas del DHT
+# Archivo: transporte_serial.py
+# ============================================
+#
+# Todos los transportes tienen la misma interfaz que pyserial:
+#   readline() -> bytes   (b"" si pasó el timeout sin datos, sin gastar CPU)
+#   close()
+#
+# Especificaciones aceptadas por abrir_transporte():
+#   "COM7", "/dev/ttyUSB0", "serial:COM7"   -> puerto real con pyserial
+#   "pty"                                   -> par pseudo-terminal (Linux/macOS)
+#   "falso" / "falso:tasa=10"               -> lecturas sintéticas a 10 Hz
+#   "falso:archivo=grabacion.txt,tasa=2"    -> reproduce una grabación en bucle
+#   "falso:tasa=100,marcar=1"               -> agrega "t" (epoch de emisión) para
+#                                              medir latencia (ver prueba_carga.py)
+#
+# Para alimentar un pty (o un puerto real) con datos simulados:
+#   python transporte_serial.py /dev/pts/5 --tasa 1
+
+import argparse
+import os
+import random
+import select
+import time
+
+BAUD = 9600
+TIMEOUT_LECTURA = 1.0
+
+class SerialFalso:
+    """
+    Dispositivo serial en memoria. Genera lecturas tipo DHT11 (caminata
+    aleatoria) o reproduce las líneas de un archivo grabado, a `tasa` Hz.
+    readline() duerme hasta la siguiente lectura, así que no consume CPU.
+    """
+
+    def __init__(self, tasa=1.0, archivo=None, timeout=TIMEOUT_LECTURA, semilla=None, marcar=False):
+        if tasa <= 0:
+            raise ValueError("La tasa debe ser mayor que 0")
+        self.intervalo = 1.0 / tasa
+        self.timeout = timeout
+        self.descripcion = f"falso @ {tasa:g} Hz" + (f" ({archivo})" if archivo else "")
+        self.marcar = marcar
+
+        self._lineas = None
+        if archivo:
+            with open(archivo, "rb") as f:
+                self._lineas = [l.rstrip(b"\r\n") for l in f if l.strip()]
+            if not self._lineas:
+                raise ValueError(f"La grabación {archivo} está vacía")
+        self._indice = 0
+
+        self._rnd = random.Random(semilla)
+        self._temperatura = 22.0
+        self._humedad = 45.0
+        self._siguiente = time.monotonic()
+        self._abierto = True
+
+    def _generar(self):
+        if self._lineas is not None:
+            linea = self._lineas[self._indice]
+            self._indice = (self._indice + 1) % len(self._lineas)
+            return linea
+
+        self._temperatura = min(40.0, max(5.0, self._temperatura + self._rnd.uniform(-0.2, 0.2)))
+        self._humedad = min(95.0, max(10.0, self._humedad + self._rnd.uniform(-0.5, 0.5)))
+        # Mismo formato que DHTtester.ino
+        if self.marcar:
+            return (f'{{"temperatura": {self._temperatura:.2f}, '
+                    f'"humedad": {self._humedad:.2f}, "t": {time.time():.6f}}}').encode()
+        return (f'{{"temperatura": {self._temperatura:.2f}, '
+                f'"humedad": {self._humedad:.2f}}}').encode()
+
+    def readline(self):
+        if not self._abierto:
+            raise OSError("Transporte cerrado")
+
+        espera = self._siguiente - time.monotonic()
+        if espera > self.timeout:
+            time.sleep(self.timeout)
+            return b""
+        if espera > 0:
+            time.sleep(espera)
+
+        self._siguiente += self.intervalo
+        # Si nos atrasamos mucho (p. ej. el proceso se suspendió) no ráfaguear
+        if time.monotonic() - self._siguiente > 1.0:
+            self._siguiente = time.monotonic()
+
+        return self._generar() + b"\r\n"
+
+    def close(self):
+        self._abierto = False
+
+class TransportePty:
+    """
+    Crea un par pseudo-terminal. Nosotros leemos del lado maestro y
+    cualquier programa puede escribir lecturas en `ruta_esclavo`
+    como si fuera el Arduino.
+    """
+
+    def __init__(self, timeout=TIMEOUT_LECTURA):
+        import tty  # Solo existe en sistemas tipo Unix
+
+        self.timeout = timeout
+        self._maestro, self._esclavo = os.openpty()
+        tty.setraw(self._esclavo)
+        self.ruta_esclavo = os.ttyname(self._esclavo)
+        self.descripcion = f"pty {self.ruta_esclavo}"
+        self._buffer = bytearray()
+
+    def readline(self):
+        while True:
+            fin = self._buffer.find(b"\n")
+            if fin >= 0:
+                linea = bytes(self._buffer[:fin + 1])
+                del self._buffer[:fin + 1]
+                return linea
+
+            listos, _, _ = select.select([self._maestro], [], [], self.timeout)
+            if not listos:
+                return b""
+            self._buffer += os.read(self._maestro, 4096)
+
+    def close(self):
+        for fd in (self._maestro, self._esclavo):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+def _parsear_opciones(texto):
+    opciones = {}
+    for parte in filter(None, texto.split(",")):
+        clave, _, valor = parte.partition("=")
+        opciones[clave.strip()] = valor.strip()
+    return opciones
+
+def abrir_transporte(spec, baud=BAUD, timeout=TIMEOUT_LECTURA):
+    """Abre el transporte descrito por `spec` (ver cabecera del archivo)"""
+    tipo, _, resto = spec.partition(":")
+
+    if tipo == "falso":
+        opciones = _parsear_opciones(resto)
+        return SerialFalso(
+            tasa=float(opciones.get("tasa", 1)),
+            archivo=opciones.get("archivo"),
+            timeout=timeout,
+            semilla=opciones.get("semilla"),
+            marcar=opciones.get("marcar", "0") not in ("0", ""),
+        )
+
+    if tipo == "pty":
+        return TransportePty(timeout=timeout)
+
+    puerto = resto if tipo == "serial" else spec
+    import serial  # pyserial solo es necesario con hardware real
+    ser = serial.Serial(puerto, baud, timeout=timeout)
+    ser.descripcion = f"{puerto} @ {baud} baud"
+    return ser
+
+def simular(destino, tasa, baud=BAUD):
+    """Escribe lecturas sintéticas en un pty o puerto serial"""
+    fuente = SerialFalso(tasa=tasa)
+    if destino.startswith("/dev/pts/"):
+        salida = open(destino, "wb", buffering=0)
+    else:
+        import serial
+        salida = serial.Serial(destino, baud)
+
+    print(f"🧪 Simulando DHT11 en {destino} @ {tasa:g} Hz (Ctrl+C para salir)")
+    try:
+        while True:
+            linea = fuente.readline()
+            if linea:
+                salida.write(linea)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        salida.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simula un DHT11 escribiendo en un pty o puerto serial")
+    parser.add_argument("destino", help="Ruta del pty/puerto, p. ej. /dev/pts/5")
+    parser.add_argument("--tasa", type=float, default=1.0, help="Lecturas por segundo")
+    args = parser.parse_args()
+    simular(args.destino, args.tasa)